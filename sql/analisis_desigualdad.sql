@@ -4,26 +4,12 @@ SELECT * FROM indices;
 -- ANÁLISIS INVERSIÓN
 
 -- Calcular la inversión media anual por habitante en cada distrito
-WITH inversion_total_anual AS (
-    SELECT 
-        cod_distrito,
-        SUM(total_invertido) AS inversion_total_anual,
-        COUNT(DISTINCT año) AS num_años
-    FROM presupuestos
-    GROUP BY cod_distrito
-),
-inversion_media_por_distrito AS (
-    SELECT 
-        cod_distrito,
-        (inversion_total_anual / num_años) AS inversion_media_anual
-    FROM inversion_total_anual
-)
 SELECT 
-    i.cod_distrito,
-    i.inversion_media_anual,
-    (i.inversion_media_anual / p.numero_habitantes) AS inversion_per_capita
-FROM inversion_media_por_distrito i
-JOIN poblacion p ON i.cod_distrito = p.cod_distrito
+    cod_distrito,
+    inversion_media_anual,
+    inversion_per_capita
+FROM resumen_inversion_distrito
+WHERE numero_habitantes IS NOT NULL
 ORDER BY inversion_per_capita DESC;
 
 
@@ -31,9 +17,8 @@ ORDER BY inversion_per_capita DESC;
 SELECT 
     cod_distrito,
     area_inversion,
-    AVG(total_invertido) AS inversion_media_anual_area
-FROM presupuestos
-GROUP BY cod_distrito, area_inversion
+    inversion_media_area AS inversion_media_anual_area
+FROM resumen_inversion_area
 ORDER BY cod_distrito, inversion_media_anual_area DESC;
 
 
@@ -41,29 +26,20 @@ ORDER BY cod_distrito, inversion_media_anual_area DESC;
 SELECT 
     cod_distrito,
     año,
-    SUM(total_invertido) AS inversion_total_anual
-FROM presupuestos
-GROUP BY cod_distrito, año
+    inversion_total_anual
+FROM resumen_inversion_anual
 ORDER BY cod_distrito, año;
 
 
 -- Porcentaje de inversión en cada área respecto al total del distrito
-WITH total_inversion_por_distrito AS (
-    SELECT 
-        cod_distrito,
-        SUM(total_invertido) AS inversion_total_distrito
-    FROM presupuestos
-    GROUP BY cod_distrito
-)
 SELECT 
-    p.cod_distrito,
-    p.area_inversion,
-    SUM(p.total_invertido) AS inversion_total_area,
-    (SUM(p.total_invertido) / t.inversion_total_distrito) * 100 AS porcentaje_inversion_area
-FROM presupuestos p
-JOIN total_inversion_por_distrito t ON p.cod_distrito = t.cod_distrito
-GROUP BY p.cod_distrito, p.area_inversion
-ORDER BY p.cod_distrito, porcentaje_inversion_area DESC;
+    a.cod_distrito,
+    a.area_inversion,
+    a.inversion_total_area,
+    (a.inversion_total_area / d.inversion_total) * 100 AS porcentaje_inversion_area
+FROM resumen_inversion_area a
+JOIN resumen_inversion_distrito d ON a.cod_distrito = d.cod_distrito
+ORDER BY a.cod_distrito, porcentaje_inversion_area DESC;
 
 
 -- Aumento o disminución de la inversión cada año:
@@ -72,9 +48,8 @@ WITH inversion_total_anual AS (
     SELECT 
         cod_distrito,
         año,
-        SUM(total_invertido) AS total_invertido_anual
-    FROM presupuestos
-    GROUP BY cod_distrito, año
+        inversion_total_anual AS total_invertido_anual
+    FROM resumen_inversion_anual
 ),
 -- Calcular la variación anual en porcentaje
 variacion_anual AS (
@@ -101,10 +76,9 @@ WITH inversion_por_anio AS (
     SELECT 
         cod_distrito,
         año,
-        SUM(total_invertido) AS total_invertido_anual
-    FROM presupuestos
+        inversion_total_anual AS total_invertido_anual
+    FROM resumen_inversion_anual
     WHERE año IN (2012, 2022)
-    GROUP BY cod_distrito, año
 ),
 -- Obtener la inversión en 2012 y 2022 para cada distrito
 inversion_2012_2022 AS (
@@ -135,10 +109,9 @@ ORDER BY variacion_porcentaje DESC;
 WITH inversion_sectores_productivos AS (
     SELECT 
         cod_distrito,
-        AVG(total_invertido) AS inversion_media_sectores_productivos
-    FROM presupuestos
+        inversion_media_area AS inversion_media_sectores_productivos
+    FROM resumen_inversion_area
     WHERE area_inversion = 'Sectores productivos'
-    GROUP BY cod_distrito
 )
 SELECT 
     i.cod_distrito,
@@ -154,9 +127,8 @@ ORDER BY i.inversion_media_sectores_productivos DESC;
 WITH inversion_media_anual AS (
     SELECT 
         cod_distrito,
-        SUM(total_invertido) / COUNT(DISTINCT año) AS inversion_media_anual
-    FROM presupuestos
-    GROUP BY cod_distrito
+        inversion_media_anual
+    FROM resumen_inversion_distrito
 )
 SELECT 
     i.cod_distrito,
@@ -173,8 +145,8 @@ ORDER BY inversion_per_capita DESC;
 WITH inversion_areas_economicas AS (
     SELECT 
         cod_distrito,
-        AVG(total_invertido) AS inversion_media_area_economica
-    FROM presupuestos
+        SUM(inversion_total_area) / SUM(num_registros) AS inversion_media_area_economica
+    FROM resumen_inversion_area
     WHERE area_inversion IN ('Urbanismo', 'Sectores productivos')
     GROUP BY cod_distrito
 )
@@ -193,8 +165,8 @@ ORDER BY inversion_media_area_economica DESC;
 WITH inversion_areas_economicas AS (
     SELECT 
         cod_distrito,
-        AVG(total_invertido) AS inversion_media_area_economica
-    FROM presupuestos
+        SUM(inversion_total_area) / SUM(num_registros) AS inversion_media_area_economica
+    FROM resumen_inversion_area
     WHERE area_inversion IN ('Urbanismo', 'Sectores productivos', 'Infraestructuras')
     GROUP BY cod_distrito
 )
@@ -211,9 +183,8 @@ ORDER BY inversion_media_area_economica DESC;
 WITH inversion_media_anual AS (
     SELECT 
         cod_distrito,
-        SUM(total_invertido) / COUNT(DISTINCT año) AS inversion_media_anual
-    FROM presupuestos
-    GROUP BY cod_distrito
+        inversion_media_anual
+    FROM resumen_inversion_distrito
 ),
 inversion_per_capita AS (
     SELECT 
@@ -237,8 +208,8 @@ ORDER BY i.inversion_per_capita DESC;
 WITH inversion_areas_economicas AS (
     SELECT 
         cod_distrito,
-        AVG(total_invertido) AS inversion_media_area_economica
-    FROM presupuestos
+        SUM(inversion_total_area) / SUM(num_registros) AS inversion_media_area_economica
+    FROM resumen_inversion_area
     WHERE area_inversion IN ('Urbanismo', 'Sectores productivos', 'Infraestructuras')
     GROUP BY cod_distrito
 )
@@ -255,10 +226,9 @@ ORDER BY i.inversion_media_area_economica DESC;
 WITH inversion_educacion AS (
     SELECT 
         cod_distrito,
-        AVG(total_invertido) AS inversion_media_educacion
-    FROM presupuestos
+        inversion_media_area AS inversion_media_educacion
+    FROM resumen_inversion_area
     WHERE area_inversion = 'Educación'
-    GROUP BY cod_distrito
 )
 SELECT 
     i.cod_distrito,
@@ -308,10 +278,9 @@ ORDER BY eco.tasa_paro_larga_duracion DESC;
 WITH inversion_proteccion_social AS (
     SELECT 
         cod_distrito,
-        AVG(total_invertido) AS inversion_media_proteccion_social
-    FROM presupuestos
+        inversion_media_area AS inversion_media_proteccion_social
+    FROM resumen_inversion_area
     WHERE area_inversion = 'Protección y promoción social'
-    GROUP BY cod_distrito
 )
 SELECT 
     i.cod_distrito,
@@ -326,10 +295,9 @@ ORDER BY s.tasa_riesgo_pobreza_infantil DESC;
 WITH inversion_residencias AS (
     SELECT 
         cod_distrito,
-        AVG(total_invertido) AS inversion_media_residencias
-    FROM presupuestos
+        inversion_media_area AS inversion_media_residencias
+    FROM resumen_inversion_area
     WHERE area_inversion = 'Protección y promoción social'
-    GROUP BY cod_distrito
 )
 SELECT 
     i.cod_distrito,
@@ -355,10 +323,9 @@ ORDER BY s.tasa_intervenciones_policia DESC;
 WITH inversion_servicios_sociales AS (
     SELECT 
         cod_distrito,
-        AVG(total_invertido) AS inversion_media_servicios_sociales
-    FROM presupuestos
+        inversion_media_area AS inversion_media_servicios_sociales
+    FROM resumen_inversion_area
     WHERE area_inversion = 'Protección y promoción social'
-    GROUP BY cod_distrito
 )
 SELECT 
     i.cod_distrito,
@@ -373,8 +340,8 @@ ORDER BY s.tasa_personas_atendidas_ss DESC;
 WITH inversion_bienestar_social AS (
     SELECT 
         cod_distrito,
-        AVG(total_invertido) AS inversion_media_bienestar
-    FROM presupuestos
+        SUM(inversion_total_area) / SUM(num_registros) AS inversion_media_bienestar
+    FROM resumen_inversion_area
     WHERE area_inversion IN ('Protección y promoción social', 'Otros bienes públicos de carácter social')
     GROUP BY cod_distrito
 )
@@ -401,10 +368,9 @@ ORDER BY p.proporcion_migrantes DESC;
 WITH inversion_proteccion_social AS (
     SELECT 
         cod_distrito,
-        AVG(total_invertido) AS inversion_media_proteccion_social
-    FROM presupuestos
+        inversion_media_area AS inversion_media_proteccion_social
+    FROM resumen_inversion_area
     WHERE area_inversion = 'Protección y promoción social'
-    GROUP BY cod_distrito
 )
 SELECT 
     i.cod_distrito,
@@ -441,10 +407,9 @@ ORDER BY p.proporcion_migrantes DESC;
 WITH inversion_seguridad AS (
     SELECT 
         cod_distrito,
-        AVG(total_invertido) AS inversion_media_seguridad
-    FROM presupuestos
+        inversion_media_area AS inversion_media_seguridad
+    FROM resumen_inversion_area
     WHERE area_inversion = 'Protección Civil y seguridad ciudadana'
-    GROUP BY cod_distrito
 )
 SELECT 
     i.cod_distrito,
@@ -469,10 +434,9 @@ ORDER BY s.tasa_riesgo_pobreza_infantil DESC;
 WITH inversion_infraestructura_social AS (
     SELECT 
         cod_distrito,
-        AVG(total_invertido) AS inversion_media_social
-    FROM presupuestos
+        inversion_media_area AS inversion_media_social
+    FROM resumen_inversion_area
     WHERE area_inversion = 'Protección y promoción social'
-    GROUP BY cod_distrito
 )
 SELECT 
     i.cod_distrito,
@@ -511,10 +475,9 @@ ORDER BY s.percepcion_seguridad DESC;
 WITH inversion_educacion AS (
     SELECT 
         cod_distrito,
-        AVG(total_invertido) AS inversion_media_educacion
-    FROM presupuestos
+        inversion_media_area AS inversion_media_educacion
+    FROM resumen_inversion_area
     WHERE area_inversion = 'Educación'
-    GROUP BY cod_distrito
 )
 SELECT 
     i.cod_distrito,
@@ -548,10 +511,9 @@ ORDER BY eco.renta_media DESC;
 WITH inversion_cultura AS (
     SELECT 
         cod_distrito,
-        AVG(total_invertido) AS inversion_media_cultura
-    FROM presupuestos
+        inversion_media_area AS inversion_media_cultura
+    FROM resumen_inversion_area
     WHERE area_inversion = 'Cultura'
-    GROUP BY cod_distrito
 )
 SELECT 
     i.cod_distrito,
@@ -586,10 +548,9 @@ ORDER BY e.tasa_absentismo DESC;
 WITH inversion_deportes AS (
     SELECT 
         cod_distrito,
-        AVG(total_invertido) AS inversion_media_deportes
-    FROM presupuestos
+        inversion_media_area AS inversion_media_deportes
+    FROM resumen_inversion_area
     WHERE area_inversion = 'Deportes, juventud y esparcimiento'
-    GROUP BY cod_distrito
 )
 SELECT 
     i.cod_distrito,
@@ -632,10 +593,9 @@ ORDER BY p.proporcion_migrantes DESC;
 WITH inversion_educacion AS (
     SELECT 
         cod_distrito,
-        AVG(total_invertido) AS inversion_media_educacion
-    FROM presupuestos
+        inversion_media_area AS inversion_media_educacion
+    FROM resumen_inversion_area
     WHERE area_inversion = 'Educación'
-    GROUP BY cod_distrito
 )
 SELECT 
     i.cod_distrito,
@@ -650,10 +610,9 @@ ORDER BY e.tasa_sin_estudios DESC;
 WITH inversion_cultura AS (
     SELECT 
         cod_distrito,
-        AVG(total_invertido) AS inversion_media_cultura
-    FROM presupuestos
+        inversion_media_area AS inversion_media_cultura
+    FROM resumen_inversion_area
     WHERE area_inversion = 'Cultura'
-    GROUP BY cod_distrito
 )
 SELECT 
     i.cod_distrito,
@@ -678,10 +637,9 @@ ORDER BY eco.renta_media DESC;
 WITH inversion_deportes AS (
     SELECT 
         cod_distrito,
-        AVG(total_invertido) AS inversion_media_deportes
-    FROM presupuestos
+        inversion_media_area AS inversion_media_deportes
+    FROM resumen_inversion_area
     WHERE area_inversion = 'Deportes, juventud y esparcimiento'
-    GROUP BY cod_distrito
 )
 SELECT 
     i.cod_distrito,
@@ -696,10 +654,9 @@ ORDER BY i.inversion_media_deportes DESC;
 WITH inversion_medio_ambiente AS (
     SELECT 
         cod_distrito,
-        AVG(total_invertido) AS inversion_media_medio_ambiente
-    FROM presupuestos
+        inversion_media_area AS inversion_media_medio_ambiente
+    FROM resumen_inversion_area
     WHERE area_inversion = 'Medio ambiente'
-    GROUP BY cod_distrito
 )
 SELECT 
     i.cod_distrito,
@@ -718,10 +675,9 @@ ORDER BY e.satisfaccion_espacios_verdes DESC;
 WITH inversion_salud AS (
     SELECT 
         cod_distrito,
-        AVG(total_invertido) AS inversion_media_salud
-    FROM presupuestos
+        inversion_media_area AS inversion_media_salud
+    FROM resumen_inversion_area
     WHERE area_inversion = 'Salud pública'
-    GROUP BY cod_distrito
 )
 SELECT 
     i.cod_distrito,
@@ -747,10 +703,9 @@ ORDER BY s.tasa_centros_sanitarios DESC;
 WITH inversion_deportes AS (
     SELECT 
         cod_distrito,
-        AVG(total_invertido) AS inversion_media_deportes
-    FROM presupuestos
+        inversion_media_area AS inversion_media_deportes
+    FROM resumen_inversion_area
     WHERE area_inversion = 'Deportes, juventud y esparcimiento'
-    GROUP BY cod_distrito
 )
 SELECT 
     i.cod_distrito,
@@ -805,10 +760,9 @@ ORDER BY p.proporcion_envejecimiento DESC;
 WITH inversion_deportes AS (
     SELECT 
         cod_distrito,
-        AVG(total_invertido) AS inversion_media_deportes
-    FROM presupuestos
+        inversion_media_area AS inversion_media_deportes
+    FROM resumen_inversion_area
     WHERE area_inversion = 'Deportes, juventud y esparcimiento'
-    GROUP BY cod_distrito
 )
 SELECT 
     i.cod_distrito,
@@ -834,10 +788,9 @@ ORDER BY s.probabilidad_enfermedad_mental DESC;
 WITH inversion_deportes AS (
     SELECT 
         cod_distrito,
-        AVG(total_invertido) AS inversion_media_deportes
-    FROM presupuestos
+        inversion_media_area AS inversion_media_deportes
+    FROM resumen_inversion_area
     WHERE area_inversion = 'Deportes, juventud y esparcimiento'
-    GROUP BY cod_distrito
 )
 SELECT 
 	i.cod_distrito,
@@ -904,10 +857,9 @@ ORDER BY p.proporcion_envejecimiento DESC;
 WITH inversion_salud AS (
     SELECT 
         cod_distrito,
-        AVG(total_invertido) AS inversion_media_salud
-    FROM presupuestos
+        inversion_media_area AS inversion_media_salud
+    FROM resumen_inversion_area
     WHERE area_inversion = 'Salud pública'
-    GROUP BY cod_distrito
 )
 SELECT 
     i.cod_distrito,
@@ -923,10 +875,9 @@ ORDER BY s.consumo_de_medicamentos DESC;
 WITH inversion_salud AS (
     SELECT 
         cod_distrito,
-        AVG(total_invertido) AS inversion_media_salud
-    FROM presupuestos
+        inversion_media_area AS inversion_media_salud
+    FROM resumen_inversion_area
     WHERE area_inversion = 'Salud pública'
-    GROUP BY cod_distrito
 )
 SELECT 
     i.cod_distrito,
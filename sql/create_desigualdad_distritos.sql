@@ -94,6 +94,33 @@ CREATE TABLE presupuestos (
     PRIMARY KEY (cod_distrito, año, area_inversion)
 );
 
+-- Tablas de resumen de la inversión, se recalculan al cargar los datos
+CREATE TABLE resumen_inversion_anual (
+    cod_distrito FLOAT,
+    año INT,
+    inversion_total_anual FLOAT,
+    PRIMARY KEY (cod_distrito, año)
+);
+
+CREATE TABLE resumen_inversion_area (
+    cod_distrito FLOAT,
+    area_inversion VARCHAR(255),
+    inversion_total_area FLOAT,
+    num_registros INT,
+    inversion_media_area FLOAT,
+    PRIMARY KEY (cod_distrito, area_inversion)
+);
+
+CREATE TABLE resumen_inversion_distrito (
+    cod_distrito FLOAT,
+    inversion_total FLOAT,
+    num_años INT,
+    inversion_media_anual FLOAT,
+    numero_habitantes FLOAT,
+    inversion_per_capita FLOAT,
+    PRIMARY KEY (cod_distrito)
+);
+
 -- Ejecutar hasta aquí para insertar los datos en las tablas
 
 -- Ejecutar a partir de aquí una vez tengas la información en la base de datos
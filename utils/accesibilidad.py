@@ -0,0 +1,275 @@
+import numpy as np
+import pandas as pd
+from scipy.spatial import cKDTree
+
+from .equipamientos import cargar_equipamientos
+
+
+
+# Radio medio de la Tierra en metros
+RADIO_TIERRA = 6_371_008.8
+
+# Radios (en metros) para contar los equipamientos cercanos
+RADIOS = (500, 1000)
+
+# Puntos consultados a la vez en el índice
+TAMANO_LOTE = 200_000
+
+# Separación (en metros) de la rejilla de puntos de demanda
+PASO_REJILLA = 250
+
+
+
+###### FUNCIONES DEL ÍNDICE ESPACIAL ######
+
+def a_cartesianas(latitud, longitud):
+    """
+    Convierte coordenadas geográficas en puntos 3D sobre la esfera terrestre (en metros).
+
+    La distancia en línea recta entre dos puntos crece con la distancia sobre la superficie,
+    así que el índice da los mismos vecinos que la distancia geodésica en cualquier escala
+    (barrio, región o país) sin depender de una proyección.
+    """
+    latitud, longitud = np.radians(np.asarray(latitud, dtype=float)), np.radians(np.asarray(longitud, dtype=float))
+    coseno = np.cos(latitud)
+    return RADIO_TIERRA * np.column_stack([coseno * np.cos(longitud), coseno * np.sin(longitud), np.sin(latitud)])
+
+def cuerda_a_arco(cuerda):
+    # Distancia en línea recta -> distancia sobre la superficie
+    return 2 * RADIO_TIERRA * np.arcsin(np.clip(cuerda / (2 * RADIO_TIERRA), 0, 1))
+
+def arco_a_cuerda(arco):
+    # Distancia sobre la superficie -> distancia en línea recta
+    return 2 * RADIO_TIERRA * np.sin(np.minimum(arco, np.pi * RADIO_TIERRA) / (2 * RADIO_TIERRA))
+
+def construir_indice(df_equipamientos):
+    """
+    Construye un KD-tree con las coordenadas de los equipamientos. Los equipamientos sin
+    coordenadas no entran en el índice.
+
+    Args:
+        df_equipamientos (pandas.DataFrame): DataFrame con 'latitud' y 'longitud'.
+
+    Returns:
+        scipy.spatial.cKDTree: Índice espacial de los equipamientos.
+    """
+    coordenadas = df_equipamientos[['latitud', 'longitud']].to_numpy(dtype=float)
+    coordenadas = coordenadas[~np.isnan(coordenadas).any(axis=1)]
+    return cKDTree(a_cartesianas(coordenadas[:, 0], coordenadas[:, 1]))
+
+def distancia_mas_cercana(indice, latitud, longitud, k=1, tamano_lote=TAMANO_LOTE):
+    """
+    Distancia (en metros) de cada punto a su k-ésimo equipamiento más cercano, consultando
+    el índice por lotes.
+
+    Returns:
+        numpy.ndarray: Distancias (NaN para los puntos sin coordenadas o si hay menos de k equipamientos).
+    """
+    puntos = a_cartesianas(latitud, longitud)
+    distancias = np.full(len(puntos), np.nan)
+    validos = np.flatnonzero(~np.isnan(puntos).any(axis=1))
+
+    for inicio in range(0, len(validos), tamano_lote):
+        lote = validos[inicio:inicio + tamano_lote]
+        cuerdas, _ = indice.query(puntos[lote], k=[k], workers=-1)
+        distancias[lote] = np.where(np.isinf(cuerdas[:, 0]), np.nan, cuerda_a_arco(cuerdas[:, 0]))
+
+    return distancias
+
+def equipamientos_en_radio(indice, latitud, longitud, radio, tamano_lote=TAMANO_LOTE):
+    """
+    Número de equipamientos a menos de 'radio' metros de cada punto, consultando el índice por lotes.
+
+    Returns:
+        numpy.ndarray: Recuentos (0 para los puntos sin coordenadas).
+    """
+    puntos = a_cartesianas(latitud, longitud)
+    recuentos = np.zeros(len(puntos), dtype=np.int64)
+    validos = np.flatnonzero(~np.isnan(puntos).any(axis=1))
+
+    for inicio in range(0, len(validos), tamano_lote):
+        lote = validos[inicio:inicio + tamano_lote]
+        recuentos[lote] = indice.query_ball_point(puntos[lote], arco_a_cuerda(radio), return_length=True, workers=-1)
+
+    return recuentos
+
+
+
+###### FUNCIONES DE LOS PUNTOS DE DEMANDA ######
+
+def centroides_barrios(*dfs_equipamientos):
+    """
+    Aproxima el centro de cada barrio con la posición media de todos los equipamientos del
+    barrio (a falta de los límites de los barrios en el proyecto).
+
+    Como puntos de demanda estos centroides están sesgados hacia los equipamientos que se
+    miden (distancias más cortas y más equipamientos cercanos de lo real, sobre todo en los
+    barrios con uno o dos equipamientos), así que se usan para etiquetar la rejilla de
+    rejilla_barrios y no como orígenes.
+
+    Args:
+        dfs_equipamientos (pandas.DataFrame): DataFrames con 'cod_distrito', 'cod_barrio', 'latitud' y 'longitud'.
+
+    Returns:
+        pandas.DataFrame: Un barrio por fila con 'cod_distrito', 'cod_barrio', 'latitud' y 'longitud'.
+    """
+    columnas = ['cod_distrito', 'cod_barrio', 'latitud', 'longitud']
+    puntos = pd.concat([df[columnas] for df in dfs_equipamientos], ignore_index=True).dropna()
+    centroides = puntos.groupby(['cod_distrito', 'cod_barrio'], as_index=False)[['latitud', 'longitud']].mean()
+    return centroides.astype({'cod_distrito': 'int64', 'cod_barrio': 'int64'})
+
+def rejilla(latitud, longitud, paso=250):
+    """
+    Crea una rejilla regular de puntos (separados 'paso' metros) que cubre el rectángulo
+    de las coordenadas dadas.
+
+    Returns:
+        pandas.DataFrame: Puntos de la rejilla con 'latitud' y 'longitud'.
+    """
+    latitud, longitud = np.asarray(latitud, dtype=float), np.asarray(longitud, dtype=float)
+    grados_lat = np.degrees(paso / RADIO_TIERRA)
+    grados_lon = grados_lat / np.cos(np.radians(np.nanmean(latitud)))
+
+    lats = np.arange(np.nanmin(latitud), np.nanmax(latitud) + grados_lat, grados_lat)
+    lons = np.arange(np.nanmin(longitud), np.nanmax(longitud) + grados_lon, grados_lon)
+    malla_lat, malla_lon = np.meshgrid(lats, lons, indexing='ij')
+    return pd.DataFrame({'latitud': malla_lat.ravel(), 'longitud': malla_lon.ravel()})
+
+def asignar_barrio(puntos, centroides):
+    """
+    Asigna cada punto (por ejemplo, de una rejilla) al barrio con el centroide más cercano.
+
+    Returns:
+        pandas.DataFrame: Los puntos con 'cod_distrito' y 'cod_barrio'.
+    """
+    indice = construir_indice(centroides)
+    _, posiciones = indice.query(a_cartesianas(puntos['latitud'], puntos['longitud']), workers=-1)
+    cercanos = centroides.iloc[posiciones]
+    return puntos.assign(cod_distrito=cercanos['cod_distrito'].to_numpy(),
+                         cod_barrio=cercanos['cod_barrio'].to_numpy())
+
+
+
+def rejilla_barrios(*dfs_equipamientos, paso=PASO_REJILLA):
+    """
+    Puntos de demanda repartidos de forma uniforme por la ciudad: una rejilla regular en la
+    que cada punto se asigna al barrio con el centroide más cercano. Se descartan los puntos
+    más alejados de ese centroide que el equipamiento más lejano del barrio (con un mínimo
+    de 'paso' metros), que quedan fuera de la ciudad.
+
+    Args:
+        dfs_equipamientos (pandas.DataFrame): DataFrames con 'cod_distrito', 'cod_barrio', 'latitud' y 'longitud'.
+        paso (int): Separación de la rejilla en metros.
+
+    Returns:
+        pandas.DataFrame: Puntos de la rejilla con 'latitud', 'longitud', 'cod_distrito' y 'cod_barrio'.
+    """
+    centroides = centroides_barrios(*dfs_equipamientos)
+    columnas = ['cod_distrito', 'cod_barrio', 'latitud', 'longitud']
+    equipamientos = pd.concat([df[columnas] for df in dfs_equipamientos], ignore_index=True).dropna()
+    equipamientos = equipamientos.astype({'cod_distrito': 'int64', 'cod_barrio': 'int64'})
+
+    # Alcance de cada barrio: distancia de su centroide al equipamiento más lejano
+    cruce = equipamientos.merge(centroides, on=['cod_distrito', 'cod_barrio'], suffixes=('', '_centroide'))
+    distancias = np.linalg.norm(a_cartesianas(cruce['latitud'], cruce['longitud']) -
+                                a_cartesianas(cruce['latitud_centroide'], cruce['longitud_centroide']), axis=1)
+    alcance = pd.Series(distancias).groupby([cruce['cod_distrito'], cruce['cod_barrio']]).max()
+    alcance = np.maximum(alcance.reindex(pd.MultiIndex.from_frame(centroides[['cod_distrito', 'cod_barrio']])).to_numpy(),
+                         arco_a_cuerda(paso))
+
+    puntos = rejilla(equipamientos['latitud'], equipamientos['longitud'], paso)
+    cuerdas, posiciones = construir_indice(centroides).query(a_cartesianas(puntos['latitud'], puntos['longitud']),
+                                                             workers=-1)
+    dentro = cuerdas <= alcance[posiciones]
+    cercanos = centroides.iloc[posiciones[dentro]]
+    return puntos[dentro].reset_index(drop=True).assign(cod_distrito=cercanos['cod_distrito'].to_numpy(),
+                                                         cod_barrio=cercanos['cod_barrio'].to_numpy())
+
+
+
+###### INDICADORES DE ACCESIBILIDAD ######
+
+def medir_accesibilidad(df_equipamientos, puntos, nombre, radios=RADIOS):
+    """
+    Calcula para cada punto la distancia al equipamiento más cercano y el número de
+    equipamientos a menos de cada radio.
+
+    Args:
+        df_equipamientos (pandas.DataFrame): Equipamientos con 'latitud' y 'longitud'.
+        puntos (pandas.DataFrame): Puntos de demanda con 'latitud' y 'longitud'.
+        nombre (str): Sufijo de las columnas (por ejemplo 'centros_sanitarios').
+        radios (list): Radios en metros.
+
+    Returns:
+        pandas.DataFrame: Los puntos con 'distancia_{nombre}' y '{nombre}_{radio}m'.
+    """
+    indice = construir_indice(df_equipamientos)
+    resultado = puntos.copy()
+    resultado[f'distancia_{nombre}'] = distancia_mas_cercana(indice, puntos['latitud'], puntos['longitud'])
+    for radio in radios:
+        resultado[f'{nombre}_{radio}m'] = equipamientos_en_radio(indice, puntos['latitud'], puntos['longitud'], radio)
+    return resultado
+
+def accesibilidad_distritos(equipamientos, puntos, radios=RADIOS, peso=None):
+    """
+    Indicadores de accesibilidad por distrito para varios tipos de equipamientos: distancia
+    media al más cercano, número medio de equipamientos a menos de cada radio y porcentaje
+    de puntos con al menos uno a menos de cada radio.
+
+    Args:
+        equipamientos (dict): Diccionario {nombre: DataFrame de equipamientos}.
+        puntos (pandas.DataFrame): Puntos de demanda con 'cod_distrito', 'latitud' y 'longitud'
+            (centroides de barrio, rejilla...).
+        radios (list): Radios en metros.
+        peso (str): Columna de 'puntos' con la población de cada punto para ponderar las medias (opcional).
+
+    Returns:
+        pandas.DataFrame: Un distrito por fila con los indicadores de cada tipo de equipamiento.
+    """
+    pesos = puntos[peso].to_numpy(dtype=float) if peso else np.ones(len(puntos))
+    resultado = pd.DataFrame({'cod_distrito': np.sort(puntos['cod_distrito'].unique())})
+
+    for nombre, df_equipamientos in equipamientos.items():
+        medidas = medir_accesibilidad(df_equipamientos, puntos, nombre, radios)
+
+        columnas = {f'distancia_media_{nombre}': medidas[f'distancia_{nombre}']}
+        for radio in radios:
+            columnas[f'{nombre}_{radio}m'] = medidas[f'{nombre}_{radio}m']
+            columnas[f'porcentaje_{nombre}_{radio}m'] = (medidas[f'{nombre}_{radio}m'] > 0) * 100.0
+        columnas = pd.DataFrame(columnas)
+
+        # Medias ponderadas por distrito
+        ponderadas = columnas.mul(pesos, axis=0).groupby(puntos['cod_distrito'].to_numpy()).sum()
+        total_pesos = pd.Series(pesos).groupby(puntos['cod_distrito'].to_numpy()).sum()
+        medias = ponderadas.div(total_pesos, axis=0).round(2)
+
+        resultado = resultado.merge(medias, left_on='cod_distrito', right_index=True, how='left')
+
+    return resultado
+
+def accesibilidad_equipamientos(rutas, radios=RADIOS, paso=PASO_REJILLA):
+    """
+    Calcula los indicadores de accesibilidad por distrito a partir de los archivos de
+    equipamientos, usando como puntos de demanda una rejilla con separación 'paso' metros
+    asignada a los barrios (rejilla_barrios).
+
+    Con paso=None se usan los centroides de los barrios, que están sesgados hacia los
+    equipamientos medidos (ver centroides_barrios).
+
+    Args:
+        rutas (dict): Diccionario {nombre: ruta del archivo de equipamientos}.
+        radios (list): Radios en metros.
+        paso (int): Separación de la rejilla en metros (None para usar los centroides de los barrios).
+
+    Returns:
+        pandas.DataFrame: Un distrito por fila con los indicadores de cada tipo de equipamiento.
+    """
+    equipamientos = {nombre: cargar_equipamientos(ruta, ['COD-DISTRITO', 'COD-BARRIO', 'LATITUD', 'LONGITUD'])
+                     for nombre, ruta in rutas.items()}
+
+    if paso:
+        puntos = rejilla_barrios(*equipamientos.values(), paso=paso)
+    else:
+        puntos = centroides_barrios(*equipamientos.values())
+
+    return accesibilidad_distritos(equipamientos, puntos, radios)
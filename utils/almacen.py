@@ -0,0 +1,141 @@
+import json
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+
+
+# Carpeta por defecto donde se guardan los artefactos
+CARPETA_ARTEFACTOS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'artefactos')
+
+
+
+###### FUNCIONES DE GUARDADO DE ARTEFACTOS ######
+
+def guardar_artefacto(df, nombre, carpeta=CARPETA_ARTEFACTOS):
+    """
+    Guarda un DataFrame limpio en formato columnar binario: un archivo .npy por columna
+    y un 'esquema.json' con el orden, los tipos y las categorías de las columnas de texto.
+
+    Las columnas de texto se guardan como códigos enteros más su lista de categorías, de
+    forma que todas las columnas se pueden cargar después sin volver a interpretar texto.
+
+    Args:
+        df (pandas.DataFrame): DataFrame a guardar.
+        nombre (str): Nombre del artefacto (por ejemplo 'economia').
+        carpeta (str): Carpeta donde se guardan los artefactos (opcional).
+    """
+    destino = os.path.join(carpeta, nombre)
+    temporal = destino + '.tmp'
+    shutil.rmtree(temporal, ignore_errors=True)
+    os.makedirs(temporal)
+
+    esquema = {'filas': len(df), 'columnas': []}
+    for i, columna in enumerate(df.columns):
+        serie = df[columna]
+        archivo = f'{i:03d}.npy'
+        descripcion = {'nombre': columna, 'archivo': archivo}
+
+        if isinstance(serie.dtype, pd.CategoricalDtype) or serie.dtype == object or pd.api.types.is_string_dtype(serie):
+            # Las columnas de texto se guardan como códigos y categorías
+            categorica = serie.astype('category')
+            valores = categorica.cat.codes.to_numpy()
+            descripcion['tipo'] = 'categoria'
+            descripcion['categorias'] = categorica.cat.categories.tolist()
+            descripcion['categorias_tipo'] = str(categorica.cat.categories.dtype)
+            descripcion['categorica'] = isinstance(serie.dtype, pd.CategoricalDtype)
+            if not descripcion['categorica'] and serie.dtype != object:
+                # Tipo de texto de pandas ('string') para recuperarlo al cargar
+                descripcion['tipo_texto'] = str(serie.dtype)
+        elif pd.api.types.is_extension_array_dtype(serie):
+            # Los tipos con nulos de pandas (Int64, Float64...) se guardan como float64 con NaN
+            valores = serie.to_numpy(dtype='float64', na_value=np.nan)
+            descripcion['tipo'] = str(serie.dtype)
+        else:
+            valores = serie.to_numpy()
+            descripcion['tipo'] = str(serie.dtype)
+
+        np.save(os.path.join(temporal, archivo), np.ascontiguousarray(valores), allow_pickle=False)
+        esquema['columnas'].append(descripcion)
+
+    with open(os.path.join(temporal, 'esquema.json'), 'w', encoding='utf-8') as f:
+        json.dump(esquema, f, ensure_ascii=False, indent=1)
+
+    # Sustituir la versión anterior solo cuando la nueva está completa
+    shutil.rmtree(destino, ignore_errors=True)
+    os.replace(temporal, destino)
+
+def guardar_artefactos(dataframes, carpeta=CARPETA_ARTEFACTOS):
+    """
+    Guarda varios DataFrames limpios como artefactos.
+
+    Args:
+        dataframes (dict): Diccionario {nombre: DataFrame}.
+        carpeta (str): Carpeta donde se guardan los artefactos (opcional).
+    """
+    for nombre, df in dataframes.items():
+        guardar_artefacto(df, nombre, carpeta)
+
+
+
+###### FUNCIONES DE CARGA DE ARTEFACTOS ######
+
+def cargar_artefacto(nombre, carpeta=CARPETA_ARTEFACTOS, mmap=True):
+    """
+    Carga un artefacto guardado con guardar_artefacto.
+
+    Con mmap=True las columnas numéricas se mapean en memoria desde disco y el DataFrame
+    se construye sin copiarlas, por lo que la carga es casi inmediata. El mapeo es de copia
+    en escritura: el DataFrame se puede modificar como uno leído con pd.read_csv y los
+    cambios no llegan al artefacto.
+
+    Args:
+        nombre (str): Nombre del artefacto.
+        carpeta (str): Carpeta donde se guardan los artefactos (opcional).
+        mmap (bool): Si se mapean los archivos en memoria en lugar de leerlos.
+
+    Returns:
+        pandas.DataFrame: DataFrame con las mismas columnas y tipos que el original.
+    """
+    ruta = os.path.join(carpeta, nombre)
+    with open(os.path.join(ruta, 'esquema.json'), encoding='utf-8') as f:
+        esquema = json.load(f)
+
+    columnas = {}
+    for descripcion in esquema['columnas']:
+        valores = np.load(os.path.join(ruta, descripcion['archivo']), mmap_mode='c' if mmap else None,
+                          allow_pickle=False)
+
+        if descripcion['tipo'] == 'categoria':
+            categorias = pd.Index(descripcion['categorias'], dtype=descripcion['categorias_tipo'])
+            serie = pd.Categorical.from_codes(np.asarray(valores), categories=categorias)
+            if 'tipo_texto' in descripcion:
+                serie = pd.array(np.asarray(serie, dtype=object), dtype=descripcion['tipo_texto'])
+            elif not descripcion['categorica']:
+                serie = np.asarray(serie, dtype=object)
+            columnas[descripcion['nombre']] = serie
+        elif descripcion['tipo'] != str(valores.dtype):
+            columnas[descripcion['nombre']] = pd.array(valores, dtype=descripcion['tipo'])
+        else:
+            columnas[descripcion['nombre']] = valores
+
+    return pd.DataFrame(columnas, copy=False)
+
+def cargar_artefactos(nombres=None, carpeta=CARPETA_ARTEFACTOS, mmap=True):
+    """
+    Carga varios artefactos.
+
+    Args:
+        nombres (list): Nombres de los artefactos (por defecto todos los de la carpeta).
+        carpeta (str): Carpeta donde se guardan los artefactos (opcional).
+        mmap (bool): Si se mapean los archivos en memoria en lugar de leerlos.
+
+    Returns:
+        dict: Diccionario {nombre: DataFrame}.
+    """
+    if nombres is None:
+        nombres = sorted(n for n in os.listdir(carpeta) if os.path.isfile(os.path.join(carpeta, n, 'esquema.json')))
+
+    return {nombre: cargar_artefacto(nombre, carpeta, mmap) for nombre in nombres}
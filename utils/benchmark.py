@@ -0,0 +1,406 @@
+import argparse
+import ast
+import inspect
+import json
+import os
+import platform
+import shutil
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import create_engine
+
+from . import functions
+from .almacen import CARPETA_ARTEFACTOS
+from .carga_sql import cargar_tablas
+from .equipamientos import contar_equipamientos
+from .functions import (MATRICES_AHP, calcular_ahp_cache, calcular_nota_economia, calcular_nota_educacion,
+                        calcular_nota_salud, calcular_nota_social, calcular_pesos_ahp, crear_df_presupuestos,
+                        resolver_ahp)
+from .pipeline import (etapa_economia, etapa_educacion, etapa_indicadores, etapa_indices, etapa_matriz,
+                       etapa_poblacion, etapa_salud, etapa_social)
+
+
+
+# Carpeta donde se guardan los resultados de los benchmarks
+CARPETA_BENCHMARKS = os.path.join(CARPETA_ARTEFACTOS, 'benchmarks')
+
+# Tamaño actual de los datos (escala 1)
+UNIDADES = 21
+AÑOS = list(range(2012, 2023))
+LINEAS_POR_ARCHIVO = 1600
+EQUIPAMIENTOS_POR_UNIDAD = 90
+
+# Escalas que se miden por defecto
+ESCALAS = (1, 10, 100)
+
+# Áreas de inversión de los archivos de presupuestos
+AREAS_INVERSION = [
+    'Educación', 'Deportes, juventud y esparcimiento', 'Protección y promoción social', 'Cultura',
+    'Mantenimiento urbano', 'Urbanismo', 'Medio ambiente', 'Inversiones de carácter general', 'Salud pública',
+    'Protección Civil y seguridad ciudadana', 'Otros bienes públicos de carácter social', 'Infraestructuras',
+    'Sectores productivos', 'Tráfico, estacionamiento y transporte público',
+    'Otros bienes públicos de carácter económico']
+
+# Esquema común de los listados de equipamientos municipales
+COLUMNAS_EQUIPAMIENTOS = [
+    'PK', 'NOMBRE', 'DESCRIPCION-ENTIDAD', 'HORARIO', 'EQUIPAMIENTO', 'TRANSPORTE', 'DESCRIPCION',
+    'ACCESIBILIDAD', 'CONTENT-URL', 'NOMBRE-VIA', 'CLASE-VIAL', 'TIPO-NUM', 'NUM', 'PLANTA', 'PUERTA',
+    'ESCALERAS', 'ORIENTACION', 'LOCALIDAD', 'PROVINCIA', 'CODIGO-POSTAL', 'COD-BARRIO', 'BARRIO',
+    'COD-DISTRITO', 'DISTRITO', 'COORDENADA-X', 'COORDENADA-Y', 'LATITUD', 'LONGITUD', 'TELEFONO', 'FAX',
+    'EMAIL', 'TIPO']
+
+# Funciones crear_df_* de las que se sacan los indicadores que necesita el pipeline
+FUNCIONES_INDICADORES = ['crear_df_economia', 'crear_df_educacion', 'crear_df_cultura', 'crear_df_bienestar',
+                         'crear_df_social', 'crear_df_salud', 'crear_df_poblacion']
+
+
+
+###### GENERADOR DE DATOS SINTÉTICOS ######
+
+def indicadores_requeridos():
+    # Nombres de los indicadores que seleccionan las funciones crear_df_* (sus listas de textos)
+    indicadores = []
+    for nombre in FUNCIONES_INDICADORES:
+        arbol = ast.parse(inspect.getsource(getattr(functions, nombre)))
+        for nodo in ast.walk(arbol):
+            if isinstance(nodo, ast.List) and all(isinstance(e, ast.Constant) for e in nodo.elts):
+                indicadores += [e.value for e in nodo.elts if e.value not in indicadores]
+    return indicadores
+
+def formato_espanol(valores):
+    # 1234.5 -> '1.234,50', como en el archivo de indicadores
+    texto = pd.Series(valores).map('{:,.2f}'.format)
+    return texto.str.replace(',', '_').str.replace('.', ',').str.replace('_', '.')
+
+def generar_indicadores(ruta, unidades, indicadores_extra=0, rng=None):
+    # Archivo largo de indicadores: una fila por unidad e indicador, con números en formato español
+    rng = rng or np.random.default_rng()
+    indicadores = indicadores_requeridos() + [f'Indicador sintético {i + 1}' for i in range(indicadores_extra)]
+
+    codigos = np.repeat(np.arange(1, unidades + 1), len(indicadores))
+    nombres = np.tile(np.array(indicadores, dtype=object), unidades)
+    valores = rng.uniform(1, 1000, len(codigos))
+    valores[nombres == 'Número Habitantes'] = rng.uniform(20_000, 250_000, unidades)
+
+    pd.DataFrame({'cod_distrito': codigos,
+                  'distrito': [f' Unidad {c} ' for c in codigos],
+                  'indicador_completo': nombres + ' ',
+                  'valor_indicador': formato_espanol(valores)}).to_csv(ruta, sep=';', index=False, encoding='utf-8-sig')
+    return len(codigos)
+
+def generar_presupuestos(carpeta, archivos, lineas, años=AÑOS, rng=None):
+    # Un archivo 'inversiones-madrid-2XX.csv' por distrito con 'lineas' partidas de inversión
+    rng = rng or np.random.default_rng()
+    os.makedirs(carpeta, exist_ok=True)
+    for i in range(1, archivos + 1):
+        gasto = rng.uniform(1_000, 500_000, lineas).round(2)
+        df = pd.DataFrame({'Año': rng.choice(años, lineas),
+                           'Id Línea': 'X12',
+                           'Nombre Línea': rng.choice(AREAS_INVERSION, lineas),
+                           'Inversión': 'OBRA DE ACONDICIONAMIENTO DE EDIFICIO MUNICIPAL',
+                           'Inversión.1': '',
+                           'Presupuesto Gasto': gasto,
+                           'Gasto Real': gasto})
+        df.to_csv(os.path.join(carpeta, f'inversiones-madrid-{200 + i}.csv'), index=False,
+                  header=['Año', 'Id Línea', 'Nombre Línea', 'Inversión', 'Inversión', 'Presupuesto Gasto', 'Gasto Real'])
+    return archivos * lineas
+
+def generar_equipamientos(ruta, unidades, por_unidad=EQUIPAMIENTOS_POR_UNIDAD, rng=None):
+    # Listado de equipamientos con las 32 columnas (incluidos los campos largos de texto)
+    rng = rng or np.random.default_rng()
+    n = unidades * por_unidad
+    distritos = rng.integers(1, unidades + 1, n)
+    df = pd.DataFrame({columna: '' for columna in COLUMNAS_EQUIPAMIENTOS}, index=range(n))
+    df['PK'] = np.arange(1, n + 1)
+    df['NOMBRE'] = [f'Centro {i}' for i in range(n)]
+    df['DESCRIPCION'] = 'Centro municipal con servicios de atención y actividades para los vecinos del barrio. ' * 4
+    df['EQUIPAMIENTO'] = 'Aulas, salas polivalentes, biblioteca y zonas ajardinadas. ' * 3
+    df['TRANSPORTE'] = 'Metro: línea 1. Autobuses: 6, 26, 32. Cercanías: estación más próxima. ' * 2
+    df['CODIGO-POSTAL'] = 28000 + distritos % 56
+    df['COD-BARRIO'] = rng.integers(1, 10, n)
+    df['BARRIO'] = 'BARRIO ' + df['COD-BARRIO'].astype(str)
+    df['COD-DISTRITO'] = distritos
+    df['DISTRITO'] = 'UNIDAD ' + pd.Series(distritos).astype(str)
+    df['LATITUD'] = rng.uniform(40.31, 40.56, n)
+    df['LONGITUD'] = rng.uniform(-3.84, -3.52, n)
+    df['TIPO'] = rng.choice(['/contenido/entidadesYorganismos/CentrosEducacion/ColegiosPublicos',
+                             '/contenido/entidadesYorganismos/CentrosAtencionMedica/CentrosSalud'], n)
+    df.to_csv(ruta, sep=';', index=False, encoding='latin1')
+    return n
+
+def generar_datos(carpeta, unidades=UNIDADES, años=AÑOS, indicadores_extra=0, lineas_por_archivo=LINEAS_POR_ARCHIVO,
+                  semilla=0):
+    """
+    Genera un conjunto de datos sintéticos con la misma forma que los archivos reales:
+    indicadores_generales_distritos.csv, los archivos inversiones-madrid-*.csv, los listados
+    de equipamientos, locales y riesgo de pobreza infantil.
+
+    Args:
+        carpeta (str): Carpeta de salida.
+        unidades (int): Número de unidades geográficas (distritos, barrios...).
+        años (list): Años de los presupuestos.
+        indicadores_extra (int): Indicadores sintéticos añadidos a los que usa el pipeline.
+        lineas_por_archivo (int): Partidas de inversión por archivo de presupuestos.
+        semilla (int): Semilla del generador aleatorio.
+
+    Returns:
+        dict: Rutas de los archivos (con las mismas claves que pipeline.RUTAS) y número de filas.
+    """
+    rng = np.random.default_rng(semilla)
+    os.makedirs(carpeta, exist_ok=True)
+    rutas = {'indicadores': os.path.join(carpeta, 'indicadores_generales_distritos.csv'),
+             'presupuestos': os.path.join(carpeta, 'presupuestos'),
+             'locales': os.path.join(carpeta, 'locales_madrid.csv'),
+             'centros_educativos': os.path.join(carpeta, 'centros-educativos.csv'),
+             'residencias': os.path.join(carpeta, 'residencias_apartamentos_mayores.csv'),
+             'pobreza_infantil': os.path.join(carpeta, 'riesgo_pobreza_infantil.csv'),
+             'centros_salud': os.path.join(carpeta, 'centros-atencion-medica.csv')}
+
+    codigos = np.arange(1, unidades + 1, dtype=float)
+    filas = {'indicadores': generar_indicadores(rutas['indicadores'], unidades, indicadores_extra, rng),
+             # El código del distrito sale de las dos últimas cifras del nombre del archivo
+             'presupuestos': generar_presupuestos(rutas['presupuestos'], min(unidades, 99), lineas_por_archivo, años, rng)}
+    for clave in ['centros_educativos', 'residencias', 'centros_salud']:
+        filas[clave] = generar_equipamientos(rutas[clave], unidades, rng=rng)
+
+    pd.DataFrame({'cod_distrito': codigos, 'num_locales': rng.integers(1_000, 12_000, unidades)}).to_csv(
+        rutas['locales'], index=False)
+    pd.DataFrame({'cod_distrito': codigos, 'distrito': [f'Unidad {int(c)}' for c in codigos],
+                  'tasa_riesgo_pobreza_infantil': rng.uniform(5, 40, unidades).round(1)}).to_csv(
+        rutas['pobreza_infantil'], index=False)
+
+    return {'rutas': rutas, 'filas': filas}
+
+
+
+###### MEDICIÓN ######
+
+def medir(funcion, *args, repeticiones=1, **kwargs):
+    """
+    Mide una función: el menor tiempo de varias repeticiones y, en una ejecución aparte, el
+    pico de memoria reservada por Python, NumPy y pandas (tracemalloc). El seguimiento de la
+    memoria ralentiza mucho el código con muchos objetos, así que no se mezcla con el tiempo.
+
+    Returns:
+        tuple: (resultado, segundos, pico de memoria en MB).
+    """
+    segundos = float('inf')
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        resultado = funcion(*args, **kwargs)
+        segundos = min(segundos, time.perf_counter() - inicio)
+
+    tracemalloc.start()
+    try:
+        funcion(*args, **kwargs)
+        pico = tracemalloc.get_traced_memory()[1] / 2 ** 20
+    finally:
+        tracemalloc.stop()
+
+    return resultado, segundos, pico
+
+def filas_resultado(resultado):
+    # Filas del resultado de una medida (para ver cómo crece con la escala)
+    if isinstance(resultado, pd.DataFrame):
+        return len(resultado)
+    if isinstance(resultado, dict):
+        return int(sum(v for v in resultado.values() if isinstance(v, (int, np.integer))))
+    return None
+
+def cargar_sqlite(dataframes):
+    # Carga completa en una base de datos SQLite temporal (esquema, tablas de resumen y transacción)
+    carpeta = tempfile.mkdtemp(prefix='benchmark_bd_')
+    engine = create_engine(f"sqlite:///{os.path.join(carpeta, 'desigualdad.db')}")
+    try:
+        return cargar_tablas(engine, dataframes)
+    finally:
+        engine.dispose()
+        shutil.rmtree(carpeta, ignore_errors=True)
+
+def cargar_sqlite_delta(dataframes):
+    # Carga completa y carga delta de los mismos datos en una base de datos SQLite en memoria
+    engine = create_engine('sqlite://')
+    try:
+        cargar_tablas(engine, dataframes)
+        return cargar_tablas(engine, dataframes, modo='delta')
+    finally:
+        engine.dispose()
+
+def ejecutar_escala(escala, carpeta, indicadores_extra=0, matrices_ahp=1000, repeticiones=3, semilla=0):
+    """
+    Genera los datos de una escala y mide cada paso del pipeline sobre ellos.
+
+    A escala N hay N veces más unidades geográficas, equipamientos y partidas de inversión
+    por archivo que en los datos actuales.
+
+    Returns:
+        list: Una fila por medida con la escala, los segundos, el pico de memoria y las filas.
+    """
+    datos = generar_datos(carpeta, UNIDADES * escala, AÑOS, indicadores_extra, LINEAS_POR_ARCHIVO * escala, semilla)
+    rutas = datos['rutas']
+    medidas = []
+
+    def registrar(nombre, funcion, *args, **kwargs):
+        resultado, segundos, pico = medir(funcion, *args, repeticiones=repeticiones, **kwargs)
+        medidas.append({'escala': escala, 'medida': nombre, 'segundos': round(segundos, 6),
+                        'memoria_pico_mb': round(pico, 3), 'filas': filas_resultado(resultado)})
+        return resultado
+
+    # Lectura y limpieza
+    indicadores = registrar('etapa_indicadores', etapa_indicadores, rutas['indicadores'])
+    presupuestos = registrar('crear_df_presupuestos', crear_df_presupuestos, rutas['presupuestos'], max_procesos=1)
+    registrar('contar_equipamientos', contar_equipamientos, rutas['centros_educativos'])
+
+    # Pivotado y tablas de los ámbitos (crear_df_*)
+    matriz = registrar('crear_matriz_indicadores', etapa_matriz, indicadores)
+    tablas = {'economia': registrar('crear_df_economia', etapa_economia, matriz, rutas['locales']),
+              'educacion': registrar('crear_df_educacion', etapa_educacion, matriz, rutas['centros_educativos']),
+              'social': registrar('crear_df_social', etapa_social, matriz, rutas['residencias'], rutas['pobreza_infantil']),
+              'salud': registrar('crear_df_salud', etapa_salud, matriz, rutas['centros_salud']),
+              'poblacion': registrar('crear_df_poblacion', etapa_poblacion, matriz)}
+
+    # Pesos AHP: las matrices de los ámbitos (sin caché) y una pila de matrices perturbadas
+    def pesos_ambitos():
+        calcular_ahp_cache.cache_clear()
+        return {ambito: calcular_pesos_ahp(ahp['variables'], ahp['matriz']) for ambito, ahp in MATRICES_AHP.items()}
+    registrar('calcular_pesos_ahp', pesos_ambitos)
+
+    rng = np.random.default_rng(semilla)
+    matriz_ahp = MATRICES_AHP['economia']['matriz']
+    perturbadas = np.broadcast_to(matriz_ahp, (matrices_ahp * escala,) + matriz_ahp.shape).copy()
+    perturbadas *= rng.uniform(0.8, 1.25, perturbadas.shape)
+    perturbadas = np.sqrt(perturbadas / np.swapaxes(perturbadas, -1, -2))
+    registrar('resolver_ahp', resolver_ahp, perturbadas)
+
+    # Notas e índices
+    notas = {'economia': registrar('calcular_nota_economia', calcular_nota_economia, tablas['economia']),
+             'educacion': registrar('calcular_nota_educacion', calcular_nota_educacion, tablas['educacion']),
+             'social': registrar('calcular_nota_social', calcular_nota_social, tablas['social']),
+             'salud': registrar('calcular_nota_salud', calcular_nota_salud, tablas['salud'])}
+    indices = registrar('calcular_indices_desigualdad', etapa_indices, notas['salud'], notas['social'],
+                        notas['economia'], notas['educacion'])
+
+    # Carga en la base de datos
+    registrar('cargar_tablas', cargar_sqlite, dict(tablas, indices=indices, presupuestos=presupuestos))
+    registrar('cargar_tablas_delta', cargar_sqlite_delta, dict(tablas, indices=indices, presupuestos=presupuestos))
+
+    return medidas
+
+def ejecutar_benchmark(escalas=ESCALAS, indicadores_extra=0, repeticiones=3, semilla=0, carpeta_datos=None,
+                       carpeta=CARPETA_BENCHMARKS):
+    """
+    Ejecuta el benchmark en varias escalas y guarda los resultados en un archivo JSON con
+    la fecha, para compararlos después con comparar_benchmarks.
+
+    Args:
+        escalas (list): Escalas a medir (1 es el tamaño actual de los datos).
+        indicadores_extra (int): Indicadores sintéticos añadidos a los del pipeline.
+        repeticiones (int): Repeticiones de cada medida (se guarda el menor tiempo).
+        semilla (int): Semilla de los datos sintéticos.
+        carpeta_datos (str): Carpeta donde generar los datos (por defecto una temporal que se borra).
+        carpeta (str): Carpeta donde se guardan los resultados (None para no guardarlos).
+
+    Returns:
+        tuple: DataFrame con las medidas y ruta del archivo de resultados.
+    """
+    medidas = []
+    for escala in escalas:
+        carpeta_escala = (os.path.join(carpeta_datos, f'escala_{escala}') if carpeta_datos
+                          else tempfile.mkdtemp(prefix=f'benchmark_{escala}_'))
+        try:
+            medidas += ejecutar_escala(escala, carpeta_escala, indicadores_extra, repeticiones=repeticiones,
+                                       semilla=semilla)
+        finally:
+            if not carpeta_datos:
+                shutil.rmtree(carpeta_escala, ignore_errors=True)
+
+    df_medidas = pd.DataFrame(medidas)
+    ruta = None
+    if carpeta:
+        os.makedirs(carpeta, exist_ok=True)
+        ruta = os.path.join(carpeta, f"benchmark_{datetime.now():%Y%m%d_%H%M%S}.json")
+        entorno = {'fecha': datetime.now().isoformat(timespec='seconds'), 'python': platform.python_version(),
+                   'pandas': pd.__version__, 'numpy': np.__version__, 'sistema': platform.platform(),
+                   'cpus': os.cpu_count(), 'indicadores_extra': indicadores_extra, 'semilla': semilla}
+        with open(ruta, 'w', encoding='utf-8') as f:
+            json.dump({'entorno': entorno, 'medidas': medidas}, f, ensure_ascii=False, indent=1)
+
+    return df_medidas, ruta
+
+
+
+###### COMPARACIÓN ######
+
+def cargar_benchmark(ruta):
+    # Medidas de un archivo de resultados
+    with open(ruta, encoding='utf-8') as f:
+        return pd.DataFrame(json.load(f)['medidas'])
+
+def comparar_benchmarks(actual, referencia, umbral=0.25, minimo_segundos=0.05):
+    """
+    Compara dos ejecuciones del benchmark medida a medida y marca las regresiones.
+
+    Args:
+        actual (pandas.DataFrame | str): Medidas (o ruta del archivo) de la ejecución nueva.
+        referencia (pandas.DataFrame | str): Medidas (o ruta del archivo) de la ejecución de referencia.
+        umbral (float): Aumento relativo a partir del cual una medida es una regresión (0.25 = 25 %).
+        minimo_segundos (float): Las medidas más rápidas que esto en ambas ejecuciones no se marcan
+            como regresión de tiempo (su variación es ruido).
+
+    Returns:
+        pandas.DataFrame: Una fila por escala y medida con los tiempos y memorias de ambas
+        ejecuciones, sus cocientes y si hay regresión de tiempo o de memoria.
+    """
+    actual = cargar_benchmark(actual) if isinstance(actual, str) else actual
+    referencia = cargar_benchmark(referencia) if isinstance(referencia, str) else referencia
+
+    comparacion = pd.merge(referencia[['escala', 'medida', 'segundos', 'memoria_pico_mb']],
+                           actual[['escala', 'medida', 'segundos', 'memoria_pico_mb']],
+                           on=['escala', 'medida'], suffixes=('_referencia', '_actual'))
+    comparacion['cociente_tiempo'] = (comparacion['segundos_actual'] / comparacion['segundos_referencia']).round(3)
+    comparacion['cociente_memoria'] = (comparacion['memoria_pico_mb_actual'] /
+                                       comparacion['memoria_pico_mb_referencia']).round(3)
+    comparacion['regresion_tiempo'] = ((comparacion['cociente_tiempo'] > 1 + umbral) &
+                                       (comparacion['segundos_actual'] >= minimo_segundos))
+    comparacion['regresion_memoria'] = comparacion['cociente_memoria'] > 1 + umbral
+    return comparacion
+
+
+
+###### LÍNEA DE COMANDOS ######
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m utils.benchmark',
+        description='Mide el tiempo y la memoria del pipeline con datos sintéticos a varias escalas.')
+    parser.add_argument('--escalas', type=int, nargs='+', default=list(ESCALAS), help='Escalas a medir.')
+    parser.add_argument('--indicadores-extra', type=int, default=0, help='Indicadores sintéticos adicionales.')
+    parser.add_argument('--repeticiones', type=int, default=3, help='Repeticiones de cada medida.')
+    parser.add_argument('--semilla', type=int, default=0, help='Semilla de los datos sintéticos.')
+    parser.add_argument('--datos', default=None, help='Carpeta donde conservar los datos generados.')
+    parser.add_argument('--carpeta', default=CARPETA_BENCHMARKS, help='Carpeta de los resultados.')
+    parser.add_argument('--referencia', default=None, help='Archivo de resultados con el que comparar.')
+    parser.add_argument('--umbral', type=float, default=0.25, help='Aumento relativo que se marca como regresión.')
+    args = parser.parse_args(argv)
+
+    df_medidas, ruta = ejecutar_benchmark(args.escalas, args.indicadores_extra, args.repeticiones, args.semilla,
+                                          args.datos, args.carpeta)
+    print(df_medidas.to_string(index=False))
+    if ruta:
+        print(f'Resultados guardados en {ruta}')
+
+    if args.referencia:
+        comparacion = comparar_benchmarks(df_medidas, args.referencia, args.umbral)
+        print(comparacion.to_string(index=False))
+        regresiones = comparacion[comparacion['regresion_tiempo'] | comparacion['regresion_memoria']]
+        if len(regresiones):
+            print(f"Regresiones: {', '.join(regresiones['medida'] + ' x' + regresiones['escala'].astype(str))}")
+
+
+if __name__ == '__main__':
+    main()
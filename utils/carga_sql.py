@@ -0,0 +1,436 @@
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import Column, Float, Integer, MetaData, PrimaryKeyConstraint, String, Table, inspect, select, text
+
+
+
+# Script con el esquema de la base de datos
+RUTA_ESQUEMA = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'sql',
+                            'create_desigualdad_distritos.sql')
+
+# Prefijo de las tablas temporales en las que se cargan los datos antes de sustituirlos
+PREFIJO_CARGA = 'carga_'
+
+# Diferencia relativa máxima para considerar iguales dos decimales en la carga incremental
+TOLERANCIA_FLOAT = 1e-6
+
+# Tablas de resumen de la inversión que se recalculan al cargar los datos, en orden de cálculo.
+# 'origenes' son las tablas cargadas de las que dependen, 'clave' las columnas por las que se
+# recalculan solo las filas afectadas y 'consulta' el SELECT con el hueco {filtro} para esas filas.
+RESUMENES = {
+    'resumen_inversion_anual': {
+        'origenes': ['presupuestos'],
+        'clave': ['cod_distrito', 'año'],
+        'prefijo': '',
+        'consulta': '''
+            SELECT cod_distrito, año, SUM(total_invertido)
+            FROM presupuestos {filtro}
+            GROUP BY cod_distrito, año'''},
+    'resumen_inversion_area': {
+        'origenes': ['presupuestos'],
+        'clave': ['cod_distrito', 'area_inversion'],
+        'prefijo': '',
+        'consulta': '''
+            SELECT cod_distrito, area_inversion, SUM(total_invertido), COUNT(total_invertido), AVG(total_invertido)
+            FROM presupuestos {filtro}
+            GROUP BY cod_distrito, area_inversion'''},
+    'resumen_inversion_distrito': {
+        'origenes': ['presupuestos', 'poblacion'],
+        'clave': ['cod_distrito'],
+        'prefijo': 'a.',
+        'consulta': '''
+            SELECT a.cod_distrito, SUM(a.inversion_total_anual), COUNT(*), SUM(a.inversion_total_anual) / COUNT(*),
+                   p.numero_habitantes, SUM(a.inversion_total_anual) / COUNT(*) / p.numero_habitantes
+            FROM resumen_inversion_anual a
+            LEFT JOIN poblacion p ON a.cod_distrito = p.cod_distrito {filtro}
+            GROUP BY a.cod_distrito, p.numero_habitantes'''},
+}
+
+# Tipos SQL del esquema y su equivalente en SQLAlchemy
+TIPOS_SQL = {'FLOAT': Float, 'INT': Integer, 'INTEGER': Integer, 'VARCHAR': String}
+
+
+
+###### FUNCIONES DEL ESQUEMA ######
+
+def leer_esquema(ruta=RUTA_ESQUEMA):
+    """
+    Lee las tablas declaradas en el script SQL de creación de la base de datos.
+
+    Args:
+        ruta (str): Ruta del script con las sentencias CREATE TABLE.
+
+    Returns:
+        tuple: Diccionario {tabla: {'columnas': [(nombre, tipo, longitud)], 'clave': [...]}}
+        y diccionario {tabla: [tablas a las que referencia con claves foráneas]}.
+    """
+    with open(ruta, encoding='utf-8') as f:
+        script = f.read()
+
+    tablas = {}
+    for nombre, cuerpo in re.findall(r'CREATE TABLE\s+(\w+)\s*\((.*?)\);', script, flags=re.S | re.I):
+        columnas, clave = [], []
+        for linea in [l.strip().rstrip(',') for l in cuerpo.splitlines() if l.strip()]:
+            clave_primaria = re.match(r'PRIMARY KEY\s*\((.*)\)', linea, flags=re.I)
+            if clave_primaria:
+                clave = [c.strip() for c in clave_primaria.group(1).split(',')]
+                continue
+            columna, tipo, longitud = re.match(r'(\S+)\s+(\w+)(?:\((\d+)\))?', linea).groups()
+            columnas.append((columna, tipo.upper(), int(longitud) if longitud else None))
+        tablas[nombre] = {'columnas': columnas, 'clave': clave}
+
+    referencias = {tabla: [] for tabla in tablas}
+    for tabla, referenciada in re.findall(r'ALTER TABLE\s+(\w+).*?REFERENCES\s+(\w+)', script, flags=re.S | re.I):
+        referencias[tabla].append(referenciada)
+
+    return tablas, referencias
+
+def crear_tabla(metadata, nombre, definicion):
+    # Crear el objeto Table de SQLAlchemy con los tipos declarados en el esquema
+    columnas = [Column(columna, TIPOS_SQL[tipo](longitud) if longitud else TIPOS_SQL[tipo]())
+                for columna, tipo, longitud in definicion['columnas']]
+    restricciones = [PrimaryKeyConstraint(*definicion['clave'])] if definicion['clave'] else []
+    return Table(nombre, metadata, *columnas, *restricciones)
+
+def ordenar_tablas(nombres, referencias):
+    # Ordenar las tablas para que las referenciadas por claves foráneas vayan primero
+    orden = []
+
+    def visitar(nombre):
+        if nombre in orden:
+            return
+        for referenciada in referencias.get(nombre, []):
+            if referenciada in nombres:
+                visitar(referenciada)
+        orden.append(nombre)
+
+    for nombre in nombres:
+        visitar(nombre)
+
+    return orden
+
+
+
+###### FUNCIONES DE CARGA ######
+
+def preparar_columnas(df, tabla):
+    """
+    Selecciona las columnas de la tabla y las convierte a los tipos declarados en el esquema.
+
+    Args:
+        df (pandas.DataFrame): DataFrame con las columnas de la tabla.
+        tabla (sqlalchemy.Table): Tabla de destino.
+
+    Returns:
+        pandas.DataFrame: DataFrame con las columnas de la tabla, en su orden y con sus tipos.
+    """
+    columnas = {}
+    for columna in tabla.columns:
+        serie = df[columna.name]
+        if isinstance(columna.type, Float):
+            serie = pd.to_numeric(serie, errors='coerce').astype(float)
+        elif isinstance(columna.type, Integer):
+            serie = pd.to_numeric(serie, errors='coerce').astype('Int64')
+        else:
+            serie = serie.astype('string')
+        columnas[columna.name] = serie.reset_index(drop=True)
+
+    return pd.DataFrame(columnas)
+
+def preparar_registros(df):
+    # Convertir un DataFrame ya preparado en tuplas de tipos de Python, con None en lugar de los nulos
+    columnas = [df[c].astype(object).where(df[c].notna(), None).tolist() for c in df.columns]
+    return list(zip(*columnas))
+
+def marcadores(engine, n, inicio=0):
+    # Marcadores de parámetros posicionales con el formato del driver
+    estilo = engine.dialect.paramstyle
+    if estilo == 'qmark':
+        return ['?'] * n
+    if estilo == 'numeric':
+        return [f':{inicio + i + 1}' for i in range(n)]
+    return ['%s'] * n
+
+def sentencia_insercion(engine, nombre, columnas):
+    # Crear la sentencia INSERT con el formato de parámetros del driver
+    preparador = engine.dialect.identifier_preparer
+    return (f'INSERT INTO {preparador.quote(nombre)} ({", ".join(preparador.quote(c) for c in columnas)}) '
+            f'VALUES ({", ".join(marcadores(engine, len(columnas)))})')
+
+def sentencia_actualizacion(engine, nombre, columnas, clave):
+    # Crear la sentencia UPDATE por clave primaria (primero los valores y después la clave)
+    preparador = engine.dialect.identifier_preparer
+    valores = marcadores(engine, len(columnas))
+    condiciones = marcadores(engine, len(clave), len(columnas))
+    return (f'UPDATE {preparador.quote(nombre)} '
+            f'SET {", ".join(f"{preparador.quote(c)} = {m}" for c, m in zip(columnas, valores))} '
+            f'WHERE {" AND ".join(f"{preparador.quote(c)} = {m}" for c, m in zip(clave, condiciones))}')
+
+def sentencia_borrado(engine, nombre, clave):
+    # Crear la sentencia DELETE por clave primaria
+    preparador = engine.dialect.identifier_preparer
+    return (f'DELETE FROM {preparador.quote(nombre)} '
+            f'WHERE {" AND ".join(f"{preparador.quote(c)} = {m}" for c, m in zip(clave, marcadores(engine, len(clave))))}')
+
+def ejecutar_por_lotes(conexion, sentencia, registros, tamano_lote):
+    # Enviar los registros con executemany del driver, que en pymysql se convierte en un INSERT de varias filas
+    for inicio in range(0, len(registros), tamano_lote):
+        conexion.exec_driver_sql(sentencia, registros[inicio:inicio + tamano_lote])
+
+def cargar_tabla_temporal(engine, tabla, df, tamano_lote):
+    """
+    Carga un DataFrame en la tabla temporal de una tabla del esquema por lotes.
+    La tabla temporal se crea de nuevo en cada carga.
+    """
+    temporal = tabla.to_metadata(MetaData(), name=PREFIJO_CARGA + tabla.name)
+    registros = preparar_registros(preparar_columnas(df, tabla))
+
+    with engine.begin() as conexion:
+        temporal.drop(conexion, checkfirst=True)
+        temporal.create(conexion)
+        ejecutar_por_lotes(conexion, sentencia_insercion(engine, temporal.name, [c.name for c in temporal.columns]),
+                           registros, tamano_lote)
+
+    return len(registros)
+
+def ejecutar_por_tabla(funcion, argumentos, max_trabajadores):
+    # Aplicar la función a cada tabla {tabla: argumentos} en un pool de hilos, o en el hilo actual si hay
+    # un solo trabajador (una base SQLite en memoria solo existe en la conexión del hilo que la abre)
+    if max_trabajadores == 1:
+        return {nombre: funcion(*args) for nombre, args in argumentos.items()}
+    with ThreadPoolExecutor(max_workers=max_trabajadores) as executor:
+        futuros = {nombre: executor.submit(funcion, *args) for nombre, args in argumentos.items()}
+        return {nombre: futuro.result() for nombre, futuro in futuros.items()}
+
+
+
+###### FUNCIONES DE CARGA INCREMENTAL ######
+
+def valores_distintos(nuevos, actuales, tolerancia=TOLERANCIA_FLOAT):
+    # Comparar dos series elemento a elemento: dos nulos son iguales y los decimales se comparan con tolerancia
+    nulos = nuevos.isna().to_numpy() & actuales.isna().to_numpy()
+    if pd.api.types.is_float_dtype(nuevos):
+        iguales = np.isclose(nuevos.to_numpy(), actuales.to_numpy(), rtol=tolerancia, atol=0)
+    else:
+        iguales = (nuevos == actuales).fillna(False).to_numpy(dtype=bool)
+    return ~(iguales | nulos)
+
+def calcular_delta(nuevo, actual, clave, tolerancia=TOLERANCIA_FLOAT):
+    """
+    Calcula las diferencias entre el contenido nuevo de una tabla y el actual por su clave primaria.
+
+    Args:
+        nuevo (pandas.DataFrame): Contenido nuevo, preparado con preparar_columnas.
+        actual (pandas.DataFrame): Contenido actual de la tabla, con las mismas columnas y tipos.
+        clave (list): Columnas de la clave primaria.
+        tolerancia (float): Diferencia relativa por debajo de la cual dos decimales se
+            consideran iguales (las columnas FLOAT de MySQL son de precisión simple).
+
+    Returns:
+        tuple: DataFrames con las filas a insertar, las filas a actualizar y las claves a borrar.
+    """
+    if nuevo.duplicated(clave).any():
+        raise ValueError(f'Hay claves duplicadas en las columnas {clave}.')
+
+    columnas = list(nuevo.columns)
+    valores = [c for c in columnas if c not in clave]
+    cruce = nuevo.merge(actual, on=clave, how='outer', suffixes=('', '_actual'), indicator=True)
+
+    altas = cruce.loc[cruce['_merge'] == 'left_only', columnas]
+    bajas = cruce.loc[cruce['_merge'] == 'right_only', clave]
+
+    comunes = cruce[cruce['_merge'] == 'both']
+    distintos = np.zeros(len(comunes), dtype=bool)
+    for columna in valores:
+        distintos |= valores_distintos(comunes[columna], comunes[f'{columna}_actual'], tolerancia)
+    cambios = comunes.loc[distintos, columnas]
+
+    return altas, cambios, bajas
+
+def leer_delta(engine, tabla, df, tolerancia=TOLERANCIA_FLOAT):
+    # Leer el contenido actual de la tabla y calcular sus diferencias con el DataFrame
+    with engine.connect() as conexion:
+        actual = pd.read_sql(select(tabla), conexion)
+
+    return calcular_delta(preparar_columnas(df, tabla), preparar_columnas(actual, tabla),
+                          [c.name for c in tabla.primary_key.columns], tolerancia)
+
+
+
+###### FUNCIONES DE LAS TABLAS DE RESUMEN ######
+
+def claves_afectadas(deltas, resumen):
+    """
+    Obtiene las claves de una tabla de resumen cuyas filas cambian con las diferencias cargadas.
+
+    Args:
+        deltas (dict): Diccionario {tabla: (altas, cambios, bajas)} de la carga incremental.
+        resumen (str): Nombre de la tabla de resumen.
+
+    Returns:
+        pandas.DataFrame: Claves afectadas (sin duplicados).
+    """
+    clave = RESUMENES[resumen]['clave']
+    partes = [df[clave] for origen in RESUMENES[resumen]['origenes'] if origen in deltas
+              for df in deltas[origen] if set(clave) <= set(df.columns)]
+    if not partes:
+        return pd.DataFrame(columns=clave)
+    return pd.concat(partes, ignore_index=True).drop_duplicates()
+
+def actualizar_resumenes(conexion, engine, claves, tamano_lote=5000):
+    """
+    Recalcula las tablas de resumen dentro de la transacción de la carga.
+
+    Args:
+        conexion (sqlalchemy.Connection): Conexión con la transacción abierta.
+        engine (sqlalchemy.Engine): Conexión a la base de datos (para el formato de los parámetros).
+        claves (dict): Diccionario {resumen: claves}. Con claves None la tabla se recalcula
+            entera; con un DataFrame solo se recalculan las filas de esas claves.
+        tamano_lote (int): Número de claves por sentencia.
+    """
+    for resumen, definicion in RESUMENES.items():
+        if resumen not in claves:
+            continue
+        insercion = f'INSERT INTO {resumen} '
+
+        if claves[resumen] is None:
+            conexion.exec_driver_sql(f'DELETE FROM {resumen}')
+            conexion.exec_driver_sql(insercion + definicion['consulta'].format(filtro=''))
+            continue
+
+        registros = preparar_registros(claves[resumen])
+        filtro = ' AND '.join(f"{definicion['prefijo']}{c} = {m}"
+                              for c, m in zip(definicion['clave'], marcadores(engine, len(definicion['clave']))))
+        ejecutar_por_lotes(conexion, sentencia_borrado(engine, resumen, definicion['clave']), registros, tamano_lote)
+        ejecutar_por_lotes(conexion, insercion + definicion['consulta'].format(filtro=f'WHERE {filtro}'),
+                           registros, tamano_lote)
+
+
+
+###### FUNCIÓN PRINCIPAL DE CARGA ######
+
+def cargar_tablas(engine, dataframes, modo='reemplazar', resumenes=True, ruta_esquema=RUTA_ESQUEMA,
+                  tamano_lote=5000, max_trabajadores=None):
+    """
+    Carga los DataFrames en las tablas declaradas en el esquema SQL, respetando sus tipos
+    y claves primarias, en lugar de recrearlas con los tipos que infiere pandas.
+
+    Con modo='reemplazar' la carga se hace en dos pasos:
+    1. Cada DataFrame se inserta por lotes en una tabla temporal. Las tablas son
+       independientes, así que se cargan a la vez con un pool de conexiones.
+    2. En una única transacción se vacían las tablas definitivas y se rellenan desde
+       las temporales, de modo que los lectores ven los datos antiguos o los nuevos,
+       nunca las tablas vacías, y se conservan los índices y las claves foráneas.
+
+    Con modo='delta' se lee el contenido actual de cada tabla (en paralelo), se compara con
+    el DataFrame por la clave primaria y en una única transacción solo se insertan, actualizan
+    y borran las filas que han cambiado. Añadir un año de presupuestos solo toca sus filas.
+
+    En la misma transacción se recalculan las tablas de resumen de la inversión (RESUMENES)
+    que dependen de las tablas cargadas: enteras al reemplazar y solo las filas afectadas por
+    las diferencias en modo delta, de forma que las consultas de análisis no tienen que volver
+    a recorrer 'presupuestos'.
+
+    Args:
+        engine (sqlalchemy.Engine): Conexión a la base de datos (MySQL, MariaDB o SQLite).
+        dataframes (dict): Diccionario {tabla: DataFrame}.
+        modo (str): 'reemplazar' o 'delta'.
+        resumenes (bool): Si se actualizan las tablas de resumen.
+        ruta_esquema (str): Ruta del script SQL con el esquema.
+        tamano_lote (int): Número de filas por sentencia.
+        max_trabajadores (int): Número máximo de tablas procesadas a la vez.
+
+    Returns:
+        dict: Con modo='reemplazar', diccionario {tabla: filas cargadas}. Con modo='delta',
+        diccionario {tabla: {'insertadas': n, 'actualizadas': n, 'borradas': n}}.
+    """
+    if modo not in ('reemplazar', 'delta'):
+        raise ValueError(f"Modo de carga desconocido: {modo}. Usa 'reemplazar' o 'delta'.")
+
+    esquema, referencias = leer_esquema(ruta_esquema)
+    metadata = MetaData()
+    tablas = {nombre: crear_tabla(metadata, nombre, esquema[nombre]) for nombre in dataframes}
+    orden = ordenar_tablas(list(dataframes), referencias)
+
+    # SQLite no admite varias escrituras a la vez: las tablas se procesan en el hilo actual
+    if engine.dialect.name == 'sqlite':
+        max_trabajadores = 1
+
+    # Tablas de resumen que dependen de las tablas cargadas. Las que aún no existen se calculan enteras.
+    if resumenes:
+        resumenes = [r for r, d in RESUMENES.items() if set(d['origenes']) & set(dataframes)]
+        nuevas = [r for r in resumenes if not inspect(engine).has_table(r)]
+        for nombre in set(resumenes).union(*(RESUMENES[r]['origenes'] for r in resumenes)) - set(tablas):
+            crear_tabla(metadata, nombre, esquema[nombre])
+    else:
+        resumenes, nuevas = [], []
+
+    # Crear las tablas definitivas que aún no existan
+    metadata.create_all(engine, checkfirst=True)
+
+    if modo == 'delta':
+        return aplicar_deltas(engine, tablas, dataframes, orden, resumenes, nuevas, tamano_lote, max_trabajadores)
+
+    # Cargar las tablas temporales en paralelo
+    filas = ejecutar_por_tabla(cargar_tabla_temporal, {nombre: (engine, tablas[nombre], df, tamano_lote)
+                                                       for nombre, df in dataframes.items()}, max_trabajadores)
+
+    # Sustituir el contenido de todas las tablas en una sola transacción
+    preparador = engine.dialect.identifier_preparer
+    with engine.begin() as conexion:
+        for nombre in reversed(orden):
+            conexion.execute(text(f'DELETE FROM {preparador.quote(nombre)}'))
+        for nombre in orden:
+            columnas = ', '.join(preparador.quote(c.name) for c in tablas[nombre].columns)
+            conexion.execute(text(f'INSERT INTO {preparador.quote(nombre)} ({columnas}) '
+                                  f'SELECT {columnas} FROM {preparador.quote(PREFIJO_CARGA + nombre)}'))
+        actualizar_resumenes(conexion, engine, {resumen: None for resumen in resumenes}, tamano_lote)
+
+    # Borrar las tablas temporales
+    with engine.begin() as conexion:
+        for nombre in orden:
+            conexion.execute(text(f'DROP TABLE IF EXISTS {preparador.quote(PREFIJO_CARGA + nombre)}'))
+
+    return filas
+
+def aplicar_deltas(engine, tablas, dataframes, orden, resumenes, nuevas, tamano_lote, max_trabajadores):
+    """
+    Calcula las diferencias de todas las tablas en paralelo y las aplica en una sola transacción:
+    primero los borrados (de las tablas hijas a las referenciadas) y después las actualizaciones
+    e inserciones (de las referenciadas a las hijas), para respetar las claves foráneas. Por último
+    recalcula las filas de las tablas de resumen afectadas por las diferencias.
+    """
+    for nombre in orden:
+        if not tablas[nombre].primary_key.columns:
+            raise ValueError(f'La tabla {nombre} no tiene clave primaria; no se puede cargar en modo delta.')
+
+    deltas = ejecutar_por_tabla(leer_delta, {nombre: (engine, tablas[nombre], df) for nombre, df in dataframes.items()},
+                                max_trabajadores)
+
+    with engine.begin() as conexion:
+        for nombre in reversed(orden):
+            bajas = deltas[nombre][2]
+            ejecutar_por_lotes(conexion, sentencia_borrado(engine, nombre, list(bajas.columns)),
+                               preparar_registros(bajas), tamano_lote)
+        for nombre in orden:
+            altas, cambios, _ = deltas[nombre]
+            clave = [c.name for c in tablas[nombre].primary_key.columns]
+            valores = [c for c in cambios.columns if c not in clave]
+            if valores:
+                ejecutar_por_lotes(conexion, sentencia_actualizacion(engine, nombre, valores, clave),
+                                   preparar_registros(cambios[valores + clave]), tamano_lote)
+            ejecutar_por_lotes(conexion, sentencia_insercion(engine, nombre, list(altas.columns)),
+                               preparar_registros(altas), tamano_lote)
+        actualizar_resumenes(conexion, engine, {resumen: None if resumen in nuevas else claves_afectadas(deltas, resumen)
+                                                for resumen in resumenes}, tamano_lote)
+
+    totales = {}
+    for nombre in orden:
+        altas, cambios, bajas = deltas[nombre]
+        totales[nombre] = {'insertadas': len(altas), 'actualizadas': len(cambios), 'borradas': len(bajas)}
+
+    return totales
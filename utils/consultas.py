@@ -0,0 +1,174 @@
+import hashlib
+import os
+import re
+import sqlite3
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
+
+import pandas as pd
+from sqlalchemy import create_engine
+
+from .almacen import CARPETA_ARTEFACTOS, cargar_artefacto, cargar_artefactos, guardar_artefacto
+from .carga_sql import RESUMENES, cargar_tablas
+
+
+
+# Catálogo de consultas de análisis
+RUTA_ANALISIS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'sql',
+                             'analisis_desigualdad.sql')
+
+# Carpeta donde se guardan los resultados de las consultas ya calculadas
+CARPETA_CONSULTAS = os.path.join(CARPETA_ARTEFACTOS, 'consultas')
+
+# Tablas que se cargan en la base de datos (nombres de los artefactos del pipeline)
+TABLAS_ANALISIS = ['indices', 'poblacion', 'economia', 'educacion', 'social', 'salud', 'presupuestos']
+
+
+
+###### FUNCIONES DEL CATÁLOGO ######
+
+def leer_catalogo(ruta=RUTA_ANALISIS):
+    """
+    Divide el archivo de análisis en sus consultas. El nombre de cada consulta es la primera
+    línea del bloque de comentarios '-- ...' que la precede.
+
+    Args:
+        ruta (str): Ruta del archivo .sql.
+
+    Returns:
+        dict: Diccionario {nombre: consulta}, en el orden del archivo. Si hay nombres
+        repetidos se numeran ('nombre (2)').
+    """
+    with open(ruta, encoding='utf-8') as f:
+        script = f.read()
+
+    catalogo = {}
+    for i, bloque in enumerate(script.split(';')):
+        lineas = bloque.strip().splitlines()
+        inicio = next((j for j, linea in enumerate(lineas) if linea.strip() and not linea.strip().startswith('--')), None)
+        if inicio is None:
+            continue
+
+        # Bloque de comentarios inmediatamente anterior a la consulta
+        cabecera = []
+        for linea in reversed(lineas[:inicio]):
+            if not linea.strip().startswith('--') or not linea.strip('- \t'):
+                break
+            cabecera.insert(0, linea.strip().lstrip('-').strip())
+        nombre = cabecera[0].rstrip(':').strip() if cabecera else f'consulta_{i + 1}'
+
+        repetidas = sum(1 for n in catalogo if n == nombre or n.startswith(f'{nombre} ('))
+        if repetidas:
+            nombre = f'{nombre} ({repetidas + 1})'
+        catalogo[nombre] = '\n'.join(lineas[inicio:])
+
+    return catalogo
+
+def tablas_consulta(consulta, tablas):
+    """
+    Obtiene las tablas de entrada de las que depende una consulta. Las tablas de resumen
+    se sustituyen por las tablas cargadas a partir de las que se calculan.
+    """
+    usadas = set()
+    for nombre in re.findall(r'\b(?:FROM|JOIN)\s+(\w+)', consulta, flags=re.I):
+        if nombre in RESUMENES:
+            usadas.update(RESUMENES[nombre]['origenes'])
+        elif nombre in tablas:
+            usadas.add(nombre)
+    return sorted(usadas)
+
+
+
+###### FUNCIONES DE LA CACHÉ ######
+
+def huella_dataframe(df):
+    # Huella del contenido, las columnas y los tipos de un DataFrame
+    h = hashlib.blake2b(digest_size=16)
+    h.update(repr([(str(c), str(t)) for c, t in df.dtypes.items()]).encode())
+    h.update(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+    return h.hexdigest()
+
+def clave_consulta(consulta, huellas):
+    # Clave de la caché: el texto de la consulta y las huellas de las tablas que lee
+    h = hashlib.blake2b(consulta.encode(), digest_size=16)
+    for tabla in tablas_consulta(consulta, huellas):
+        h.update(f'{tabla}:{huellas[tabla]}'.encode())
+    return h.hexdigest()
+
+
+
+###### FUNCIÓN PRINCIPAL ######
+
+def ejecutar_consulta(uri, consulta):
+    # Cada hilo abre su propia conexión a la base de datos en memoria compartida
+    with closing(sqlite3.connect(uri, uri=True)) as conexion:
+        return pd.read_sql_query(consulta, conexion)
+
+def ejecutar_catalogo(dataframes=None, consultas=None, ruta=RUTA_ANALISIS, carpeta_cache=CARPETA_CONSULTAS,
+                      max_trabajadores=None):
+    """
+    Ejecuta las consultas de análisis sin servidor MySQL: carga las tablas limpias en una base
+    de datos SQLite en memoria (con el esquema y las tablas de resumen de carga_sql) y lanza
+    las consultas del catálogo a la vez.
+
+    Cada resultado se guarda como artefacto con una clave que combina el texto de la consulta y
+    las huellas de las tablas que lee, de modo que solo se vuelven a ejecutar las consultas cuyas
+    tablas de entrada han cambiado. Si todas están en la caché, no se llega a crear la base de datos.
+
+    Args:
+        dataframes (dict): Diccionario {tabla: DataFrame} con las tablas del esquema. Por defecto
+            se cargan los artefactos del pipeline (TABLAS_ANALISIS).
+        consultas (list): Nombres de las consultas a ejecutar (por defecto todas).
+        ruta (str): Ruta del archivo .sql con las consultas.
+        carpeta_cache (str): Carpeta de la caché de resultados (None para no usarla).
+        max_trabajadores (int): Número máximo de consultas a la vez.
+
+    Returns:
+        dict: Diccionario {nombre: DataFrame} con el resultado de cada consulta, listo para
+        las funciones graficar_*.
+    """
+    if dataframes is None:
+        dataframes = cargar_artefactos(TABLAS_ANALISIS, mmap=False)
+
+    catalogo = leer_catalogo(ruta)
+    if consultas is not None:
+        desconocidas = set(consultas) - set(catalogo)
+        if desconocidas:
+            raise ValueError(f'Consultas desconocidas: {sorted(desconocidas)}')
+        catalogo = {nombre: catalogo[nombre] for nombre in consultas}
+
+    huellas = {tabla: huella_dataframe(df) for tabla, df in dataframes.items()}
+    claves = {nombre: clave_consulta(consulta, huellas) for nombre, consulta in catalogo.items()}
+
+    # Recuperar de la caché los resultados cuyas entradas no han cambiado
+    resultados = {}
+    if carpeta_cache:
+        for nombre, clave in claves.items():
+            if os.path.isfile(os.path.join(carpeta_cache, clave, 'esquema.json')):
+                resultados[nombre] = cargar_artefacto(clave, carpeta_cache, mmap=False)
+
+    pendientes = [nombre for nombre in catalogo if nombre not in resultados]
+    if pendientes:
+        # Base de datos en memoria compartida entre las conexiones de este proceso
+        uri = f'file:desigualdad_{uuid.uuid4().hex}?mode=memory&cache=shared'
+
+        # La conexión 'ancla' mantiene viva la base de datos mientras se usa
+        ancla = sqlite3.connect(uri, uri=True)
+        engine = create_engine('sqlite://', creator=lambda: sqlite3.connect(uri, uri=True, check_same_thread=False))
+        try:
+            cargar_tablas(engine, dataframes)
+
+            with ThreadPoolExecutor(max_workers=max_trabajadores) as executor:
+                futuros = {nombre: executor.submit(ejecutar_consulta, uri, catalogo[nombre]) for nombre in pendientes}
+                for nombre, futuro in futuros.items():
+                    resultados[nombre] = futuro.result()
+        finally:
+            engine.dispose()
+            ancla.close()
+
+        if carpeta_cache:
+            for nombre in pendientes:
+                guardar_artefacto(resultados[nombre], claves[nombre], carpeta_cache)
+
+    return {nombre: resultados[nombre] for nombre in catalogo}
@@ -0,0 +1,217 @@
+import numpy as np
+import pandas as pd
+from scipy import stats
+
+
+
+# Ámbitos cuyos indicadores se cruzan con la inversión por área
+AMBITOS_CORRELACION = ['economia', 'educacion', 'social', 'salud', 'poblacion']
+
+
+
+###### FUNCIONES DE PREPARACIÓN ######
+
+def inversion_per_capita_areas(df_presupuestos, df_poblacion):
+    """
+    Calcula la inversión media anual por habitante de cada área en cada distrito, igual que las
+    consultas de analisis_desigualdad.sql (media de 'total_invertido' entre numero_habitantes).
+
+    Args:
+        df_presupuestos (pandas.DataFrame): DataFrame con 'cod_distrito', 'area_inversion' y 'total_invertido'.
+        df_poblacion (pandas.DataFrame): DataFrame con 'cod_distrito' y 'numero_habitantes'.
+
+    Returns:
+        pandas.DataFrame: DataFrame con un distrito por fila ('cod_distrito' como índice) y un área por columna.
+    """
+    presupuestos = df_presupuestos.assign(cod_distrito=pd.to_numeric(df_presupuestos['cod_distrito']).astype(int))
+    medias = presupuestos.pivot_table(index='cod_distrito', columns='area_inversion', values='total_invertido',
+                                      aggfunc='mean', observed=True)
+
+    habitantes = df_poblacion.assign(cod_distrito=pd.to_numeric(df_poblacion['cod_distrito']).astype(int))
+    habitantes = habitantes.set_index('cod_distrito')['numero_habitantes']
+
+    medias = medias.div(habitantes.reindex(medias.index), axis=0)
+    medias.columns.name = None
+    return medias
+
+def preparar_indicadores(tablas):
+    """
+    Une las columnas numéricas de varias tablas por distrito.
+
+    Args:
+        tablas (dict): Diccionario {ambito: DataFrame} con 'cod_distrito' y los indicadores.
+
+    Returns:
+        tuple: DataFrame con un distrito por fila ('cod_distrito' como índice) y un indicador
+        por columna, y Series con el ámbito de cada indicador.
+    """
+    bloques, ambitos = [], {}
+    for ambito, df in tablas.items():
+        bloque = df.assign(cod_distrito=pd.to_numeric(df['cod_distrito']).astype(int)).set_index('cod_distrito')
+        bloque = bloque.select_dtypes('number')
+        bloque = bloque[[c for c in bloque.columns if c not in ambitos]]
+        ambitos.update({c: ambito for c in bloque.columns})
+        bloques.append(bloque)
+
+    return pd.concat(bloques, axis=1), pd.Series(ambitos, name='ambito')
+
+
+
+###### FUNCIONES DE CÁLCULO ######
+
+def estandarizar(valores):
+    # Centrar y escalar cada columna (desviación típica poblacional); las constantes quedan a NaN
+    desviacion = valores.std(axis=0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return (valores - valores.mean(axis=0)) / np.where(desviacion > 0, desviacion, np.nan)
+
+def agrupar_por_nulos(df):
+    # Agrupar las columnas por las filas en las que tienen valor
+    grupos = {}
+    for j, presentes in enumerate(df.notna().to_numpy().T):
+        grupos.setdefault(presentes.tobytes(), (presentes, []))[1].append(j)
+    return list(grupos.values())
+
+def p_valor_t(r, n):
+    # p-valor bilateral de la correlación con la distribución t de Student
+    with np.errstate(divide='ignore', invalid='ignore'):
+        t = r * np.sqrt((n - 2) / (1 - r ** 2))
+    return 2 * stats.t.sf(np.abs(t), n - 2)
+
+def ajustar_fdr(p_valores):
+    """
+    Corrige los p-valores por comparaciones múltiples con Benjamini-Hochberg (FDR).
+
+    Args:
+        p_valores (ndarray): p-valores (los nulos se ignoran).
+
+    Returns:
+        ndarray: q-valores con la misma forma.
+    """
+    p = np.asarray(p_valores, dtype=float)
+    q = np.full(p.shape, np.nan)
+    validos = ~np.isnan(p)
+    m = validos.sum()
+    if m == 0:
+        return q
+
+    orden = np.argsort(p[validos])
+    ajustados = p[validos][orden] * m / np.arange(1, m + 1)
+    ajustados = np.minimum.accumulate(ajustados[::-1])[::-1]
+
+    resultado = np.empty(m)
+    resultado[orden] = np.minimum(ajustados, 1)
+    q[validos] = resultado
+    return q
+
+def correlacionar_bloque(x, y, n_permutaciones, tamano_bloque, rng):
+    """
+    Correlaciones de todas las columnas de x con todas las de y (sin nulos) con una
+    multiplicación de matrices, y test de permutaciones por lotes: se permutan las filas
+    de y y se recalculan a la vez las correlaciones de cada lote de permutaciones.
+
+    Returns:
+        tuple: Correlaciones (p, q) y p-valores de permutación (p, q) o None.
+    """
+    n = len(x)
+    zx, zy = estandarizar(x), estandarizar(y)
+    r = np.clip(zx.T @ zy / n, -1, 1)
+    if not n_permutaciones:
+        return r, None
+
+    extremas = np.zeros(r.shape)
+    umbral = np.abs(r) - 1e-12
+    for inicio in range(0, n_permutaciones, tamano_bloque):
+        lote = min(tamano_bloque, n_permutaciones - inicio)
+        indices = rng.permuted(np.tile(np.arange(n), (lote, 1)), axis=1)
+        extremas += (np.abs(zx.T @ zy[indices] / n) >= umbral).sum(axis=0)
+
+    return r, (extremas + 1) / (n_permutaciones + 1)
+
+def correlacionar(df_x, df_y, n_permutaciones=0, min_observaciones=5, tamano_bloque=500, semilla=None):
+    """
+    Calcula las correlaciones de Pearson y Spearman de todas las columnas de df_x con todas
+    las de df_y, con p-valores, tests de permutaciones opcionales y corrección FDR.
+
+    Las filas se alinean por el índice y cada par usa las filas con valor en ambas columnas.
+    Las columnas se agrupan por sus filas con valor, de modo que cada combinación de grupos
+    se resuelve con datos completos en una sola multiplicación de matrices (con datos sin
+    nulos hay un único bloque); Spearman ordena los valores dentro de esas filas.
+
+    Args:
+        df_x (pandas.DataFrame): Variables (columnas) por unidad (filas).
+        df_y (pandas.DataFrame): Variables (columnas) por unidad (filas).
+        n_permutaciones (int): Número de permutaciones (0 para no hacer el test).
+        min_observaciones (int): Mínimo de observaciones comunes para calcular un par.
+        tamano_bloque (int): Número de permutaciones calculadas a la vez.
+        semilla (int): Semilla de las permutaciones (opcional).
+
+    Returns:
+        pandas.DataFrame: Una fila por par, ordenadas por el q-valor de Spearman y la
+        correlación absoluta, con la posición en 'ranking'.
+    """
+    df_x, df_y = df_x.align(df_y, join='inner', axis=0)
+    valores_x, valores_y = df_x.to_numpy(dtype=float), df_y.to_numpy(dtype=float)
+    rng = np.random.default_rng(semilla)
+
+    forma = (df_x.shape[1], df_y.shape[1])
+    n = np.zeros(forma, dtype=int)
+    r = {metodo: np.full(forma, np.nan) for metodo in ('pearson', 'spearman')}
+    p_perm = {metodo: np.full(forma, np.nan) for metodo in ('pearson', 'spearman')}
+
+    for filas_x, columnas_x in agrupar_por_nulos(df_x):
+        for filas_y, columnas_y in agrupar_por_nulos(df_y):
+            filas = filas_x & filas_y
+            n[np.ix_(columnas_x, columnas_y)] = filas.sum()
+            if filas.sum() < max(min_observaciones, 3):
+                continue
+
+            x, y = valores_x[np.ix_(filas, columnas_x)], valores_y[np.ix_(filas, columnas_y)]
+            rangos = (stats.rankdata(x, axis=0), stats.rankdata(y, axis=0))
+            for metodo, (bloque_x, bloque_y) in {'pearson': (x, y), 'spearman': rangos}.items():
+                r_bloque, p_bloque = correlacionar_bloque(bloque_x, bloque_y, n_permutaciones, tamano_bloque, rng)
+                r[metodo][np.ix_(columnas_x, columnas_y)] = r_bloque
+                if p_bloque is not None:
+                    p_perm[metodo][np.ix_(columnas_x, columnas_y)] = np.where(np.isnan(r_bloque), np.nan, p_bloque)
+
+    resultado = pd.DataFrame({'variable_x': np.repeat(df_x.columns.to_numpy(), forma[1]),
+                              'variable_y': np.tile(df_y.columns.to_numpy(), forma[0]),
+                              'n': n.ravel()})
+    for metodo in ('pearson', 'spearman'):
+        resultado[metodo] = r[metodo].ravel()
+        resultado[f'p_{metodo}'] = p_final = p_valor_t(r[metodo], n).ravel()
+        if n_permutaciones:
+            resultado[f'p_perm_{metodo}'] = p_final = p_perm[metodo].ravel()
+        resultado[f'q_{metodo}'] = ajustar_fdr(p_final)
+
+    resultado = resultado.assign(abs_spearman=resultado['spearman'].abs())
+    resultado = resultado.sort_values(['q_spearman', 'abs_spearman'], ascending=[True, False], na_position='last')
+    resultado = resultado.drop(columns='abs_spearman').reset_index(drop=True)
+    resultado.insert(0, 'ranking', np.arange(1, len(resultado) + 1))
+    return resultado
+
+def correlaciones_indicadores_inversion(tablas, df_presupuestos, n_permutaciones=1000, min_observaciones=5,
+                                        tamano_bloque=500, semilla=None):
+    """
+    Cruza todos los indicadores de economía, educación, social, salud y población con la
+    inversión media anual por habitante de cada área, en lugar de estudiar pares sueltos.
+
+    Args:
+        tablas (dict): Diccionario {ambito: DataFrame} con las tablas de los ámbitos (incluida 'poblacion').
+        df_presupuestos (pandas.DataFrame): DataFrame de presupuestos.
+        n_permutaciones (int): Número de permutaciones del test (0 para usar solo los p-valores de la t).
+        min_observaciones (int): Mínimo de distritos comunes para calcular un par.
+        tamano_bloque (int): Número de permutaciones calculadas a la vez.
+        semilla (int): Semilla de las permutaciones (opcional).
+
+    Returns:
+        pandas.DataFrame: Tabla ordenada con 'ranking', 'ambito', 'indicador', 'area_inversion',
+        'n' y las correlaciones, p-valores y q-valores de Pearson y Spearman.
+    """
+    indicadores, ambitos = preparar_indicadores({a: tablas[a] for a in AMBITOS_CORRELACION if a in tablas})
+    inversion = inversion_per_capita_areas(df_presupuestos, tablas['poblacion'])
+
+    resultado = correlacionar(indicadores, inversion, n_permutaciones, min_observaciones, tamano_bloque, semilla)
+    resultado = resultado.rename(columns={'variable_x': 'indicador', 'variable_y': 'area_inversion'})
+    resultado.insert(1, 'ambito', resultado['indicador'].map(ambitos))
+    return resultado
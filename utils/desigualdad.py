@@ -0,0 +1,278 @@
+import numpy as np
+import pandas as pd
+
+
+
+# Parámetros de aversión a la desigualdad de los índices de Atkinson
+EPSILONS = (0.5, 1, 2)
+
+# Tablas de indicadores por distrito sobre las que se calculan las métricas
+AMBITOS_METRICAS = ['economia', 'educacion', 'social', 'salud', 'poblacion', 'accesibilidad']
+
+# Elementos (réplicas x series x unidades) que se procesan a la vez en el bootstrap
+TAMANO_BLOQUE_BOOTSTRAP = 4_000_000
+
+
+
+###### MÉTRICAS DE DESIGUALDAD ######
+
+# 'valores' tiene las unidades (distritos, barrios) en el último eje: (unidades,) para una serie o
+# (series, unidades) para varias (indicadores). 'pesos' es (unidades,) o (réplicas, unidades) para
+# las réplicas del bootstrap. Todas las métricas son sumas ponderadas de transformaciones de los
+# valores (x, log x, x log x, x^(1 - e)), así que se calculan como productos de matrices
+# pesos @ transformación.T para todas las series y réplicas a la vez. Solo el Gini necesita
+# ordenar, y los valores se ordenan una única vez para todas las réplicas.
+# Los valores nulos no cuentan (peso 0).
+
+def preparar_valores(valores, pesos=None):
+    # Valores (series, unidades) con los nulos a 0, máscara de los válidos y pesos sin nulos
+    valores = np.atleast_2d(np.asarray(valores, dtype=float))
+    pesos = np.ones(valores.shape[-1]) if pesos is None else np.nan_to_num(np.asarray(pesos, dtype=float))
+    validos = ~np.isnan(valores)
+    return np.where(validos, valores, 0.0), validos, pesos
+
+def gini_ordenado(valores, validos, pesos, total_pesos, total_renta):
+    # Gini ponderado: 1 - Σ w_i (2 C_i - w_i x_i) / (W R), con C la renta acumulada de los valores ordenados
+    orden = np.argsort(np.where(validos, valores, np.inf), axis=-1)
+    ordenados = np.take_along_axis(valores, orden, axis=-1)
+    pesos_ordenados = pesos[..., orden] * np.take_along_axis(validos, orden, axis=-1)
+
+    renta = pesos_ordenados * ordenados
+    acumulada = np.cumsum(renta, axis=-1)
+    return 1 - (pesos_ordenados * (2 * acumulada - renta)).sum(axis=-1) / (total_pesos * total_renta)
+
+def theil_entre_grupos(valores, validos, pesos, grupos, total_pesos, total_renta):
+    """
+    Parte de los índices de Theil T y L que se debe a las diferencias entre las medias de
+    los grupos (por ejemplo, entre distritos cuando las unidades son barrios).
+
+    Returns:
+        tuple: Arrays con el Theil T y el Theil L entre grupos.
+    """
+    codigos, _ = pd.factorize(np.asarray(grupos))
+    media = total_renta / total_pesos
+    entre_t, entre_l = np.zeros_like(media), np.zeros_like(media)
+
+    for grupo in range(codigos.max() + 1):
+        miembros = codigos == grupo
+        pesos_grupo = pesos[..., miembros] @ validos[:, miembros].T
+        renta_grupo = pesos[..., miembros] @ valores[:, miembros].T
+        presente = (pesos_grupo > 0) & (renta_grupo > 0)
+        log_relativa = np.log(np.where(presente, renta_grupo / np.where(presente, pesos_grupo, 1) / media, 1))
+        entre_t += renta_grupo / total_renta * log_relativa
+        entre_l -= pesos_grupo / total_pesos * log_relativa
+
+    return entre_t, entre_l
+
+def calcular_metricas(valores, pesos=None, grupos=None, epsilons=EPSILONS):
+    """
+    Calcula a la vez las métricas de desigualdad ponderadas de una o varias series:
+
+    - Gini (0 = igualdad total).
+    - Theil T (más sensible a la parte alta) y Theil L o desviación logarítmica media
+      (más sensible a la parte baja), con su descomposición entre y dentro de grupos
+      (total = entre + dentro) si se indican 'grupos'.
+    - Atkinson con cada aversión a la desigualdad 'epsilon'.
+
+    Theil T y Atkinson con epsilon < 1 son NaN si hay valores negativos; Theil L y Atkinson
+    con epsilon >= 1, si hay valores menores o iguales que 0.
+
+    Args:
+        valores (ndarray): Array (unidades,) o (series, unidades).
+        pesos (ndarray): Pesos (unidades,) o (réplicas, unidades). Por defecto iguales.
+        grupos (ndarray): Grupo de cada unidad para descomponer el Theil (opcional).
+        epsilons (list): Parámetros de los índices de Atkinson.
+
+    Returns:
+        dict: Diccionario {métrica: array} con forma (series,) o (réplicas, series)
+        (sin el eje de series si 'valores' es una sola serie).
+    """
+    una_serie = np.ndim(valores) == 1
+    x, validos, pesos = preparar_valores(valores, pesos)
+    positivos = validos & (x > 0)
+    log_x = np.log(np.where(positivos, x, 1))
+    con_peso = (pesos > 0).astype(float)
+
+    # Sumas ponderadas de todas las series (y réplicas) con un producto de matrices cada una
+    total_pesos = pesos @ validos.T
+    total_renta = pesos @ x.T
+    suma_log = pesos @ log_x.T
+    suma_x_log = pesos @ (x * log_x).T
+    negativos = con_peso @ (validos & (x < 0)).T > 0
+    no_positivos = con_peso @ (validos & ~positivos).T > 0
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        media = total_renta / total_pesos
+        metricas = {'gini': gini_ordenado(x, validos, pesos, total_pesos, total_renta),
+                    'theil_t': np.where(negativos, np.nan, suma_x_log / total_renta - np.log(media)),
+                    'theil_l': np.where(no_positivos, np.nan, np.log(media) - suma_log / total_pesos)}
+
+        if grupos is not None:
+            entre_t, entre_l = theil_entre_grupos(x, validos, pesos, grupos, total_pesos, total_renta)
+            metricas['theil_t_entre'] = np.where(negativos, np.nan, entre_t)
+            metricas['theil_t_dentro'] = metricas['theil_t'] - metricas['theil_t_entre']
+            metricas['theil_l_entre'] = np.where(no_positivos, np.nan, entre_l)
+            metricas['theil_l_dentro'] = metricas['theil_l'] - metricas['theil_l_entre']
+
+        for epsilon in epsilons:
+            if epsilon == 1:
+                equivalente = np.exp(suma_log / total_pesos)
+            else:
+                potencias = np.where(positivos, np.where(positivos, x, 1) ** (1 - epsilon), 0)
+                equivalente = ((pesos @ potencias.T) / total_pesos) ** (1 / (1 - epsilon))
+            invalidos = negativos if epsilon < 1 else no_positivos
+            metricas[f'atkinson_{epsilon:g}'] = np.where(invalidos, np.nan, 1 - equivalente / media)
+
+    if una_serie:
+        metricas = {metrica: valores_metrica[..., 0] for metrica, valores_metrica in metricas.items()}
+    return metricas
+
+def gini(valores, pesos=None):
+    # Índice de Gini ponderado de una o varias series
+    return calcular_metricas(valores, pesos, epsilons=())['gini']
+
+def theil_t(valores, pesos=None):
+    # Índice de Theil T ponderado de una o varias series
+    return calcular_metricas(valores, pesos, epsilons=())['theil_t']
+
+def theil_l(valores, pesos=None):
+    # Índice de Theil L (desviación logarítmica media) ponderado de una o varias series
+    return calcular_metricas(valores, pesos, epsilons=())['theil_l']
+
+def atkinson(valores, pesos=None, epsilon=1):
+    # Índice de Atkinson ponderado de una o varias series
+    return calcular_metricas(valores, pesos, epsilons=(epsilon,))[f'atkinson_{epsilon:g}']
+
+def descomponer_theil(valores, pesos, grupos):
+    # Theil T y L con su parte entre grupos y dentro de los grupos
+    metricas = calcular_metricas(valores, pesos, grupos, epsilons=())
+    return {metrica: v for metrica, v in metricas.items() if metrica.startswith('theil')}
+
+
+
+###### INTERVALOS DE CONFIANZA ######
+
+def bootstrap_metricas(valores, pesos=None, grupos=None, epsilons=EPSILONS, n_muestras=1000, nivel=0.95,
+                       semilla=0, tamano_bloque=TAMANO_BLOQUE_BOOTSTRAP):
+    """
+    Intervalos de confianza bootstrap (percentiles) de las métricas de varias series a la vez.
+
+    Cada réplica remuestrea las unidades con reemplazamiento, lo que equivale a multiplicar
+    los pesos por el número de veces que sale cada unidad. Todas las réplicas se generan
+    como una matriz de remuestreo (réplicas x unidades) y se calculan de una vez con las
+    mismas funciones vectorizadas, por bloques de réplicas para limitar la memoria.
+
+    Args:
+        valores (ndarray): Array (series, unidades) o (unidades,).
+        pesos (ndarray): Pesos (unidades,).
+        grupos (ndarray): Grupo de cada unidad para descomponer el Theil (opcional).
+        epsilons (list): Parámetros de los índices de Atkinson.
+        n_muestras (int): Número de réplicas.
+        nivel (float): Nivel de confianza.
+        semilla (int): Semilla del generador aleatorio.
+        tamano_bloque (int): Elementos (réplicas x series x unidades) calculados a la vez.
+
+    Returns:
+        dict: Diccionario {métrica: array (2, series)} con el límite inferior y el superior.
+    """
+    valores = np.asarray(valores, dtype=float)
+    n = valores.shape[-1]
+    pesos = np.ones(n) if pesos is None else np.nan_to_num(np.asarray(pesos, dtype=float))
+    rng = np.random.default_rng(semilla)
+
+    replicas = []
+    por_bloque = max(1, tamano_bloque // max(valores.size, 1))
+    for inicio in range(0, n_muestras, por_bloque):
+        # Matriz de remuestreo (réplicas x unidades): cuántas veces sale cada unidad en cada réplica
+        remuestreo = rng.multinomial(n, np.full(n, 1 / n), size=min(por_bloque, n_muestras - inicio))
+        replicas.append(calcular_metricas(valores, pesos * remuestreo, grupos, epsilons))
+
+    alfa = (1 - nivel) / 2
+    return {metrica: np.nanquantile(np.concatenate([r[metrica] for r in replicas]), [alfa, 1 - alfa], axis=0)
+            for metrica in replicas[0]}
+
+
+
+###### MÉTRICAS DE LAS TABLAS ######
+
+def metricas_desigualdad(df, columnas=None, peso='numero_habitantes', por=None, grupo=None, epsilons=EPSILONS,
+                         n_bootstrap=0, nivel=0.95, semilla=0):
+    """
+    Calcula las métricas de desigualdad entre las unidades (filas) de una tabla para cada
+    columna: Gini, Theil T y L y Atkinson ponderados por población, con la descomposición
+    del Theil entre y dentro de grupos y los intervalos bootstrap si se piden.
+
+    Todas las columnas de cada grupo de 'por' (por ejemplo, cada año) se calculan en una
+    sola llamada vectorizada.
+
+    Args:
+        df (pandas.DataFrame): Una fila por unidad (distrito o barrio) y año.
+        columnas (list): Indicadores (por defecto todas las columnas numéricas salvo claves y pesos).
+        peso (str): Columna de pesos (None para pesos iguales).
+        por (list): Columnas que separan poblaciones distintas (por ejemplo 'año').
+        grupo (str): Columna de grupo para descomponer el Theil (por ejemplo 'cod_distrito' con barrios).
+        epsilons (list): Parámetros de los índices de Atkinson.
+        n_bootstrap (int): Réplicas del bootstrap (0 para no calcular intervalos).
+        nivel (float): Nivel de confianza de los intervalos.
+        semilla (int): Semilla del generador aleatorio.
+
+    Returns:
+        pandas.DataFrame: Una fila por indicador (y grupo de 'por') con las métricas y, con
+        bootstrap, las columnas '<métrica>_inf' y '<métrica>_sup'.
+    """
+    por = [] if por is None else ([por] if isinstance(por, str) else list(por))
+    excluidas = set(por) | {peso, grupo, 'cod_distrito', 'cod_barrio', 'id_barrio'}
+    if columnas is None:
+        columnas = [c for c in df.select_dtypes('number').columns if c not in excluidas]
+
+    resultados = []
+    for clave, parte in (df.groupby(por, sort=True) if por else [((), df)]):
+        valores = parte[columnas].to_numpy(dtype=float).T
+        pesos = parte[peso].to_numpy(dtype=float) if peso else None
+        grupos = parte[grupo].to_numpy() if grupo else None
+
+        resultado = pd.DataFrame({'indicador': columnas})
+        for metrica, valores_metrica in calcular_metricas(valores, pesos, grupos, epsilons).items():
+            resultado[metrica] = valores_metrica
+
+        if n_bootstrap:
+            for metrica, (inferior, superior) in bootstrap_metricas(valores, pesos, grupos, epsilons, n_bootstrap,
+                                                                    nivel, semilla).items():
+                # Sin intervalo si la métrica no está definida en los datos observados
+                definida = resultado[metrica].notna().to_numpy()
+                resultado[f'{metrica}_inf'] = np.where(definida, inferior, np.nan)
+                resultado[f'{metrica}_sup'] = np.where(definida, superior, np.nan)
+
+        for columna, valor in zip(por, clave if isinstance(clave, tuple) else (clave,)):
+            resultado.insert(0, columna, valor)
+        resultados.append(resultado)
+
+    return pd.concat(resultados, ignore_index=True)
+
+def metricas_distritos(tablas, n_bootstrap=1000, nivel=0.95, semilla=0):
+    """
+    Métricas de desigualdad entre distritos de todos los indicadores de las tablas del
+    proyecto, ponderadas por los habitantes de cada distrito.
+
+    Args:
+        tablas (dict): Diccionario {ámbito: DataFrame} con 'poblacion' (para los pesos) y
+            las tablas de indicadores.
+        n_bootstrap (int): Réplicas del bootstrap.
+
+    Returns:
+        pandas.DataFrame: Una fila por ámbito e indicador con las métricas.
+    """
+    habitantes = tablas['poblacion'][['cod_distrito', 'numero_habitantes']]
+
+    resultados = []
+    for ambito in AMBITOS_METRICAS:
+        if ambito not in tablas:
+            continue
+        df = tablas[ambito].drop(columns=['numero_habitantes'], errors='ignore')
+        df = pd.merge(df, habitantes, on='cod_distrito', how='left')
+        resultado = metricas_desigualdad(df, peso='numero_habitantes', n_bootstrap=n_bootstrap, nivel=nivel,
+                                         semilla=semilla)
+        resultado.insert(0, 'ambito', ambito)
+        resultados.append(resultado)
+
+    return pd.concat(resultados, ignore_index=True).round(6)
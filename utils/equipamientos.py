@@ -0,0 +1,123 @@
+import pandas as pd
+
+
+
+# Columnas útiles del esquema común de los listados de equipamientos municipales
+# (PK;NOMBRE;...;COD-DISTRITO;...;LATITUD;LONGITUD;TIPO) y su tipo al leerlas
+TIPOS_EQUIPAMIENTOS = {
+    'PK': 'Int64',
+    'NOMBRE': 'string',
+    'CODIGO-POSTAL': 'string',
+    'COD-BARRIO': 'Int64',
+    'BARRIO': 'category',
+    'COD-DISTRITO': 'Int64',
+    'DISTRITO': 'category',
+    'COORDENADA-X': 'float64',
+    'COORDENADA-Y': 'float64',
+    'LATITUD': 'float64',
+    'LONGITUD': 'float64',
+    'TIPO': 'category',
+}
+
+# Las coordenadas se leen como texto y se convierten después: algunos registros las traen en
+# grados, minutos y segundos o con campos descuadrados, y quedan como nulas
+COORDENADAS = ['COORDENADA-X', 'COORDENADA-Y', 'LATITUD', 'LONGITUD']
+
+# Filas leídas en cada bloque
+TAMANO_BLOQUE = 100_000
+
+
+
+###### FUNCIONES DE LECTURA ######
+
+def nombre_columna(columna):
+    # 'COD-DISTRITO' -> 'cod_distrito', igual que en el resto del proyecto
+    return columna.lower().replace('-', '_')
+
+def leer_equipamientos(ruta, columnas=('COD-DISTRITO',), tamano_bloque=TAMANO_BLOQUE, encoding='latin1'):
+    """
+    Lee por bloques un listado de equipamientos cargando solo las columnas pedidas, con tipos
+    enteros y categóricos en lugar de texto, de modo que los campos largos (DESCRIPCION,
+    EQUIPAMIENTO, TRANSPORTE...) no llegan a cargarse en memoria.
+
+    Args:
+        ruta (str): Ruta del archivo .csv (separado por ';').
+        columnas (list): Columnas del archivo a leer (nombres originales, p. ej. 'COD-DISTRITO').
+        tamano_bloque (int): Número de filas de cada bloque.
+        encoding (str): Codificación del archivo.
+
+    Yields:
+        pandas.DataFrame: Bloques con las columnas pedidas en minúsculas ('cod_distrito', ...).
+    """
+    columnas = list(columnas)
+    tipos = {c: 'string' if c in COORDENADAS else TIPOS_EQUIPAMIENTOS.get(c, 'string') for c in columnas}
+    lector = pd.read_csv(ruta, sep=';', encoding=encoding, usecols=columnas, dtype=tipos,
+                         chunksize=tamano_bloque)
+    with lector:
+        for bloque in lector:
+            for columna in set(columnas) & set(COORDENADAS):
+                bloque[columna] = pd.to_numeric(bloque[columna], errors='coerce').astype('float64')
+            yield bloque[columnas].rename(columns=nombre_columna)
+
+def cargar_equipamientos(ruta, columnas=('COD-DISTRITO', 'COD-BARRIO', 'TIPO', 'LATITUD', 'LONGITUD'),
+                         tamano_bloque=TAMANO_BLOQUE, encoding='latin1'):
+    """
+    Carga un listado de equipamientos completo, solo con las columnas pedidas.
+
+    Returns:
+        pandas.DataFrame: DataFrame con las columnas en minúsculas y tipos compactos.
+    """
+    bloques = list(leer_equipamientos(ruta, columnas, tamano_bloque, encoding))
+    df = pd.concat(bloques, ignore_index=True)
+
+    # Las categorías de cada bloque pueden ser distintas: unificarlas al final
+    for columna, tipo in zip(df.columns, columnas):
+        if TIPOS_EQUIPAMIENTOS.get(tipo) == 'category':
+            df[columna] = df[columna].astype('category')
+    return df
+
+
+
+###### FUNCIONES DE RECUENTO ######
+
+def contar_equipamientos(ruta, por=('COD-DISTRITO',), nombre='recuento', tamano_bloque=TAMANO_BLOQUE,
+                         encoding='latin1'):
+    """
+    Cuenta los equipamientos por distrito, barrio, tipo o cualquier combinación de columnas,
+    acumulando el recuento bloque a bloque. La memoria no depende del tamaño del archivo,
+    solo del número de grupos, por lo que sirve también para registros regionales o nacionales.
+
+    Las filas sin valor en alguna de las columnas de agrupación no se cuentan (igual que
+    groupby(...).size()).
+
+    Args:
+        ruta (str): Ruta del archivo .csv (separado por ';').
+        por (list): Columnas del archivo por las que agrupar (p. ej. ['COD-DISTRITO', 'TIPO']).
+        nombre (str): Nombre de la columna con el recuento.
+        tamano_bloque (int): Número de filas de cada bloque.
+        encoding (str): Codificación del archivo.
+
+    Returns:
+        pandas.DataFrame: Una fila por grupo, con las columnas de agrupación en minúsculas
+        y la columna del recuento.
+    """
+    por = list(por)
+    claves = [nombre_columna(c) for c in por]
+
+    total = None
+    for bloque in leer_equipamientos(ruta, por, tamano_bloque, encoding):
+        # Los códigos enteros se agrupan como int64 una vez descartados los nulos
+        bloque = bloque.dropna(subset=claves)
+        for clave, tipo in zip(claves, por):
+            if TIPOS_EQUIPAMIENTOS.get(tipo) == 'Int64':
+                bloque[clave] = bloque[clave].astype('int64')
+            elif TIPOS_EQUIPAMIENTOS.get(tipo) == 'category':
+                bloque[clave] = bloque[clave].astype(str)
+
+        parcial = bloque.groupby(claves, sort=False).size()
+        total = parcial if total is None else total.add(parcial, fill_value=0)
+
+    if total is None or total.empty:
+        return pd.DataFrame({**{c: pd.Series(dtype='object') for c in claves}, nombre: pd.Series(dtype='int64')})
+
+    return total.astype('int64').sort_index().reset_index(name=nombre)
@@ -0,0 +1,278 @@
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from .functions import ESPECIFICACION_NOTAS, calcular_indices_desigualdad, normalizar_min_max, preparar_especificacion
+
+
+
+# Ámbitos que forman la nota general (los mismos que en calcular_indices_desigualdad)
+AMBITOS_GENERALES = ('salud', 'social', 'economia', 'educacion')
+
+
+
+###### MOTOR DE ESCENARIOS ######
+
+@dataclass
+class MotorEscenarios:
+    """
+    Motor de escenarios "¿y si...?" sobre los índices de desigualdad: mantiene en memoria
+    los valores de los indicadores, su mínimo y máximo, la matriz normalizada y las notas
+    de cada ámbito, y al cambiar un valor solo recalcula lo que depende de él.
+
+    Si el nuevo valor queda dentro del rango del indicador (y el anterior no era su mínimo
+    ni su máximo), solo se normaliza esa celda y se recalcula la nota del ámbito en ese
+    distrito, en O(indicadores). Si el cambio mueve el mínimo o el máximo se normaliza de
+    nuevo la columna y se recalcula la nota del ámbito en todos los distritos.
+
+    Las notas y los índices se calculan con las mismas operaciones que calcular_notas y
+    calcular_indices_desigualdad, así que coinciden con recalcular toda la cadena.
+
+    Args:
+        distritos (pandas.DataFrame): 'cod_distrito' y 'distrito' de cada fila.
+        indicadores (list): Indicador de cada columna.
+        ambitos (list): Ámbitos de la especificación.
+        bloques (list): Columnas (slice) de los indicadores de cada ámbito.
+        negativos (numpy.ndarray): Indicadores negativos (se invierten tras normalizarlos).
+        pesos (numpy.ndarray): Matriz de pesos (indicadores x ámbitos).
+        valores (numpy.ndarray): Valores actuales (distritos x indicadores).
+        minimo (numpy.ndarray): Mínimo actual de cada indicador.
+        maximo (numpy.ndarray): Máximo actual de cada indicador.
+        normalizados (numpy.ndarray): Valores normalizados e invertidos (distritos x indicadores).
+        notas (numpy.ndarray): Notas sin redondear (distritos x ámbitos).
+        valores_base (numpy.ndarray): Valores iniciales, para restablecer el motor.
+        indices_base (pandas.DataFrame): Índices con los valores iniciales.
+        ambitos_generales (tuple): Ámbitos que forman la nota general.
+    """
+    distritos: pd.DataFrame
+    indicadores: list
+    ambitos: list
+    bloques: list
+    negativos: np.ndarray
+    pesos: np.ndarray
+    valores: np.ndarray
+    minimo: np.ndarray
+    maximo: np.ndarray
+    normalizados: np.ndarray
+    notas: np.ndarray
+    valores_base: np.ndarray
+    indices_base: pd.DataFrame = None
+    ambitos_generales: tuple = AMBITOS_GENERALES
+
+    def __post_init__(self):
+        # Filas por código y por nombre de distrito, columnas por indicador y ámbito de cada columna
+        self.filas = {}
+        for fila, (codigo, nombre) in enumerate(self.distritos[['cod_distrito', 'distrito']].itertuples(index=False)):
+            self.filas.update({codigo: fila, nombre: fila})
+        self.columnas = {}
+        for columna, indicador in enumerate(self.indicadores):
+            self.columnas.setdefault(indicador, []).append(columna)
+        self.ambito_columna = np.empty(len(self.indicadores), dtype=np.intp)
+        for j, bloque in enumerate(self.bloques):
+            self.ambito_columna[bloque] = j
+
+    def normalizar_columna(self, columna):
+        # Mínimo, máximo y valores normalizados de toda la columna
+        valores = self.valores[:, [columna]]
+        self.minimo[columna], self.maximo[columna] = np.nanmin(valores), np.nanmax(valores)
+        normalizados = normalizar_min_max(valores)[:, 0]
+        self.normalizados[:, columna] = 1 - normalizados if self.negativos[columna] else normalizados
+
+    def normalizar_celda(self, fila, columna):
+        # Misma operación que normalizar_min_max con el mínimo y el máximo guardados
+        minimo = self.minimo[columna]
+        rango = self.maximo[columna] - minimo
+        escala = 1.0 / (rango if rango >= 10 * np.finfo(float).eps else 1.0)
+        normalizado = self.valores[fila, columna] * escala - minimo * escala
+        self.normalizados[fila, columna] = 1 - normalizado if self.negativos[columna] else normalizado
+
+    def calcular_notas(self, filas, ambito):
+        # Nota sin redondear de un ámbito en las filas indicadas (slice o lista)
+        bloque = self.bloques[ambito]
+        self.notas[filas, ambito] = (self.normalizados[filas, bloque] @ self.pesos[bloque, [ambito]] * 100)[..., 0]
+
+    def ubicar(self, distrito, indicador):
+        # Fila del distrito (código o nombre) y columnas del indicador
+        if distrito not in self.filas:
+            raise ValueError(f'Distrito desconocido: {distrito!r}')
+        if indicador not in self.columnas:
+            raise ValueError(f'Indicador desconocido: {indicador!r}')
+        return self.filas[distrito], self.columnas[indicador]
+
+    def aplicar(self, cambios):
+        """
+        Aplica un lote de cambios y actualiza las notas afectadas. Los cambios se aplican
+        en orden, así que varios cambios de la misma celda se encadenan.
+
+        Args:
+            cambios (list | pandas.DataFrame): Cambios con 'distrito' (código o nombre),
+                'indicador' y 'valor' (nuevo valor) o 'variacion' (suma al valor actual).
+
+        Returns:
+            list: Lista de (fila, columna, valor anterior) para deshacer los cambios.
+        """
+        registros = cambios.to_dict('records') if isinstance(cambios, pd.DataFrame) else list(cambios)
+
+        anteriores, renormalizar, celdas = [], set(), set()
+        for cambio in registros:
+            fila, columnas = self.ubicar(cambio['distrito'], cambio['indicador'])
+            variacion = cambio.get('variacion')
+            for columna in columnas:
+                anterior = self.valores[fila, columna]
+                nuevo = anterior + variacion if variacion is not None and not pd.isna(variacion) else cambio['valor']
+                self.valores[fila, columna] = nuevo
+                anteriores.append((fila, columna, anterior))
+
+                # El mínimo o el máximo cambian si el valor sale del rango o si el anterior era un extremo
+                if columna in renormalizar:
+                    continue
+                minimo, maximo = self.minimo[columna], self.maximo[columna]
+                if minimo < nuevo < maximo and minimo < anterior < maximo:
+                    celdas.add((fila, columna))
+                else:
+                    renormalizar.add(columna)
+
+        # Columnas cuyo rango cambia: se normaliza toda la columna; resto de cambios: solo la celda
+        for columna in renormalizar:
+            self.normalizar_columna(columna)
+        celdas = {(f, c) for f, c in celdas if c not in renormalizar}
+        for fila, columna in celdas:
+            self.normalizar_celda(fila, columna)
+
+        # Nota del ámbito en todos los distritos si alguna columna cambia de rango, y si no solo en los distritos cambiados
+        ambitos_completos = {self.ambito_columna[c] for c in renormalizar}
+        for ambito in ambitos_completos:
+            self.calcular_notas(slice(None), ambito)
+        for fila, ambito in {(f, self.ambito_columna[c]) for f, c in celdas}:
+            if ambito not in ambitos_completos:
+                self.calcular_notas([fila], ambito)
+
+        return anteriores
+
+    def deshacer(self, anteriores):
+        # Devuelve las celdas a sus valores anteriores (en orden inverso), también de forma incremental
+        self.aplicar([{'distrito': self.distritos['cod_distrito'].iloc[fila], 'indicador': self.indicadores[columna],
+                       'valor': valor} for fila, columna, valor in reversed(anteriores)])
+
+    def restablecer(self):
+        # Vuelve a los valores iniciales recalculando todas las columnas y notas
+        self.valores[:] = self.valores_base
+        for columna in range(len(self.indicadores)):
+            self.normalizar_columna(columna)
+        for ambito in range(len(self.ambitos)):
+            self.calcular_notas(slice(None), ambito)
+
+    def indices(self):
+        """
+        Índices de desigualdad con los valores actuales, como calcular_indices_desigualdad.
+
+        Returns:
+            pandas.DataFrame: DataFrame con 'cod_distrito', 'distrito' y las columnas 'indice_desigualdad_*'.
+        """
+        df_notas = self.distritos.copy()
+        df_notas[[f'nota_{ambito}' for ambito in self.ambitos]] = self.notas.round(2)
+        return calcular_indices_desigualdad(df_notas, self.ambitos_generales)
+
+    def rankings(self):
+        """
+        Índices y rankings actuales (1 = el distrito más desigual) con la variación respecto
+        de los valores iniciales.
+
+        Returns:
+            pandas.DataFrame: Por cada índice, su valor, 'ranking_<ámbito>', 'variacion_<ámbito>'
+            (puntos del índice) y 'cambio_ranking_<ámbito>' (posiciones; negativo si sube hacia
+            los más desiguales), ordenado por el ranking general.
+        """
+        # Mismas operaciones que calcular_indices_desigualdad, sobre arrays para no insertar columna a columna
+        notas = self.notas.round(2)
+        generales = [self.ambitos.index(ambito) for ambito in self.ambitos_generales]
+        indices = {ambito: 100 - notas[:, j] for ambito, j in zip(self.ambitos_generales, generales)}
+        indices['general'] = 100 - (notas[:, generales].sum(axis=1) / len(generales)).round(2)
+
+        columnas = {'cod_distrito': self.distritos['cod_distrito'].to_numpy(),
+                    'distrito': self.distritos['distrito'].to_numpy()}
+        for ambito, actual in indices.items():
+            base = self.indices_base[f'indice_desigualdad_{ambito}'].to_numpy()
+            ranking = posiciones_ranking(actual)
+            columnas[f'indice_desigualdad_{ambito}'] = actual
+            columnas[f'ranking_{ambito}'] = ranking
+            columnas[f'variacion_{ambito}'] = (actual - base).round(2)
+            columnas[f'cambio_ranking_{ambito}'] = ranking - posiciones_ranking(base)
+
+        orden = np.argsort(columnas['ranking_general'])
+        return pd.DataFrame({columna: valores[orden] for columna, valores in columnas.items()})
+
+    def simular(self, cambios):
+        """
+        Calcula los rankings de un escenario sin conservar sus cambios.
+
+        Args:
+            cambios (list | pandas.DataFrame): Cambios del escenario (ver aplicar).
+
+        Returns:
+            pandas.DataFrame: Rankings del escenario (ver rankings).
+        """
+        anteriores = self.aplicar(cambios)
+        try:
+            return self.rankings()
+        finally:
+            self.deshacer(anteriores)
+
+
+
+###### CREACIÓN DEL MOTOR ######
+
+def posiciones_ranking(indices):
+    # Posición de cada distrito de mayor a menor índice (1 = el más desigual), con el orden original en los empates
+    orden = np.argsort(-np.asarray(indices), kind='stable')
+    posiciones = np.empty(len(orden), dtype=np.int64)
+    posiciones[orden] = np.arange(1, len(orden) + 1)
+    return posiciones
+
+def unir_ambitos(tablas, ambitos=AMBITOS_GENERALES):
+    """
+    Une las tablas de indicadores de los ámbitos en un solo DataFrame por distrito.
+
+    Args:
+        tablas (dict): Diccionario {ámbito: DataFrame con 'cod_distrito', 'distrito' y sus indicadores}.
+
+    Returns:
+        pandas.DataFrame: DataFrame con los indicadores de todos los ámbitos.
+    """
+    df = tablas[ambitos[0]]
+    for ambito in ambitos[1:]:
+        df = pd.merge(df, tablas[ambito], on=['cod_distrito', 'distrito'], how='outer')
+    return df
+
+def crear_motor_escenarios(df, especificacion=ESPECIFICACION_NOTAS, ambitos_generales=AMBITOS_GENERALES):
+    """
+    Crea el motor de escenarios normalizando y puntuando una vez todos los indicadores.
+
+    Args:
+        df (pandas.DataFrame): DataFrame con 'cod_distrito', 'distrito' y los indicadores de
+            todos los ámbitos (por ejemplo, el resultado de unir_ambitos).
+        especificacion (dict): Especificación de las notas (por defecto ESPECIFICACION_NOTAS).
+        ambitos_generales (tuple): Ámbitos que forman la nota general.
+
+    Returns:
+        MotorEscenarios: Motor con el estado inicial calculado.
+    """
+    indicadores, ambitos, negativos, pesos = preparar_especificacion(especificacion)
+
+    # Los indicadores de cada ámbito ocupan un bloque contiguo de columnas
+    limites = np.cumsum([0] + [len(especificacion[ambito]['pesos']) for ambito in ambitos])
+    bloques = [slice(inicio, fin) for inicio, fin in zip(limites[:-1], limites[1:])]
+
+    valores = df[indicadores].to_numpy(dtype=float, copy=True)
+    n_distritos = len(valores)
+    motor = MotorEscenarios(
+        distritos=df[['cod_distrito', 'distrito']].reset_index(drop=True), indicadores=indicadores, ambitos=ambitos,
+        bloques=bloques, negativos=negativos, pesos=pesos, valores=valores,
+        minimo=np.empty(len(indicadores)), maximo=np.empty(len(indicadores)),
+        normalizados=np.empty_like(valores), notas=np.empty((n_distritos, len(ambitos))),
+        valores_base=valores.copy(), ambitos_generales=tuple(ambitos_generales))
+
+    motor.restablecer()
+    motor.indices_base = motor.indices()
+    return motor
@@ -0,0 +1,354 @@
+import json
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from scipy.spatial import Delaunay, cKDTree
+
+from .accesibilidad import a_cartesianas, centroides_barrios
+from .equipamientos import cargar_equipamientos
+
+
+
+# Vecinos de cada unidad en la matriz de k vecinos más cercanos
+K_VECINOS = 4
+
+# Permutaciones para la inferencia de Moran y LISA
+N_PERMUTACIONES = 999
+
+# Nivel de significación de los clústeres LISA
+ALFA_LISA = 0.05
+
+# Elementos (series x permutaciones x unidades, y x vecinos en LISA) que se procesan a la vez
+TAMANO_BLOQUE_PERMUTACIONES = 20_000_000
+
+# Tablas de indicadores por distrito sobre las que se calcula la autocorrelación
+AMBITOS_ESPACIALES = ['indices', 'economia', 'educacion', 'social', 'salud', 'poblacion', 'accesibilidad']
+
+# Columnas de resultados de cada indicador y unidad (tras 'indicador' y la clave de la unidad)
+COLUMNAS_AUTOCORRELACION = ['valor', 'i_local', 'retardo', 'p_valor', 'cluster', 'moran_i', 'p_valor_moran']
+
+
+
+###### MATRICES DE PESOS ESPACIALES ######
+
+def estandarizar_filas(pesos):
+    # Matriz de pesos con las filas sumando 1 (las unidades sin vecinos quedan a 0)
+    pesos = sparse.csr_matrix(pesos, dtype=float)
+    suma = np.asarray(pesos.sum(axis=1)).ravel()
+    return sparse.diags(np.divide(1, suma, out=np.zeros_like(suma), where=suma > 0)) @ pesos
+
+def pesos_knn(latitud, longitud, k=K_VECINOS):
+    """
+    Matriz de pesos de los k vecinos más cercanos de cada unidad (por sus centroides),
+    estandarizada por filas.
+
+    Returns:
+        scipy.sparse.csr_matrix: Matriz (unidades x unidades).
+    """
+    puntos = a_cartesianas(latitud, longitud)
+    n = len(puntos)
+    k = min(k, n - 1)
+    _, vecinos = cKDTree(puntos).query(puntos, k=k + 1)
+
+    # La primera columna es la propia unidad
+    filas = np.repeat(np.arange(n), k)
+    pesos = sparse.csr_matrix((np.ones(n * k), (filas, vecinos[:, 1:].ravel())), shape=(n, n))
+    return estandarizar_filas(pesos)
+
+def pesos_delaunay(latitud, longitud):
+    """
+    Matriz de contigüidad aproximada a partir de los centroides: dos unidades son vecinas
+    si comparten una arista de la triangulación de Delaunay. Sirve cuando no hay límites
+    de las unidades, estandarizada por filas.
+
+    Returns:
+        scipy.sparse.csr_matrix: Matriz (unidades x unidades).
+    """
+    latitud, longitud = np.asarray(latitud, dtype=float), np.asarray(longitud, dtype=float)
+    puntos = np.column_stack([longitud * np.cos(np.radians(latitud.mean())), latitud])
+    triangulos = Delaunay(puntos).simplices
+
+    aristas = np.concatenate([triangulos[:, [0, 1]], triangulos[:, [1, 2]], triangulos[:, [0, 2]]])
+    n = len(puntos)
+    pesos = sparse.csr_matrix((np.ones(len(aristas)), (aristas[:, 0], aristas[:, 1])), shape=(n, n))
+    return estandarizar_filas((pesos + pesos.T) > 0)
+
+def pesos_contiguidad(ruta_geojson, propiedad, decimales=6):
+    """
+    Matriz de contigüidad 'reina' a partir de un archivo GeoJSON local con los límites de
+    las unidades: dos unidades son vecinas si comparten algún vértice. Se calcula con una
+    matriz dispersa unidades x vértices, sin librerías de geometría.
+
+    Args:
+        ruta_geojson (str): Ruta del archivo GeoJSON (polígonos o multipolígonos).
+        propiedad (str): Propiedad de cada elemento con el código de la unidad.
+        decimales (int): Decimales con los que se comparan las coordenadas de los vértices.
+
+    Returns:
+        tuple: Códigos de las unidades (pandas.Index) y matriz de pesos estandarizada por filas.
+    """
+    with open(ruta_geojson, encoding='utf-8') as f:
+        elementos = json.load(f)['features']
+
+    codigos, unidades, vertices = [], [], []
+    for i, elemento in enumerate(elementos):
+        codigos.append(elemento['properties'][propiedad])
+        geometria = elemento['geometry']
+        poligonos = [geometria['coordinates']] if geometria['type'] == 'Polygon' else geometria['coordinates']
+        coordenadas = np.concatenate([np.asarray(anillo, dtype=float)[:, :2] for p in poligonos for anillo in p])
+        unidades.append(np.full(len(coordenadas), i))
+        vertices.append(coordenadas)
+
+    # Identificar cada vértice por sus coordenadas redondeadas
+    claves, identificadores = np.unique(np.round(np.concatenate(vertices), decimales), axis=0, return_inverse=True)
+    incidencia = sparse.csr_matrix((np.ones(len(identificadores)), (np.concatenate(unidades), identificadores.ravel())),
+                                   shape=(len(elementos), len(claves)))
+
+    comparten = (incidencia @ incidencia.T).tolil()
+    comparten.setdiag(0)
+    return pd.Index(codigos), estandarizar_filas(comparten.tocsr() > 0)
+
+def centroides_distritos(rutas_equipamientos):
+    """
+    Aproxima el centro de cada barrio y de cada distrito con la posición media de sus
+    equipamientos (el de cada distrito, como media de sus barrios).
+
+    Args:
+        rutas_equipamientos (list): Rutas de los listados de equipamientos.
+
+    Returns:
+        tuple: DataFrames de centroides de barrios y de distritos con 'latitud' y 'longitud'.
+    """
+    dfs = [cargar_equipamientos(ruta, ['COD-DISTRITO', 'COD-BARRIO', 'LATITUD', 'LONGITUD'])
+           for ruta in rutas_equipamientos]
+    barrios = centroides_barrios(*dfs)
+    distritos = barrios.groupby('cod_distrito', as_index=False)[['latitud', 'longitud']].mean()
+    return barrios, distritos
+
+
+
+###### AUTOCORRELACIÓN GLOBAL ######
+
+def estandarizar_valores(valores):
+    # Desviaciones respecto de la media de cada serie (series x unidades)
+    valores = np.atleast_2d(np.asarray(valores, dtype=float))
+    return valores - valores.mean(axis=1, keepdims=True)
+
+def p_valor_permutaciones(mayores, n_permutaciones):
+    # Pseudo p-valor de dos colas: el doble del de la cola más cercana a lo observado, como máximo 1
+    extremos = np.minimum(mayores, n_permutaciones - mayores)
+    return np.minimum(1, 2 * (extremos + 1) / (n_permutaciones + 1))
+
+def moran_global(valores, pesos, n_permutaciones=N_PERMUTACIONES, semilla=0,
+                 tamano_bloque=TAMANO_BLOQUE_PERMUTACIONES):
+    """
+    I de Moran global de varias series con inferencia por permutaciones.
+
+    Todas las permutaciones de todas las series se colocan como columnas de una matriz
+    densa (unidades x series·permutaciones) y los retardos espaciales salen de un único
+    producto por la matriz dispersa de pesos (por bloques de series para limitar la memoria).
+
+    Args:
+        valores (ndarray): Array (series, unidades) sin nulos.
+        pesos (scipy.sparse.csr_matrix): Matriz de pesos (unidades x unidades).
+        n_permutaciones (int): Número de permutaciones.
+        semilla (int): Semilla del generador aleatorio.
+        tamano_bloque (int): Elementos (series x permutaciones x unidades) calculados a la vez.
+
+    Returns:
+        pandas.DataFrame: Una fila por serie con 'moran_i', 'esperanza', 'z_sim' y 'p_valor'.
+    """
+    z = estandarizar_valores(valores)
+    series, n = z.shape
+    escala = n / pesos.sum()
+    cuadrados = (z ** 2).sum(axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        observado = escala * (z * (pesos @ z.T).T).sum(axis=1) / cuadrados
+
+    # Matriz de permutaciones (permutaciones x unidades) compartida por todas las series
+    rng = np.random.default_rng(semilla)
+    permutaciones = rng.permuted(np.tile(np.arange(n), (n_permutaciones, 1)), axis=1)
+    simulados = np.empty((series, n_permutaciones))
+    por_bloque = max(1, tamano_bloque // (n * n_permutaciones))
+    for inicio in range(0, series, por_bloque):
+        bloque = slice(inicio, inicio + por_bloque)
+        # Permutados directamente como columnas contiguas: unidades x (permutaciones·series)
+        columnas = z[bloque].T[permutaciones.T].reshape(n, -1)
+        productos = np.einsum('uc,uc->c', columnas, pesos @ columnas).reshape(n_permutaciones, -1).T
+        with np.errstate(divide='ignore', invalid='ignore'):
+            simulados[bloque] = escala * productos / cuadrados[bloque, None]
+
+    mayores = (simulados >= observado[:, None]).sum(axis=1)
+    return pd.DataFrame({
+        'moran_i': observado,
+        'esperanza': -1 / (n - 1),
+        'z_sim': (observado - simulados.mean(axis=1)) / simulados.std(axis=1),
+        'p_valor': p_valor_permutaciones(mayores, n_permutaciones),
+    })
+
+
+
+###### AUTOCORRELACIÓN LOCAL ######
+
+def vecinos_rellenos(pesos):
+    # Pesos de los vecinos de cada unidad en una matriz (unidades x máximo de vecinos) rellena con 0
+    pesos = sparse.csr_matrix(pesos)
+    cardinalidad = np.diff(pesos.indptr)
+    maximo = max(int(cardinalidad.max()), 1)
+    rellenos = np.zeros((pesos.shape[0], maximo))
+    posiciones = np.arange(pesos.nnz) - np.repeat(pesos.indptr[:-1], cardinalidad)
+    rellenos[np.repeat(np.arange(pesos.shape[0]), cardinalidad), posiciones] = pesos.data
+    return rellenos
+
+def lisa(valores, pesos, n_permutaciones=N_PERMUTACIONES, alfa=ALFA_LISA, semilla=0,
+         tamano_bloque=TAMANO_BLOQUE_PERMUTACIONES):
+    """
+    Indicadores locales de Moran (LISA) de varias series con permutaciones condicionales:
+    el valor de cada unidad se fija y se reparten al azar los demás entre sus vecinos.
+
+    Cada permutación es un conjunto de posiciones al azar entre las otras n - 1 unidades,
+    común a todas las unidades (se desplaza para saltar la propia), así que los retardos
+    simulados de todas las unidades, permutaciones y series salen de una sola indexación y
+    un producto por los pesos de los vecinos, por bloques de series para limitar la memoria.
+
+    Args:
+        valores (ndarray): Array (series, unidades) sin nulos.
+        pesos (scipy.sparse.csr_matrix): Matriz de pesos estandarizada por filas.
+        n_permutaciones (int): Número de permutaciones.
+        alfa (float): Nivel de significación de los clústeres.
+        semilla (int): Semilla del generador aleatorio.
+        tamano_bloque (int): Elementos (series x unidades x permutaciones x vecinos) calculados a la vez.
+
+    Returns:
+        dict: Arrays (series, unidades) 'i_local', 'retardo', 'p_valor' y 'cluster'
+        ('alto-alto', 'bajo-bajo', 'alto-bajo', 'bajo-alto' o 'no significativo').
+    """
+    z = estandarizar_valores(valores)
+    series, n = z.shape
+    with np.errstate(divide='ignore', invalid='ignore'):
+        z = z / np.sqrt((z ** 2).mean(axis=1, keepdims=True))
+    retardo = (pesos @ z.T).T
+    i_local = z * retardo
+
+    pesos_vecinos = vecinos_rellenos(pesos)                           # unidades x máximo de vecinos
+    maximo = pesos_vecinos.shape[1]
+
+    # Posiciones al azar entre las n - 1 otras unidades, desplazadas para saltar la propia
+    rng = np.random.default_rng(semilla)
+    posiciones = np.argsort(rng.random((n_permutaciones, n - 1)), axis=1)[:, :maximo]
+    otras = posiciones[None, :, :] + (posiciones[None, :, :] >= np.arange(n)[:, None, None])   # unidades x perm. x vecinos
+
+    mayores = np.empty((series, n), dtype=np.int64)
+    por_bloque = max(1, tamano_bloque // max(n * n_permutaciones * maximo, 1))
+    for inicio in range(0, series, por_bloque):
+        bloque = z[inicio:inicio + por_bloque]
+        retardos = np.einsum('supk,uk->sup', bloque[:, otras], pesos_vecinos)   # series x unidades x permutaciones
+        simulados = bloque[:, :, None] * retardos
+        mayores[inicio:inicio + por_bloque] = (simulados >= i_local[inicio:inicio + por_bloque, :, None]).sum(axis=2)
+
+    p_valor = p_valor_permutaciones(mayores, n_permutaciones)
+
+    cuadrantes = np.select([(z > 0) & (retardo > 0), (z < 0) & (retardo < 0), (z > 0) & (retardo < 0),
+                            (z < 0) & (retardo > 0)], ['alto-alto', 'bajo-bajo', 'alto-bajo', 'bajo-alto'],
+                           'no significativo')
+    cluster = np.where(p_valor <= alfa, cuadrantes, 'no significativo')
+    return {'i_local': i_local, 'retardo': retardo, 'p_valor': p_valor, 'cluster': cluster}
+
+
+
+###### AUTOCORRELACIÓN DE LAS TABLAS ######
+
+def autocorrelacion_espacial(df, clave, pesos, codigos, columnas=None, n_permutaciones=N_PERMUTACIONES,
+                             alfa=ALFA_LISA, semilla=0):
+    """
+    Calcula el I de Moran global y los LISA de todas las columnas numéricas de una tabla
+    con una fila por unidad.
+
+    Las columnas con nulos se calculan solo sobre las unidades con valor (con los pesos
+    de esas unidades estandarizados de nuevo).
+
+    Args:
+        df (pandas.DataFrame): Tabla con la columna 'clave' y los indicadores.
+        clave (str): Columna con el código de la unidad ('cod_distrito', 'id_barrio'...).
+        pesos (scipy.sparse.csr_matrix): Matriz de pesos en el orden de 'codigos'.
+        codigos (list): Código de cada fila y columna de 'pesos'.
+        columnas (list): Indicadores (por defecto todas las columnas numéricas salvo las claves).
+        n_permutaciones (int): Número de permutaciones.
+        alfa (float): Nivel de significación de los clústeres.
+        semilla (int): Semilla del generador aleatorio.
+
+    Returns:
+        pandas.DataFrame: Una fila por indicador y unidad con el valor, 'i_local', 'retardo',
+        'p_valor' y 'cluster', más el I de Moran global del indicador ('moran_i', 'p_valor_moran').
+    """
+    codigos = pd.Index(codigos)
+    if columnas is None:
+        columnas = [c for c in df.select_dtypes('number').columns
+                    if c not in (clave, 'cod_distrito', 'cod_barrio', 'id_barrio')]
+
+    # Valores en el orden de la matriz de pesos (unidades x indicadores)
+    valores = df.drop_duplicates(clave).set_index(clave).reindex(codigos)[columnas].to_numpy(dtype=float)
+
+    # Las columnas con los mismos nulos comparten la submatriz de pesos y se calculan juntas
+    patrones = pd.Series([np.isnan(valores[:, j]).tobytes() for j in range(len(columnas))])
+    resultados = {}
+    for _, indices in patrones.groupby(patrones, sort=False).groups.items():
+        indices = list(indices)
+        validas = ~np.isnan(valores[:, indices[0]])
+        if validas.sum() < 3:
+            continue
+        sub_pesos = estandarizar_filas(pesos[validas][:, validas])
+        sub_valores = valores[validas][:, indices].T
+
+        globales = moran_global(sub_valores, sub_pesos, n_permutaciones, semilla)
+        locales = lisa(sub_valores, sub_pesos, n_permutaciones, alfa, semilla)
+        for fila, j in enumerate(indices):
+            resultados[j] = pd.DataFrame({
+                'indicador': columnas[j], clave: codigos[validas], 'valor': sub_valores[fila],
+                'i_local': locales['i_local'][fila], 'retardo': locales['retardo'][fila],
+                'p_valor': locales['p_valor'][fila], 'cluster': locales['cluster'][fila],
+                'moran_i': globales['moran_i'].iloc[fila], 'p_valor_moran': globales['p_valor'].iloc[fila],
+            })
+
+    # Ninguna columna tiene unidades suficientes
+    if not resultados:
+        return pd.DataFrame(columns=['indicador', clave] + COLUMNAS_AUTOCORRELACION)
+
+    # En el orden de las columnas de la tabla
+    return pd.concat([resultados[j] for j in sorted(resultados)], ignore_index=True)
+
+def autocorrelacion_distritos(tablas, rutas_equipamientos, tipo='delaunay', k=K_VECINOS,
+                              n_permutaciones=N_PERMUTACIONES, semilla=0):
+    """
+    I de Moran global y LISA entre distritos de todos los indicadores e índices del proyecto.
+
+    Args:
+        tablas (dict): Diccionario {ámbito: DataFrame con 'cod_distrito' y los indicadores}.
+        rutas_equipamientos (list): Listados de equipamientos con los que se aproximan los centroides.
+        tipo (str): 'delaunay' (contigüidad aproximada) o 'knn' (k vecinos más cercanos).
+        k (int): Vecinos de la matriz 'knn'.
+
+    Returns:
+        pandas.DataFrame: Una fila por ámbito, indicador y distrito.
+    """
+    _, distritos = centroides_distritos(rutas_equipamientos)
+    if tipo == 'knn':
+        pesos = pesos_knn(distritos['latitud'], distritos['longitud'], k)
+    else:
+        pesos = pesos_delaunay(distritos['latitud'], distritos['longitud'])
+
+    resultados = []
+    for ambito in AMBITOS_ESPACIALES:
+        if ambito not in tablas:
+            continue
+        df = tablas[ambito].assign(cod_distrito=pd.to_numeric(tablas[ambito]['cod_distrito']).astype('int64'))
+        resultado = autocorrelacion_espacial(df, 'cod_distrito', pesos, distritos['cod_distrito'],
+                                             n_permutaciones=n_permutaciones, semilla=semilla)
+        resultado.insert(0, 'ambito', ambito)
+        resultados.append(resultado)
+
+    if not resultados:
+        return pd.DataFrame(columns=['ambito', 'indicador', 'cod_distrito'] + COLUMNAS_AUTOCORRELACION)
+
+    return pd.concat(resultados, ignore_index=True)
@@ -0,0 +1,265 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from .consultas import huella_dataframe
+from .geografia import DISTRITOS
+from .panel import codigo_distrito_entero, panel_presupuestos
+
+
+
+# Carpeta por defecto del modelo en estrella que lee el cuadro de mando de Power BI
+CARPETA_MODELO = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'powerbi')
+
+# Archivo con la descripción del modelo (tablas, tipos, relaciones y huellas de las particiones)
+ARCHIVO_MODELO = 'modelo.json'
+
+# Tablas de indicadores por distrito (artefactos del pipeline) que pasan a la tabla de hechos de indicadores
+AMBITOS_INDICADORES = ['economia', 'educacion', 'social', 'salud', 'poblacion', 'accesibilidad']
+
+# Tipos de Power Query de cada tipo de columna
+TIPOS_POWER_QUERY = {'i': 'Int64.Type', 'u': 'Int64.Type', 'f': 'type number', 'b': 'type logical'}
+
+# Relaciones del modelo: (tabla de hechos o dimensión, columna, dimensión)
+RELACIONES = [
+    ('dim_barrio', 'cod_distrito', 'dim_distrito'),
+    ('hechos_inversion', 'cod_distrito', 'dim_distrito'),
+    ('hechos_inversion', 'año', 'dim_año'),
+    ('hechos_inversion', 'cod_area', 'dim_area'),
+    ('hechos_indicadores', 'cod_distrito', 'dim_distrito'),
+    ('hechos_indicadores', 'cod_indicador', 'dim_indicador'),
+    ('hechos_indices', 'cod_distrito', 'dim_distrito'),
+]
+
+
+
+###### FUNCIONES DE LAS DIMENSIONES ######
+
+def codigos_estables(etiquetas, anteriores=None):
+    """
+    Asigna un código entero a cada etiqueta conservando los códigos de la exportación
+    anterior, de forma que una etiqueta nueva (un área de inversión o un indicador que
+    aparece en un año nuevo) no cambia los códigos del resto ni obliga a reescribir
+    las particiones antiguas.
+
+    Args:
+        etiquetas (list): Etiquetas actuales.
+        anteriores (dict): Diccionario {etiqueta: código} de la exportación anterior (opcional).
+
+    Returns:
+        dict: Diccionario {etiqueta: código} con todas las etiquetas actuales.
+    """
+    anteriores = dict(anteriores or {})
+    siguiente = max(anteriores.values(), default=0) + 1
+    for etiqueta in sorted(set(etiquetas) - set(anteriores)):
+        anteriores[etiqueta] = siguiente
+        siguiente += 1
+    return {etiqueta: anteriores[etiqueta] for etiqueta in sorted(set(etiquetas), key=anteriores.get)}
+
+def dimension_distritos():
+    # Los 21 distritos con su nombre oficial
+    return pd.DataFrame({'cod_distrito': np.array(list(DISTRITOS), dtype='int64'),
+                         'distrito': list(DISTRITOS.values())})
+
+def dimension_barrios(df_barrios):
+    # Barrios de la dimensión geográfica, enlazados con su distrito
+    return df_barrios[['id_barrio', 'cod_distrito', 'cod_barrio', 'barrio']].astype(
+        {'id_barrio': 'int64', 'cod_distrito': 'int64', 'cod_barrio': 'int64'})
+
+def dimension_codificada(codigos, columna_codigo, columna_etiqueta):
+    # Dimensión a partir de un diccionario {etiqueta: código}
+    return pd.DataFrame({columna_codigo: np.array(list(codigos.values()), dtype='int64'),
+                         columna_etiqueta: list(codigos)})
+
+
+
+###### FUNCIONES DE LAS TABLAS DE HECHOS ######
+
+def hechos_inversion(df_presupuestos, codigos_areas):
+    """
+    Tabla de hechos de la inversión: distrito, año y código de área como enteros, sin
+    repetir los nombres de las áreas en cada fila.
+
+    Returns:
+        pandas.DataFrame: DataFrame con 'cod_distrito', 'año', 'cod_area' y 'total_invertido'.
+    """
+    panel = panel_presupuestos(df_presupuestos, tolerancia=0)
+    df = panel.agregar(['cod_distrito', 'año', 'area_inversion'])
+    return pd.DataFrame({
+        'cod_distrito': df['cod_distrito'].to_numpy(dtype='int64'),
+        'año': df['año'].to_numpy(dtype='int64'),
+        'cod_area': df['area_inversion'].map(codigos_areas).to_numpy(dtype='int64'),
+        'total_invertido': df['total_invertido'].to_numpy(dtype='float64'),
+    })
+
+def indicadores_largos(tablas):
+    """
+    Pasa a formato largo (distrito, ámbito, indicador, valor) las columnas numéricas de las
+    tablas de indicadores por distrito.
+
+    Args:
+        tablas (dict): Diccionario {ámbito: DataFrame con 'cod_distrito' y los indicadores}.
+
+    Returns:
+        pandas.DataFrame: DataFrame con 'cod_distrito', 'ambito', 'indicador' y 'valor'.
+    """
+    partes = []
+    for ambito in AMBITOS_INDICADORES:
+        if ambito not in tablas:
+            continue
+        df = tablas[ambito]
+        columnas = df.select_dtypes('number').columns.drop('cod_distrito', errors='ignore')
+        largo = df.assign(cod_distrito=codigo_distrito_entero(df['cod_distrito'])).melt(
+            id_vars='cod_distrito', value_vars=list(columnas), var_name='indicador', value_name='valor')
+        partes.append(largo.assign(ambito=ambito))
+
+    if not partes:
+        return pd.DataFrame(columns=['cod_distrito', 'ambito', 'indicador', 'valor'])
+    df = pd.concat(partes, ignore_index=True).dropna(subset=['cod_distrito', 'valor'])
+    return df[['cod_distrito', 'ambito', 'indicador', 'valor']].astype({'cod_distrito': 'int64', 'valor': 'float64'})
+
+def hechos_indices(df_indices):
+    # Notas de cada ámbito e índice de desigualdad por distrito, sin el nombre del distrito
+    df = df_indices.drop(columns=['distrito'], errors='ignore')
+    return df.assign(cod_distrito=codigo_distrito_entero(df['cod_distrito']).astype('int64'))
+
+
+
+###### ESCRITURA DEL MODELO ######
+
+def describir_columnas(df):
+    # Tipo de pandas y de Power Query de cada columna
+    return [{'nombre': str(c), 'tipo': str(t), 'tipo_power_query': TIPOS_POWER_QUERY.get(t.kind, 'type text')}
+            for c, t in df.dtypes.items()]
+
+def particionar(df, columna=None):
+    # {archivo: DataFrame}: un archivo por valor de la columna de partición o uno solo con toda la tabla
+    if columna is None:
+        return {'todo.csv': df}
+    return {f'{columna}={valor}.csv': parte.reset_index(drop=True)
+            for valor, parte in df.groupby(columna, sort=True)}
+
+def escribir_tabla(df, nombre, carpeta, anterior=None, columna_particion=None, incremental=True):
+    """
+    Escribe una tabla del modelo como una carpeta de archivos CSV (uno por partición).
+    En modo incremental solo se reescriben las particiones cuya huella ha cambiado, y se
+    borran las que ya no existen.
+
+    Args:
+        df (pandas.DataFrame): Tabla a escribir.
+        nombre (str): Nombre de la tabla (y de su carpeta).
+        carpeta (str): Carpeta del modelo.
+        anterior (dict): Descripción de la tabla en la exportación anterior (opcional).
+        columna_particion (str): Columna por la que se parte la tabla (opcional).
+        incremental (bool): Si se conservan las particiones sin cambios.
+
+    Returns:
+        tuple: Descripción de la tabla para el modelo y número de particiones escritas.
+    """
+    destino = os.path.join(carpeta, nombre)
+    os.makedirs(destino, exist_ok=True)
+    particiones_anteriores = (anterior or {}).get('particiones', {}) if incremental else {}
+
+    particiones, escritas = {}, 0
+    for archivo, parte in particionar(df, columna_particion).items():
+        huella = huella_dataframe(parte)
+        ruta = os.path.join(destino, archivo)
+        if particiones_anteriores.get(archivo, {}).get('huella') != huella or not os.path.isfile(ruta):
+            parte.to_csv(ruta + '.tmp', index=False, encoding='utf-8', lineterminator='\n')
+            os.replace(ruta + '.tmp', ruta)
+            escritas += 1
+        particiones[archivo] = {'huella': huella, 'filas': len(parte)}
+
+    # Borrar las particiones que ya no existen (un año que desaparece, una tabla sin partir...)
+    for archivo in os.listdir(destino):
+        if archivo not in particiones:
+            os.remove(os.path.join(destino, archivo))
+
+    descripcion = {'columnas': describir_columnas(df), 'particion': columna_particion, 'particiones': particiones}
+    return descripcion, escritas
+
+def cargar_modelo(carpeta=CARPETA_MODELO):
+    # Descripción de la última exportación (vacía si no hay ninguna)
+    ruta = os.path.join(carpeta, ARCHIVO_MODELO)
+    if not os.path.isfile(ruta):
+        return {'tablas': {}, 'relaciones': []}
+    with open(ruta, encoding='utf-8') as f:
+        return json.load(f)
+
+def codigos_anteriores(modelo, tabla, columna_codigo, columna_etiqueta, carpeta):
+    # Códigos de una dimensión codificada en la exportación anterior
+    ruta = os.path.join(carpeta, tabla, 'todo.csv')
+    if tabla not in modelo['tablas'] or not os.path.isfile(ruta):
+        return {}
+    df = pd.read_csv(ruta, encoding='utf-8')
+    return dict(zip(df[columna_etiqueta], df[columna_codigo].astype(int)))
+
+def exportar_modelo(tablas, carpeta=CARPETA_MODELO, incremental=True):
+    """
+    Exporta las tablas del proyecto como un modelo en estrella para Power BI:
+
+    - Dimensiones: dim_distrito, dim_barrio, dim_area, dim_año y dim_indicador.
+    - Hechos: hechos_inversion (partida por año), hechos_indicadores y hechos_indices,
+      con las claves como enteros en lugar de repetir los nombres en cada fila.
+
+    Cada tabla es una carpeta de CSV (un archivo por partición) que se puede cargar con el
+    conector de carpetas de Power BI. 'modelo.json' describe los tipos de las columnas, las
+    relaciones y la huella de cada partición. En modo incremental solo se reescriben las
+    particiones que cambian, de modo que añadir un año de presupuestos escribe un archivo.
+    Los códigos de las áreas y de los indicadores se conservan entre exportaciones.
+
+    Args:
+        tablas (dict): Diccionario {artefacto: DataFrame} con 'presupuestos', 'indices', las
+            tablas de indicadores ('economia', 'educacion'...) y opcionalmente 'barrios'.
+        carpeta (str): Carpeta del modelo.
+        incremental (bool): Si se conservan las particiones sin cambios.
+
+    Returns:
+        pandas.DataFrame: Una fila por tabla con sus filas, particiones y particiones escritas.
+    """
+    os.makedirs(carpeta, exist_ok=True)
+    anterior = cargar_modelo(carpeta) if incremental else {'tablas': {}, 'relaciones': []}
+
+    # Dimensiones codificadas con los códigos de la exportación anterior
+    codigos_areas = codigos_estables(tablas['presupuestos']['area_inversion'].dropna().unique(),
+                                     codigos_anteriores(anterior, 'dim_area', 'cod_area', 'area_inversion', carpeta))
+    df_indicadores = indicadores_largos(tablas)
+    codigos_indicadores = codigos_estables(
+        df_indicadores['indicador'].unique(),
+        codigos_anteriores(anterior, 'dim_indicador', 'cod_indicador', 'indicador', carpeta))
+    ambitos = df_indicadores.drop_duplicates('indicador').set_index('indicador')['ambito']
+
+    df_inversion = hechos_inversion(tablas['presupuestos'], codigos_areas)
+    dim_indicador = dimension_codificada(codigos_indicadores, 'cod_indicador', 'indicador')
+    dim_indicador['ambito'] = dim_indicador['indicador'].map(ambitos)
+
+    modelo = {
+        'dim_distrito': (dimension_distritos(), None),
+        'dim_area': (dimension_codificada(codigos_areas, 'cod_area', 'area_inversion'), None),
+        'dim_año': (pd.DataFrame({'año': np.sort(df_inversion['año'].unique())}), None),
+        'dim_indicador': (dim_indicador, None),
+        'hechos_inversion': (df_inversion, 'año'),
+        'hechos_indicadores': (pd.DataFrame({
+            'cod_distrito': df_indicadores['cod_distrito'].to_numpy(),
+            'cod_indicador': df_indicadores['indicador'].map(codigos_indicadores).to_numpy(dtype='int64'),
+            'valor': df_indicadores['valor'].to_numpy()}), None),
+        'hechos_indices': (hechos_indices(tablas['indices']), None),
+    }
+    if 'barrios' in tablas:
+        modelo['dim_barrio'] = (dimension_barrios(tablas['barrios']), None)
+
+    descripcion = {'tablas': {}, 'relaciones': [{'desde': f'{t}.{c}', 'hacia': f'{d}.{c}'}
+                                                 for t, c, d in RELACIONES if t in modelo]}
+    resumen = []
+    for nombre, (df, columna_particion) in modelo.items():
+        descripcion['tablas'][nombre], escritas = escribir_tabla(
+            df, nombre, carpeta, anterior['tablas'].get(nombre), columna_particion, incremental)
+        resumen.append({'tabla': nombre, 'filas': len(df), 'particiones': len(descripcion['tablas'][nombre]['particiones']),
+                        'escritas': escritas})
+
+    with open(os.path.join(carpeta, ARCHIVO_MODELO), 'w', encoding='utf-8') as f:
+        json.dump(descripcion, f, ensure_ascii=False, indent=1)
+
+    return pd.DataFrame(resumen)
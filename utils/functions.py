@@ -1,17 +1,58 @@
 import pandas as pd
 import os
 import sys
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+import unicodedata
+import warnings
+import matplotlib
 import matplotlib.pyplot as plt
 import seaborn as sns
 from scipy.stats import chi2_contingency
 from scipy import stats
 import numpy as np
-from sklearn.preprocessing import MinMaxScaler
 
+try:
+    from .geografia import codigo_distrito, distrito_codigo_postal, nombre_distrito
+    from .panel import crear_panel
+except ImportError:
+    # Importado como módulo suelto (from functions import * en los notebooks)
+    from geografia import codigo_distrito, distrito_codigo_postal, nombre_distrito
+    from panel import crear_panel
 
 
 ###### FUNCIONES DE LIMPIEZA DE DATOS ######
 
+def normalizar_textos(serie, estandarizar=False):
+    """
+    Normaliza los textos de una serie en un solo paso: quita los espacios al comienzo y final y,
+    si se indica, quita las tildes, pasa a minúsculas y cambia espacios y guiones por guiones bajos.
+
+    La transformación se aplica solo a los valores distintos (los nombres de distrito o de
+    indicador se repiten en millones de filas) y después se expande con sus códigos.
+
+    Args:
+        serie (pandas.Series): Serie con los textos.
+        estandarizar (bool): Si además se aplica la estandarización de estandarizar_columnas.
+
+    Returns:
+        pandas.Series: Serie normalizada (los valores que no son texto pasan a nulos).
+    """
+    codigos, unicos = pd.factorize(serie)
+    normalizados = np.empty(len(unicos), dtype=object)
+    for i, valor in enumerate(unicos):
+        if not isinstance(valor, str):
+            normalizados[i] = np.nan
+        else:
+            normalizados[i] = estandarizar_texto(valor.strip()) if estandarizar else valor.strip()
+    valores = np.append(normalizados, np.nan)[codigos]
+    return pd.Series(valores, index=serie.index, name=serie.name, dtype=object)
+
+def estandarizar_texto(texto):
+    # Quitar tildes, pasar a minúsculas y reemplazar espacios y guiones por guiones bajos
+    texto = unicodedata.normalize('NFKD', texto).encode('ascii', errors='ignore').decode('utf-8')
+    return texto.lower().replace(' ', '_').replace('-', '_')
+
 def eliminar_espacios(df, column):
     '''
     Elimina los espacios en blancos al comienzo y final de los valores de la columna.
@@ -20,7 +61,7 @@ def eliminar_espacios(df, column):
         df (pandas.DataFrame): DataFrame que contiene la columna.
         column (str): Columna del DataFrame que contendrán los valores a los que quitar espacios.
     '''
-    df[column] = df[column].str.strip()
+    df[column] = normalizar_textos(df[column])
 
 def estandarizar_columnas(df):
     """
@@ -31,13 +72,73 @@ def estandarizar_columnas(df):
         df (pandas.DataFrame): DataFrame que contiene las columnas a estandarizar.
 
     """
-    # Código para quitar tildes
-    df.columns = df.columns.str.normalize('NFKD')\
-                            .str.encode('ascii', errors='ignore')\
-                            .str.decode('utf-8')
-    
-    # Convertir a minúsculas, reemplazar espacios y guiones por guiones bajos
-    df.columns = df.columns.str.lower().str.replace(' ', '_').str.replace('-', '_')
+    df.columns = [estandarizar_texto(columna) for columna in df.columns]
+
+def parsear_numeros(serie):
+    """
+    Convierte a float64 números en formato español ('1.234,56') en un solo paso, sin pasar
+    por columnas de texto intermedias.
+
+    Se trabaja sobre los valores distintos como una matriz de bytes: los puntos de miles se
+    desplazan al final de cada valor y se eliminan, las comas pasan a puntos y la matriz
+    se convierte directamente a float64. Los textos que no son números quedan como nulos.
+
+    Args:
+        serie (pandas.Series): Serie con los números como texto.
+
+    Returns:
+        tuple: Array float64 con los valores y número de valores no nulos que no se han
+        podido convertir (y han quedado como nulos).
+    """
+    if pd.api.types.is_numeric_dtype(serie):
+        return serie.to_numpy(dtype=np.float64), 0
+
+    codigos, unicos = pd.factorize(serie)
+    try:
+        if pd.api.types.infer_dtype(unicos, skipna=False) != 'string':
+            raise ValueError('La serie contiene valores que no son texto.')
+        bytes_ = np.asarray(unicos, dtype=str).astype('S')
+    except (ValueError, UnicodeEncodeError):
+        # Valores mezclados o con caracteres no ASCII: conversión equivalente con pandas
+        textos = pd.Series(unicos, dtype=object).str.replace('.', '', regex=False).str.replace(',', '.', regex=False)
+        valores = pd.to_numeric(textos, errors='coerce').to_numpy(dtype=np.float64)
+    else:
+        ancho = max(bytes_.dtype.itemsize, 1)
+        matriz = bytes_.view(np.uint8).reshape(len(bytes_), ancho).copy()
+
+        # Mover los puntos de miles al final de cada valor y borrarlos
+        puntos = matriz == ord('.')
+        orden = np.argsort(puntos, axis=1, kind='stable')
+        matriz = np.take_along_axis(matriz, orden, axis=1)
+        matriz[np.take_along_axis(puntos, orden, axis=1)] = 0
+        matriz[matriz == ord(',')] = ord('.')
+
+        limpios = matriz.reshape(-1).view(f'S{ancho}')
+        try:
+            valores = limpios.astype(np.float64)
+        except ValueError:
+            valores = pd.to_numeric(limpios.astype(str).astype(object), errors='coerce').astype(np.float64)
+
+    resultado = np.append(valores, np.nan)[codigos]
+    forzados = int(np.isnan(valores)[codigos[codigos >= 0]].sum())
+    return resultado, forzados
+
+def limpiar_numeros(df, column):
+    """
+    Estandariza y convierte a numérico una columna con números en formato español
+    (equivale a estandarizar_numeros seguido de convertir_a_numerico, en un solo paso).
+
+    Args:
+        df (pandas.DataFrame): DataFrame que contiene la columna.
+        column (str): Columna con los números como texto.
+
+    Returns:
+        int: Número de valores que no se han podido convertir y han quedado como nulos.
+    """
+    df[column], forzados = parsear_numeros(df[column])
+    if forzados:
+        warnings.warn(f"{forzados} valores de '{column}' no son numéricos y se han convertido en nulos", stacklevel=2)
+    return forzados
 
 def estandarizar_numeros(df, column):
     """
@@ -70,24 +171,11 @@ def convertir_cp_distrito(df, cp_column):
     Returns:
         pandas.DataFrame: DataFrame con la nueva columna de distritos.
     """
-    # Diccionario que convierte códigos postales en códigos de distritos
-    codigos_distritos = {
-        '28001': 4, '28002': 5, '28003': 7, '28004': 1, '28005': 1, '28006': 4,
-        '28007': 3, '28008': 9, '28009': 3, '28010': 7, '28011': 11, '28012': 1,
-        '28013': 1, '28014': 3, '28015': 7, '28016': 5, '28017': 15, '28018': 13,
-        '28019': 10, '28020': 6, '28021': 17, '28022': 20, '28023': 9, '28024': 11,
-        '28025': 10, '28026': 12, '28027': 15, '28028': 4, '28029': 6, '28030': 14,
-        '28031': 19, '28032': 19, '28033': 16, '28034': 8, '28035': 8, '28036': 5,
-        '28037': 20, '28038': 13, '28039': 6, '28040': 9, '28041': 12, '28042': 21,
-        '28043': 16, '28044': 11, '28045': 2, '28046': 5, '28047': 11, '28048': 8,
-        '28049': 8, '28050': 16, '28051': 18, '28052': 18, '28053': 13, '28054': 17,
-        '28055': 18, '28070': 1}
-    
     # Convertir la columna de códigos postales a enteros, luego a cadenas
     df[cp_column] = df[cp_column].fillna(0).astype(int).astype(str)
 
-    # Crear una nueva columna en el DataFrame con los códigos de distritos
-    df['cod_distrito'] = df[cp_column].map(codigos_distritos)
+    # Crear una nueva columna en el DataFrame con los códigos de distritos (tabla de geografia.py)
+    df['cod_distrito'] = distrito_codigo_postal(df[cp_column])
     
     return df
 
@@ -103,63 +191,167 @@ def convertir_distrito_a_codigo(df, columna_distrito):
         pandas.DataFrame: DataFrame con la nueva columna de códigos de distritos.
     
     """
-    #Diccionario con los nombres de distrito y sus correspondientes códigos
-    distrito_a_codigo = {'Centro': 1, 'Arganzuela': 2, 'Retiro': 3,
-                         'Salamanca': 4, 'Chamartín': 5, 'Tetuán': 6,
-                         'Chamberí': 7, 'Fuencarral-El Pardo': 8,
-                         'Moncloa-Aravaca': 9, 'Latina': 10, 'Carabanchel': 11,
-                         'Usera': 12, 'Puente de Vallecas': 13, 'Moratalaz': 14,
-                         'Ciudad Lineal': 15, 'Hortaleza': 16, 'Villaverde': 17,
-                         'Villa de Vallecas': 18, 'Vicálvaro': 19,
-                         'San Blas-Canillejas': 20, 'Barajas': 21,}
-    
-    # Mapeamos la columna usando el diccionario anterior
-    df['cod_distrito'] = df[columna_distrito].map(distrito_a_codigo)
+    # Buscar el código de cada nombre (admite variantes como 'Fuencarral - El Pardo')
+    df['cod_distrito'] = codigo_distrito(df[columna_distrito])
     return df
 
 
 
 ###### FUNCIONES DE PREPARACIÓN DE DATOS ######
 
-def crear_df_presupuestos(carpeta):
+# Columnas de los archivos de presupuestos que se usan y sus tipos
+COLUMNAS_PRESUPUESTOS = {'Año': 'Int64', 'Nombre Línea': 'string', 'Gasto Real': 'float64'}
+
+def agregar_archivo_presupuestos(ruta_archivo):
+    """
+    Lee un archivo de presupuestos de un distrito y devuelve su inversión
+    agregada por año y área de inversión.
+
+    Solo se leen las columnas de COLUMNAS_PRESUPUESTOS con sus tipos, de forma
+    que las columnas de texto largas del archivo no se llegan a cargar.
+
+    Args:
+        ruta_archivo (str): Ruta del archivo 'inversiones-madrid-2XX.csv'.
+
+    Returns:
+        pandas.DataFrame: DataFrame con 'cod_distrito', 'año', 'area_inversion' y
+        'total_invertido', o None si el archivo no tiene la columna 'Año'.
+    """
+    df = pd.read_csv(ruta_archivo,
+                     usecols=lambda columna: columna in COLUMNAS_PRESUPUESTOS,
+                     dtype=COLUMNAS_PRESUPUESTOS)
+
+    if 'Año' not in df.columns:
+        return None
+
+    # Obtener el código del distrito a partir del nombre del archivo
+    cod_distrito = os.path.basename(ruta_archivo).split('-')[-1].split('.')[0][-2:]
+
+    # Renombrar las columnas para asegurar consistencia
+    df = df.rename(columns={
+        'Año': 'año',
+        'Nombre Línea': 'area_inversion',
+        'Gasto Real': 'total_invertido'})
+
+    # Filtrar solo los años entre 2012 y 2022
+    df = df[(df['año'] >= 2012) & (df['año'] <= 2022)]
+
+    # Agregar el archivo antes de combinarlo con el resto
+    df = df.groupby(['año', 'area_inversion'], observed=True)['total_invertido'].sum().reset_index()
+    df.insert(0, 'cod_distrito', cod_distrito)
+
+    return df
+
+def crear_df_presupuestos(carpeta, max_procesos=None):
+    """
+    Crea el DataFrame de inversión por distrito, año y área a partir de los
+    archivos de presupuestos de una carpeta.
+
+    Cada archivo se lee y se agrega en paralelo en un pool de procesos, y las
+    sumas parciales se combinan una única vez al final.
+
+    Args:
+        carpeta (str): Ruta de la carpeta con los archivos CSV de presupuestos.
+        max_procesos (int): Número máximo de procesos (opcional). Con 1 se leen
+            los archivos en serie.
+
+    Returns:
+        pandas.DataFrame: DataFrame con 'cod_distrito', 'año', 'area_inversion' y 'total_invertido'.
+    """
     # Lista de los archivos CSV en la carpeta
-    archivos_csv = [f for f in os.listdir(carpeta) if f.endswith('.csv')] 
-
-    # Dataframe vacío para alamacenar los resultados
-    df_presupuestos = pd.DataFrame()
-    
-    for archivo in archivos_csv:
-        # Leer cada archivo csv en la carpeta
-        df = pd.read_csv(os.path.join(carpeta, archivo))
-        
-        # Obtener el código del distrito a partir del nombre del archivo
-        cod_distrito = archivo.split('-')[-1].split('.')[0][-2:]
-        
-        # Extraer el año de cada fila
-        if 'Año' in df.columns:
-            df['año'] = df['Año']
-        else:
-            continue 
-
-        # Filtrar solo los años entre 2012 y 2022
-        df = df[(df['año'] >= 2012) & (df['año'] <= 2022)]
-        
-        # Añadir la columna del código de distrito
-        df['cod_distrito'] = cod_distrito
-        
-        # Renombrar las columnas para asegurar consistencia
-        df = df.rename(columns={
-            'Nombre Línea': 'area_inversion',
-            'Presupuesto Gasto': 'presupuesto',
-            'Gasto Real': 'total_invertido'})
-        
-        # Combinar los datos en un solo DataFrame
-        df_presupuestos = pd.concat([df_presupuestos, df], ignore_index=True)
-    
-        # Agrupar por distrito, año y área de inversión, y sumar los totales
-        df_presupuestos = df_presupuestos.groupby(['cod_distrito', 'año', 'area_inversion']).agg({'total_invertido': 'sum'}).reset_index()
-        
-    return df_presupuestos 
+    rutas_csv = [os.path.join(carpeta, f) for f in sorted(os.listdir(carpeta)) if f.endswith('.csv')]
+
+    # Leer y agregar cada archivo por separado
+    parciales = leer_parciales_presupuestos(rutas_csv, max_procesos)
+
+    return combinar_parciales_presupuestos(parciales)
+
+def leer_parciales_presupuestos(rutas_csv, max_procesos=None):
+    """
+    Lee y agrega una lista de archivos de presupuestos en un pool de procesos.
+
+    Args:
+        rutas_csv (list): Rutas de los archivos de presupuestos.
+        max_procesos (int): Número máximo de procesos (opcional). Con 1 se leen en serie.
+
+    Returns:
+        list: Lista con el DataFrame agregado de cada archivo (None si el archivo no tiene 'Año').
+    """
+    if max_procesos == 1 or len(rutas_csv) <= 1:
+        return [agregar_archivo_presupuestos(ruta) for ruta in rutas_csv]
+
+    with ProcessPoolExecutor(max_workers=max_procesos) as executor:
+        return list(executor.map(agregar_archivo_presupuestos, rutas_csv))
+
+def combinar_parciales_presupuestos(parciales):
+    """
+    Combina las sumas parciales de los archivos de presupuestos y agrupa una sola vez.
+
+    Args:
+        parciales (list): Lista de DataFrames devueltos por agregar_archivo_presupuestos.
+
+    Returns:
+        pandas.DataFrame: DataFrame con 'cod_distrito', 'año', 'area_inversion' y 'total_invertido'.
+    """
+    parciales = [df for df in parciales if df is not None]
+    if not parciales:
+        return pd.DataFrame(columns=['cod_distrito', 'año', 'area_inversion', 'total_invertido'])
+
+    # Combinar las sumas parciales y agrupar una sola vez sobre los códigos enteros de las claves
+    df_presupuestos = pd.concat(parciales, ignore_index=True)
+    claves = ['cod_distrito', 'año', 'area_inversion']
+    panel = crear_panel(df_presupuestos, claves, ['total_invertido'], tolerancia=0)
+    df_presupuestos = panel.agregar(claves)
+    df_presupuestos['area_inversion'] = df_presupuestos['area_inversion'].astype(object)
+    df_presupuestos['año'] = df_presupuestos['año'].astype('int64')
+
+    return df_presupuestos
+
+def crear_matriz_indicadores(df, claves=('cod_distrito', 'distrito')):
+    """
+    Pivota una sola vez el DataFrame largo de indicadores a una matriz ancha
+    (distrito x indicador) que reutilizan todas las funciones crear_df_*.
+
+    Para cada distrito e indicador se conserva el primer valor no nulo, igual
+    que hacía pivot_table con aggfunc='first'.
+
+    Args:
+        df (pandas.DataFrame): DataFrame con las claves, 'indicador_completo' y 'valor_indicador'.
+        claves (tuple): Columnas que identifican cada unidad. Por defecto el distrito; con
+            ('id_barrio', 'barrio') la matriz tiene una fila por barrio.
+
+    Returns:
+        pandas.DataFrame: Matriz con las claves como índice y una columna por indicador.
+    """
+    claves = list(claves)
+
+    # Quitar los valores nulos y quedarnos con el primer valor de cada unidad e indicador
+    df_valores = df[claves + ['indicador_completo', 'valor_indicador']].dropna()
+    df_valores = df_valores.drop_duplicates(claves + ['indicador_completo'], keep='first')
+
+    # Pivotar todos los indicadores de una vez
+    matriz = df_valores.set_index(claves + ['indicador_completo'])['valor_indicador'].unstack()
+
+    return matriz.sort_index().sort_index(axis=1)
+
+def seleccionar_indicadores(df, indicadores):
+    """
+    Selecciona un grupo de indicadores de la matriz de indicadores.
+
+    Args:
+        df (pandas.DataFrame): Matriz creada con crear_matriz_indicadores o el
+            DataFrame largo de indicadores (en ese caso se pivota antes).
+        indicadores (list): Lista de indicadores a seleccionar.
+
+    Returns:
+        pandas.DataFrame: DataFrame con 'cod_distrito', 'distrito' y una columna por indicador.
+    """
+    matriz = crear_matriz_indicadores(df) if 'valor_indicador' in df.columns else df
+
+    # Seleccionar las columnas del grupo y quitar los distritos sin ningún valor
+    df_indicadores = matriz.loc[:, matriz.columns.isin(indicadores)].dropna(how='all')
+
+    return df_indicadores.reset_index()
 
 def crear_df_educacion(df):
     # Definir los indicadores educativos
@@ -173,12 +365,8 @@ def crear_df_educacion(df):
         'Población mayor/igual  de 25 años con Bachiller Elemental, Graduado Escolar, ESO, Formación profesional 1º grado',  
         'Población mayor/igual  de 25 años  con estudios superiores, licenciatura, arquitectura, ingeniería sup., estudios sup. no universitarios, doctorado,  postgraduado']
 
-    # Filtrar el dataframe por los indicadores de educación
-    df_educacion = df[df['indicador_completo'].isin(educacion_indicadores)].pivot_table(
-        index=['cod_distrito', 'distrito'], 
-        columns='indicador_completo', 
-        values='valor_indicador', 
-        aggfunc='first').reset_index()
+    # Seleccionar los indicadores de la matriz de indicadores
+    df_educacion = seleccionar_indicadores(df, educacion_indicadores)
 
     return df_educacion
 
@@ -196,12 +384,8 @@ def crear_df_cultura(df):
     'Grado de satisfacción con los centros culturales', 
     'Grado de satisfacción con las instalaciones deportivas']
 
-    # Crear dataframe de Cultura, Deporte y Ocio por distritos
-    df_cultura = df[df['indicador_completo'].isin(cultura_indicadores)].pivot_table(
-        index=['cod_distrito', 'distrito'], 
-        columns='indicador_completo', 
-        values='valor_indicador', 
-        aggfunc='first').reset_index()
+    # Seleccionar los indicadores de la matriz de indicadores
+    df_cultura = seleccionar_indicadores(df, cultura_indicadores)
     
     return df_cultura
 
@@ -218,13 +402,8 @@ def crear_df_economia(df):
         'Personas paradas de larga duración (febrero)'
     ]
     
-    # Filtrar el DataFrame original con los indicadores de economía y empleo
-    df_economia = df[df['indicador_completo'].isin(economia_indicadores)].pivot_table(
-        index=['cod_distrito', 'distrito'], 
-        columns='indicador_completo', 
-        values='valor_indicador', 
-        aggfunc='first'
-    ).reset_index()
+    # Seleccionar los indicadores de la matriz de indicadores
+    df_economia = seleccionar_indicadores(df, economia_indicadores)
     
     return df_economia
 
@@ -242,12 +421,8 @@ def crear_df_bienestar(df):
     'Intervenciones de la Policía Municipal en materia de seguridad: relacionadas con el patrimonio',
     'Intervenciones de la Policía Municipal en materia de seguridad: relacionadas con la tenencia y consumo de drogas']
 
-    # Crear dataframe de Bienestar Social por distritos
-    df_bienestar = df[df['indicador_completo'].isin(bienestar_indicadores)].pivot_table(
-        index=['cod_distrito', 'distrito'], 
-        columns='indicador_completo', 
-        values='valor_indicador', 
-        aggfunc='first').reset_index()
+    # Seleccionar los indicadores de la matriz de indicadores
+    df_bienestar = seleccionar_indicadores(df, bienestar_indicadores)
     
     return df_bienestar
 
@@ -262,12 +437,8 @@ def crear_df_social(df):
     'Centros de Servicios Sociales', 
     'Centros Municipales de Mayores']
 
-    # Crear dataframe de Servicios Sociales por distritos
-    df_social = df[df['indicador_completo'].isin(servicios_sociales_indicadores)].pivot_table(
-        index=['cod_distrito', 'distrito'], 
-        columns='indicador_completo', 
-        values='valor_indicador', 
-        aggfunc='first').reset_index()
+    # Seleccionar los indicadores de la matriz de indicadores
+    df_social = seleccionar_indicadores(df, servicios_sociales_indicadores)
     
     return df_social
 
@@ -285,12 +456,8 @@ def crear_df_salud(df):
         'Presencia de enfermedad crónica', 
         'Probabilidad de padecer enfermedad mental (GHQ-12)          (2018. EMS)']
 
-    # Crear dataframe de Salud por distritos
-    df_salud = df[df['indicador_completo'].isin(salud_indicadores)].pivot_table(
-        index=['cod_distrito', 'distrito'], 
-        columns='indicador_completo', 
-        values='valor_indicador', 
-        aggfunc='first').reset_index()
+    # Seleccionar los indicadores de la matriz de indicadores
+    df_salud = seleccionar_indicadores(df, salud_indicadores)
     
     return df_salud
 
@@ -304,12 +471,8 @@ def crear_df_poblacion(df):
         'Índice de dependencia (Población de 0-15 + población 65 años y más / Pob. 16-64)',
         'Proporción de personas migrantes (Población extranjera menos UE y resto países de OCDE / Población total)']
 
-    # Filtramos el dataframe original solo con los indicadores relevantes y agrupamos por distrito
-    df_poblacion = df[df['indicador_completo'].isin(poblacion_indicadores)].pivot_table(
-        index=['cod_distrito', 'distrito'], 
-        columns='indicador_completo', 
-        values='valor_indicador', 
-        aggfunc='first').reset_index()
+    # Seleccionar los indicadores de la matriz de indicadores
+    df_poblacion = seleccionar_indicadores(df, poblacion_indicadores)
     
     return df_poblacion
 
@@ -342,198 +505,425 @@ def eda_bi_distritos(df, num_var, distrito_var):
                 order=df_sorted[distrito_var], hue=distrito_var, palette=palette, dodge=False)
     plt.xticks(rotation=90)
     plt.title(f"Barplot de {num_var} por {distrito_var} (ordenado de mayor a menor)")
-    plt.show()
+    mostrar_grafico()
 
 
 
 ###### FUNCIONES DE CÁLCULO DE PESOS INDICADORES (AHP) ######
 
-def calcular_pesos_ahp(variables, matriz_comparacion):
+# Matrices de comparación por pares de cada ámbito (variables de más a menos importante)
+MATRICES_AHP = {
+    'economia': {
+        'variables': ['renta_media', 'tasa_paro', 'tasa_paro_larga_duracion',
+                      'tasa_paro_joven', 'pension_media', 'tasa_comercios'],
+        'matriz': np.array([
+            [1, 3, 5, 5, 6, 6],             # renta_media
+            [1/3, 1, 3, 3, 5, 6],           # tasa_paro
+            [1/5, 1/3, 1, 3, 5, 6],         # tasa_paro_larga_duracion
+            [1/5, 1/3, 1/3, 1, 3, 5],       # tasa_paro_joven
+            [1/6, 1/5, 1/5, 1/3, 1, 2],     # pension_media
+            [1/6, 1/6, 1/6, 1/5, 1/2, 1]])},  # tasa_comercios
+    'educacion': {
+        'variables': ['tasa_sin_estudios', 'tasa_poblacion_educacion_superior', 'tasa_absentismo',
+                      'tasa_centros_publicos_obligatoria', 'tasa_centros_enseñanza', 'tasa_bibliotecas',
+                      'tasa_centros_culturales', 'satisfaccion_instalaciones_deportivas',
+                      'satisfaccion_espacios_verdes'],
+        'matriz': np.array([
+            [1, 5, 5, 7, 9, 9, 9, 9, 9],                    # tasa_sin_estudios
+            [1/5, 1, 5, 7, 7, 9, 9, 9, 9],                  # tasa_poblacion_educacion_superior
+            [1/5, 1/5, 1, 5, 7, 7, 7, 9, 9],                # tasa_absentismo
+            [1/7, 1/7, 1/5, 1, 5, 7, 7, 7, 7],              # tasa_centros_publicos_obligatoria
+            [1/9, 1/7, 1/7, 1/5, 1, 5, 5, 7, 7],            # tasa_centros_enseñanza
+            [1/9, 1/9, 1/7, 1/7, 1/5, 1, 5, 7, 7],          # tasa_bibliotecas
+            [1/9, 1/9, 1/7, 1/7, 1/5, 1/5, 1, 5, 5],        # tasa_centros_culturales
+            [1/9, 1/9, 1/9, 1/7, 1/7, 1/7, 1/5, 1, 5],      # satisfaccion_instalaciones_deportivas
+            [1/9, 1/9, 1/9, 1/7, 1/7, 1/7, 1/5, 1/5, 1]])},  # satisfaccion_espacios_verdes
+    'social': {
+        'variables': ['tasa_riesgo_pobreza_infantil', 'tasa_intervenciones_policia', 'tasa_demandas_cai',
+                      'tasa_personas_atendidas_ss', 'tasa_ayuda_domicilio', 'calidad_vida',
+                      'percepcion_seguridad', 'tasa_residencias', 'satisfaccion_vivir_distrito',
+                      'tasa_centros_ss', 'amigable_lgbt'],
+        'matriz': np.array([
+            [1, 3, 5, 6, 7, 8, 8, 8, 9, 7, 9],                      # tasa_riesgo_pobreza_infantil
+            [1/3, 1, 3, 4, 5, 6, 7, 7, 8, 6, 8],                    # tasa_intervenciones_policia
+            [1/5, 1/3, 1, 3, 4, 5, 6, 7, 8, 6, 7],                  # tasa_demandas_cai
+            [1/6, 1/4, 1/3, 1, 3, 4, 5, 6, 7, 5, 6],                # tasa_personas_atendidas_ss
+            [1/7, 1/5, 1/4, 1/3, 1, 3, 4, 5, 6, 4, 5],              # tasa_ayuda_domicilio
+            [1/8, 1/6, 1/5, 1/4, 1/3, 1, 3, 4, 5, 4, 5],            # calidad_vida
+            [1/8, 1/7, 1/6, 1/5, 1/4, 1/3, 1, 3, 4, 3, 4],          # percepcion_seguridad
+            [1/8, 1/7, 1/7, 1/6, 1/5, 1/4, 1/3, 1, 3, 3, 4],        # tasa_residencias
+            [1/9, 1/8, 1/8, 1/7, 1/6, 1/5, 1/4, 1/3, 1, 2, 3],      # satisfaccion_vivir_distrito
+            [1/7, 1/6, 1/6, 1/5, 1/4, 1/4, 1/3, 1/3, 1/2, 1, 2],    # tasa_centros_ss
+            [1/9, 1/8, 1/7, 1/6, 1/5, 1/5, 1/4, 1/4, 1/3, 1/2, 1]])},  # amigable_lgbt
+    'salud': {
+        'variables': ['esperanza_vida', 'autopercepcion_salud_buena', 'tasa_centros_sanitarios',
+                      'presencia_enfermedad_cronica', 'probabilidad_enfermedad_mental',
+                      'consumo_de_medicamentos', 'sedentarismo', 'tasa_discapacitados'],
+        'matriz': np.array([
+            [1, 5, 7, 7, 9, 9, 9, 7],               # esperanza_vida
+            [1/5, 1, 5, 7, 7, 7, 7, 5],             # autopercepcion_salud_buena
+            [1/7, 1/5, 1, 5, 7, 7, 7, 5],           # tasa_centros_sanitarios
+            [1/7, 1/7, 1/5, 1, 5, 7, 7, 5],         # presencia_enfermedad_cronica
+            [1/9, 1/7, 1/7, 1/5, 1, 5, 7, 5],       # probabilidad_enfermedad_mental
+            [1/9, 1/7, 1/7, 1/7, 1/5, 1, 5, 3],     # consumo_de_medicamentos
+            [1/9, 1/7, 1/7, 1/7, 1/7, 1/5, 1, 3],   # sedentarismo
+            [1/7, 1/5, 1/5, 1/5, 1/5, 1/3, 1/3, 1]])},  # tasa_discapacitados
+}
+
+# Índice de consistencia aleatorio de Saaty según el número de variables
+INDICE_ALEATORIO_AHP = [0, 0, 0, 0.58, 0.90, 1.12, 1.24, 1.32, 1.41, 1.45, 1.49,
+                        1.51, 1.48, 1.56, 1.57, 1.59]
+
+# Ratio de consistencia máximo para aceptar una matriz de comparación
+RC_MAXIMO_AHP = 0.1
+
+@lru_cache(maxsize=1024)
+def calcular_ahp_cache(forma, contenido):
+    """
+    Calcula el AHP de una pila de matrices a partir de su forma y sus bytes, para
+    que las matrices con el mismo contenido se calculen una sola vez.
+    """
+    resultado = resolver_ahp(np.frombuffer(contenido, dtype=float).reshape(forma))
+    for valores in resultado.values():
+        valores.setflags(write=False)
+
+    return resultado
+
+def resolver_ahp(matrices):
+    """
+    Resuelve el AHP de una pila de matrices (k, n, n) sin pasar por la caché.
+    Se usa directamente cuando las matrices no se van a repetir (por ejemplo,
+    matrices perturbadas aleatoriamente).
+    """
+    n = matrices.shape[-1]
+
+    # Autovalor principal y su autovector para todas las matrices a la vez
+    autovalores, autovectores = np.linalg.eig(matrices)
+    principal = autovalores.real.argmax(axis=-1)
+    lambda_max = np.take_along_axis(autovalores.real, principal[:, None], axis=-1)[:, 0]
+    autovector = np.abs(np.take_along_axis(autovectores.real, principal[:, None, None], axis=-1)[..., 0])
+    pesos = autovector / autovector.sum(axis=-1, keepdims=True)
+
+    # Índice y ratio de consistencia
+    ic = (lambda_max - n) / (n - 1) if n > 1 else np.zeros(len(matrices))
+    indice_aleatorio = INDICE_ALEATORIO_AHP[n] if n < len(INDICE_ALEATORIO_AHP) else INDICE_ALEATORIO_AHP[-1]
+    rc = ic / indice_aleatorio if indice_aleatorio > 0 else np.zeros(len(matrices))
+
+    return {'pesos': pesos, 'lambda_max': lambda_max, 'ic': ic, 'rc': rc}
+
+def calcular_ahp(matrices):
+    """
+    Calcula los pesos AHP por el método del autovector principal, junto con
+    lambda máximo, el índice de consistencia (IC) y el ratio de consistencia (RC),
+    para una pila de matrices de comparación por pares en una sola llamada.
+
+    Args:
+        matrices (ndarray): Array (k, n, n) con k matrices de comparación, o una sola matriz (n, n).
+
+    Returns:
+        dict: Diccionario con 'pesos' (k, n), 'lambda_max' (k,), 'ic' (k,) y 'rc' (k,).
+        Un RC mayor que 0.1 indica que la matriz no es suficientemente consistente.
+    """
+    matrices = np.ascontiguousarray(matrices, dtype=float)
+    if matrices.ndim == 2:
+        matrices = matrices[None]
+
+    return calcular_ahp_cache(matrices.shape, matrices.tobytes())
+
+def calcular_pesos_ahp(variables, matriz_comparacion, metodo='autovector'):
     """
     Esta función calcula los pesos AHP para las variables basadas en una matriz de comparación por pares.
     
     Args:
     - variables (list): Lista de nombres de las variables.
     - matriz_comparacion (ndarray): Matriz de comparación por pares de las variables.
+    - metodo (str): 'autovector' (autovector principal) o 'media' (media de las filas
+      de la matriz normalizada por columnas, la aproximación usada anteriormente).
     
     Returns:
     - DataFrame: Un DataFrame con las variables y sus respectivos pesos AHP.
     """
-    # Normalizar la matriz: sumamos cada columna y dividimos cada elemento por la suma de su columna
-    suma_columnas = matriz_comparacion.sum(axis=0)
-    matriz_normalizada = matriz_comparacion / suma_columnas
+    if metodo == 'media':
+        # Normalizar la matriz: sumamos cada columna y dividimos cada elemento por la suma de su columna
+        suma_columnas = matriz_comparacion.sum(axis=0)
+        matriz_normalizada = matriz_comparacion / suma_columnas
 
-    # Calcular el promedio de cada fila (esto nos da los pesos para cada criterio)
-    pesos = matriz_normalizada.mean(axis=1)
+        # Calcular el promedio de cada fila (esto nos da los pesos para cada criterio)
+        pesos = matriz_normalizada.mean(axis=1)
+    else:
+        pesos = calcular_ahp(matriz_comparacion)['pesos'][0]
 
     # Asignar los nombres de las variables a los pesos calculados
     pesos_ahp = pd.DataFrame({'Variable': variables, 'Peso AHP': pesos})
 
     return pesos_ahp
 
+def calcular_ahp_ambitos(matrices_ahp=MATRICES_AHP):
+    """
+    Calcula el AHP de todos los ámbitos, agrupando las matrices del mismo tamaño
+    para resolverlas en una sola llamada.
+
+    Args:
+        matrices_ahp (dict): Diccionario {ámbito: {'variables': [...], 'matriz': ndarray}}.
+
+    Returns:
+        dict: Diccionario {ámbito: {'pesos': {variable: peso}, 'lambda_max', 'ic', 'rc'}}.
+    """
+    # Agrupar los ámbitos por número de variables
+    grupos = {}
+    for ambito, ahp in matrices_ahp.items():
+        grupos.setdefault(len(ahp['variables']), []).append(ambito)
+
+    resultados = {}
+    for ambitos in grupos.values():
+        resultado = calcular_ahp(np.stack([matrices_ahp[ambito]['matriz'] for ambito in ambitos]))
+        for i, ambito in enumerate(ambitos):
+            resultados[ambito] = {
+                'pesos': dict(zip(matrices_ahp[ambito]['variables'], resultado['pesos'][i])),
+                'lambda_max': resultado['lambda_max'][i],
+                'ic': resultado['ic'][i],
+                'rc': resultado['rc'][i]}
+
+    return {ambito: resultados[ambito] for ambito in matrices_ahp}
+
+def resumir_consistencia_ahp(matrices_ahp=MATRICES_AHP):
+    """
+    Resume la consistencia de las matrices de comparación de cada ámbito.
+
+    Args:
+        matrices_ahp (dict): Diccionario {ámbito: {'variables': [...], 'matriz': ndarray}}.
+
+    Returns:
+        pandas.DataFrame: DataFrame con el ámbito, lambda máximo, IC, RC y si la matriz es consistente (RC <= 0.1).
+    """
+    resultados = calcular_ahp_ambitos(matrices_ahp)
+
+    df_consistencia = pd.DataFrame({
+        'ambito': list(resultados),
+        'lambda_max': [r['lambda_max'] for r in resultados.values()],
+        'ic': [r['ic'] for r in resultados.values()],
+        'rc': [r['rc'] for r in resultados.values()]})
+    df_consistencia['consistente'] = df_consistencia['rc'] <= RC_MAXIMO_AHP
+
+    return df_consistencia
+
 
 
 ###### FUNCIONES DE CÁLCULO DE ÍNDICES ######
 
-def calcular_nota_economia(df):
-    # Crear una copia del dataframe para no modificar el original
-    df_economia = df.copy()
+# Indicadores negativos de cada ámbito, que se invierten tras normalizarlos
+INDICADORES_NEGATIVOS = {
+    'economia': ['tasa_paro', 'tasa_paro_larga_duracion', 'tasa_paro_joven'],
+    'educacion': ['tasa_sin_estudios', 'tasa_absentismo'],
+    'social': ['tasa_riesgo_pobreza_infantil', 'tasa_intervenciones_policia',
+               'tasa_demandas_cai', 'tasa_personas_atendidas_ss'],
+    'salud': ['presencia_enfermedad_cronica', 'probabilidad_enfermedad_mental',
+              'consumo_de_medicamentos', 'sedentarismo', 'tasa_discapacitados'],
+}
+
+def crear_especificacion_notas(matrices_ahp=MATRICES_AHP, negativos=INDICADORES_NEGATIVOS,
+                               permitir_inconsistentes=False):
+    """
+    Crea la especificación de las notas con los pesos calculados directamente
+    a partir de las matrices de comparación AHP de cada ámbito.
 
-    # Seleccionar las columnas a normalizar
-    indicadores = ['renta_media', 'tasa_paro', 'tasa_paro_larga_duracion', 'tasa_paro_joven', 'pension_media', 'tasa_comercios']
+    Las matrices con un RC mayor que RC_MAXIMO_AHP no se aceptan salvo que se indique
+    permitir_inconsistentes, y en ese caso se avisa del ámbito y su RC.
 
-    # Normalizar las columnas (escala de 0 a 1)
-    scaler = MinMaxScaler()
-    df_economia[indicadores] = scaler.fit_transform(df_economia[indicadores])
+    Args:
+        matrices_ahp (dict): Diccionario {ámbito: {'variables': [...], 'matriz': ndarray}}.
+        negativos (dict): Diccionario {ámbito: [indicadores negativos]}.
+        permitir_inconsistentes (bool): Si se usan los pesos de matrices inconsistentes.
 
-    # Invertir el peso de las variables negativas
-    df_economia['tasa_paro'] = 1 - df_economia['tasa_paro']
-    df_economia['tasa_paro_larga_duracion'] = 1 - df_economia['tasa_paro_larga_duracion']
-    df_economia['tasa_paro_joven'] = 1 - df_economia['tasa_paro_joven']
+    Returns:
+        dict: Diccionario {ámbito: {'pesos': {indicador: peso}, 'negativos': [...]}}.
+    """
+    resultados = calcular_ahp_ambitos(matrices_ahp)
+
+    inconsistentes = {ambito: r['rc'] for ambito, r in resultados.items() if r['rc'] > RC_MAXIMO_AHP}
+    if inconsistentes and not permitir_inconsistentes:
+        detalle = ', '.join(f'{ambito} (RC = {rc:.3f})' for ambito, rc in inconsistentes.items())
+        raise ValueError(f'Matrices AHP inconsistentes (RC > {RC_MAXIMO_AHP}): {detalle}. '
+                         'Revisa los juicios o usa permitir_inconsistentes=True.')
+    for ambito, rc in inconsistentes.items():
+        warnings.warn(f"La matriz AHP de '{ambito}' es inconsistente (RC = {rc:.3f} > {RC_MAXIMO_AHP}) "
+                      'y se usan sus pesos igualmente', stacklevel=2)
+
+    return {ambito: {'pesos': resultados[ambito]['pesos'], 'negativos': list(negativos.get(ambito, []))}
+            for ambito in matrices_ahp}
+
+# Especificación de las notas de cada ámbito: peso AHP de cada indicador (en orden
+# de importancia) e indicadores negativos. Las matrices de educación, social y salud
+# superan el RC máximo; se mantienen porque son las de los índices publicados
+ESPECIFICACION_NOTAS = crear_especificacion_notas(permitir_inconsistentes=True)
+
+def preparar_especificacion(especificacion):
+    """
+    Traduce la especificación de las notas a arrays listos para puntuar.
 
-    # Asignar pesos basados en el AHP
-    df_economia['nota_economia'] = (df_economia['renta_media'] * 0.427594 +
-                                      df_economia['tasa_paro'] * 0.230195 +
-                                      df_economia['tasa_paro_larga_duracion'] * 0.162574 +
-                                      df_economia['tasa_paro_joven'] * 0.102090 +
-                                      df_economia['pension_media'] * 0.046948 +
-                                      df_economia['tasa_comercios'] * 0.030598)
+    Args:
+        especificacion (dict): Diccionario {ámbito: {'pesos': {...}, 'negativos': [...]}}.
 
-    # Escalar la nota a 100
-    df_economia['nota_economia'] = (df_economia['nota_economia'] * 100).round(2)
+    Returns:
+        tuple: Lista de indicadores (columnas), lista de ámbitos, array booleano con
+        los indicadores negativos y matriz de pesos (indicadores x ámbitos).
+    """
+    ambitos = list(especificacion)
+    indicadores = [ind for ambito in ambitos for ind in especificacion[ambito]['pesos']]
+
+    # Cada ámbito tiene su propio bloque de indicadores, aunque se repita algún nombre
+    negativos = np.zeros(len(indicadores), dtype=bool)
+    pesos = np.zeros((len(indicadores), len(ambitos)))
+    fila = 0
+    for j, ambito in enumerate(ambitos):
+        for ind, peso in especificacion[ambito]['pesos'].items():
+            negativos[fila] = ind in especificacion[ambito].get('negativos', [])
+            pesos[fila, j] = peso
+            fila += 1
+
+    return indicadores, ambitos, negativos, pesos
+
+def normalizar_min_max(valores):
+    """
+    Normaliza los valores entre 0 y 1 a lo largo del eje de distritos (el penúltimo),
+    con el mismo cálculo que MinMaxScaler e ignorando los valores nulos.
 
-    # Seleccionar las columnas de interés
-    df_nota_economia = df_economia[['cod_distrito', 'distrito', 'nota_economia']]
+    Args:
+        valores (ndarray): Array (..., distritos, indicadores).
 
-    return df_nota_economia
+    Returns:
+        ndarray: Array normalizado con la misma forma.
+    """
+    minimo = np.nanmin(valores, axis=-2, keepdims=True)
+    rango = np.nanmax(valores, axis=-2, keepdims=True) - minimo
 
-def calcular_nota_educacion(df):
-    # Crear una copia del dataframe para no modificar el original
-    df_educacion = df.copy()
-
-    # Seleccionar las columnas a normalizar
-    indicadores = [
-        'tasa_sin_estudios', 
-        'tasa_poblacion_educacion_superior', 
-        'tasa_absentismo', 
-        'tasa_centros_publicos_obligatoria', 
-        'tasa_centros_enseñanza', 
-        'tasa_bibliotecas', 
-        'tasa_centros_culturales', 
-        'satisfaccion_instalaciones_deportivas', 
-        'satisfaccion_espacios_verdes']
-
-    # Normalizar las columnas (escala de 0 a 1)
-    scaler = MinMaxScaler()
-    df_educacion[indicadores] = scaler.fit_transform(df_educacion[indicadores])
-
-    # Invertir el peso de las variables negativas (si es relevante)
-    df_educacion['tasa_sin_estudios'] = 1 - df_educacion['tasa_sin_estudios']
-    df_educacion['tasa_absentismo'] = 1 - df_educacion['tasa_absentismo']
-
-    # Asignar pesos basados en AHP
-    df_educacion['nota_educacion'] = (
-        df_educacion['tasa_sin_estudios'] * 0.312186 +
-        df_educacion['tasa_poblacion_educacion_superior'] * 0.233266 +
-        df_educacion['tasa_absentismo'] * 0.167700 +
-        df_educacion['tasa_centros_publicos_obligatoria'] * 0.103495 +
-        df_educacion['tasa_centros_enseñanza'] * 0.061458 +
-        df_educacion['tasa_bibliotecas'] * 0.050164 +
-        df_educacion['tasa_centros_culturales'] * 0.035483 +
-        df_educacion['satisfaccion_instalaciones_deportivas'] * 0.021196 +
-        df_educacion['satisfaccion_espacios_verdes'] * 0.015053)
-
-    # Escalar la nota a 100
-    df_educacion['nota_educacion'] = (df_educacion['nota_educacion'] * 100).round(2)
-
-    # Seleccionar las columnas de interés
-    df_nota_educacion = df_educacion[['cod_distrito', 'distrito', 'nota_educacion']]
-
-    return df_nota_educacion
+    # Las columnas constantes se dejan a 0, como hace MinMaxScaler
+    rango[rango < 10 * np.finfo(rango.dtype).eps] = 1.0
+    escala = 1.0 / rango
 
-def calcular_nota_social(df):
-    # Crear una copia del dataframe para no modificar el original
-    df_social = df.copy()
-
-    # Seleccionar las columnas a normalizar
-    indicadores = ['tasa_riesgo_pobreza_infantil', 'tasa_intervenciones_policia', 'tasa_demandas_cai', 
-                   'tasa_personas_atendidas_ss', 'tasa_ayuda_domicilio', 'calidad_vida', 
-                   'percepcion_seguridad', 'tasa_residencias', 'satisfaccion_vivir_distrito',
-                   'tasa_centros_ss', 'amigable_lgbt']
-
-    # Normalizar las columnas (escala de 0 a 1)
-    scaler = MinMaxScaler()
-    df_social[indicadores] = scaler.fit_transform(df_social[indicadores])
-
-    # Invertir el peso de las variables negativas (las que indican más desigualdad con valores más altos)
-    df_social['tasa_riesgo_pobreza_infantil'] = 1 - df_social['tasa_riesgo_pobreza_infantil']
-    df_social['tasa_intervenciones_policia'] = 1 - df_social['tasa_intervenciones_policia']
-    df_social['tasa_demandas_cai'] = 1 - df_social['tasa_demandas_cai']
-    df_social['tasa_personas_atendidas_ss'] = 1 - df_social['tasa_personas_atendidas_ss']
-
-    # Asignar pesos según el AHP
-    df_social['nota_social'] = (df_social['tasa_riesgo_pobreza_infantil'] * 0.301704 +
-                                      df_social['tasa_intervenciones_policia'] * 0.191723 +
-                                      df_social['tasa_demandas_cai'] * 0.141420 +
-                                      df_social['tasa_personas_atendidas_ss'] * 0.103539 +
-                                      df_social['tasa_ayuda_domicilio'] * 0.075159 +
-                                      df_social['calidad_vida'] * 0.057293 +
-                                      df_social['percepcion_seguridad'] * 0.040861 +
-                                      df_social['tasa_residencias'] * 0.032163 +
-                                      df_social['satisfaccion_vivir_distrito'] * 0.021747 +
-                                      df_social['tasa_centros_ss'] * 0.020210 +
-                                      df_social['amigable_lgbt'] * 0.014180)
-
-    # Escalar la nota a 100
-    df_social['nota_social'] = (df_social['nota_social'] * 100).round(2)
-
-    # Seleccionar las columnas de interés
-    df_nota_social = df_social[['cod_distrito', 'distrito', 'nota_social']]
-
-    return df_nota_social
+    return valores * escala - minimo * escala
 
-def calcular_nota_salud(df):
-    # Crear una copia del dataframe para no modificar el original
-    df_salud = df.copy()
+def puntuar_matriz(valores, negativos, pesos):
+    """
+    Calcula las notas de todos los ámbitos de una vez: normaliza los indicadores,
+    invierte los negativos y multiplica por la matriz de pesos.
+
+    El array de valores puede tener ejes adicionales por delante (escenarios, años...),
+    que se puntúan de forma independiente en la misma llamada.
+
+    Args:
+        valores (ndarray): Array (..., distritos, indicadores).
+        negativos (ndarray): Array booleano (indicadores,) con los indicadores negativos.
+        pesos (ndarray): Matriz de pesos (indicadores, ámbitos).
+
+    Returns:
+        ndarray: Notas de 0 a 100 sin redondear, con forma (..., distritos, ámbitos).
+    """
+    normalizados = normalizar_min_max(np.asarray(valores, dtype=float))
+
+    # Invertir los indicadores negativos
+    normalizados = np.where(negativos, 1 - normalizados, normalizados)
+
+    return (normalizados @ pesos) * 100
+
+def calcular_notas(df, especificacion=ESPECIFICACION_NOTAS, columna_escenario=None,
+                   claves=('cod_distrito', 'distrito')):
+    """
+    Calcula la nota de cada ámbito de la especificación para cada distrito.
+
+    Args:
+        df (pandas.DataFrame): DataFrame con las claves y los indicadores de todos los ámbitos.
+        especificacion (dict): Especificación de las notas (por defecto ESPECIFICACION_NOTAS).
+        columna_escenario (str): Columna que separa escenarios o años (opcional). La
+            normalización se hace por separado dentro de cada escenario.
+        claves (tuple): Código y nombre de cada unidad: el distrito por defecto o
+            ('id_barrio', 'barrio') para puntuar los barrios.
+
+    Returns:
+        pandas.DataFrame: DataFrame con las columnas de identificación y una columna 'nota_<ámbito>' por ámbito.
+    """
+    indicadores, ambitos, negativos, pesos = preparar_especificacion(especificacion)
+    columnas_notas = [f'nota_{ambito}' for ambito in ambitos]
+    codigo, nombre = claves
+
+    if columna_escenario is None:
+        df_notas = df[[codigo, nombre]].copy()
+        notas = puntuar_matriz(df[indicadores].to_numpy(dtype=float), negativos, pesos)
+        df_notas[columnas_notas] = notas.round(2)
+        return df_notas
+
+    # Pasar el panel a un array (escenarios, distritos, indicadores)
+    escenarios = pd.Index(df[columna_escenario].unique())
+    distritos = pd.Index(df[codigo].unique())
+    filas = pd.MultiIndex.from_product([escenarios, distritos], names=[columna_escenario, codigo])
+    df_panel = df.set_index([columna_escenario, codigo])
+    valores = df_panel[indicadores].reindex(filas).to_numpy(dtype=float)
+    valores = valores.reshape(len(escenarios), len(distritos), len(indicadores))
+
+    notas = puntuar_matriz(valores, negativos, pesos).reshape(-1, len(ambitos))
+
+    # Volver al formato largo con una fila por escenario y distrito
+    df_notas = pd.DataFrame(notas.round(2), index=filas, columns=columnas_notas)
+    df_notas = df_notas.loc[df_panel.index]
+    df_notas.insert(0, nombre, df_panel[nombre].to_numpy())
+
+    return df_notas.reset_index()[[codigo, nombre, columna_escenario] + columnas_notas]
+
+def calcular_indices_desigualdad(df_notas, ambitos=('salud', 'social', 'economia', 'educacion')):
+    """
+    Calcula la nota general como media de las notas de los ámbitos y los índices de
+    desigualdad (100 - nota) de cada ámbito y el general.
 
-    # Seleccionar las columnas a normalizar
-    indicadores = ['esperanza_vida', 'autopercepcion_salud_buena', 'tasa_centros_sanitarios',
-                   'presencia_enfermedad_cronica', 'probabilidad_enfermedad_mental',
-                   'consumo_de_medicamentos', 'sedentarismo', 'tasa_discapacitados']
+    Args:
+        df_notas (pandas.DataFrame): DataFrame con 'cod_distrito', 'distrito' y las columnas 'nota_<ámbito>'.
+        ambitos (tuple): Ámbitos que forman la nota general.
 
-    # Normalizar las columnas (escala de 0 a 1)
-    scaler = MinMaxScaler()
-    df_salud[indicadores] = scaler.fit_transform(df_salud[indicadores])
+    Returns:
+        pandas.DataFrame: DataFrame con 'cod_distrito', 'distrito' y las columnas 'indice_desigualdad_*'.
+    """
+    df_indices = df_notas.copy()
 
-    # Invertir el peso de las tasas negativas (indicadores negativos para la salud)
-    df_salud['presencia_enfermedad_cronica'] = 1 - df_salud['presencia_enfermedad_cronica']
-    df_salud['probabilidad_enfermedad_mental'] = 1 - df_salud['probabilidad_enfermedad_mental']
-    df_salud['consumo_de_medicamentos'] = 1 - df_salud['consumo_de_medicamentos']
-    df_salud['sedentarismo'] = 1 - df_salud['sedentarismo']
-    df_salud['tasa_discapacitados'] = 1 - df_salud['tasa_discapacitados']
+    # Calcular la nota media del distrito
+    notas = df_indices[[f'nota_{ambito}' for ambito in ambitos]].to_numpy()
+    df_indices['nota_general'] = (notas.sum(axis=1) / len(ambitos)).round(2)
 
-    # Asignar pesos basados en el AHP
-    df_salud['nota_salud'] = (df_salud['esperanza_vida'] * 0.379511 +
-                              df_salud['autopercepcion_salud_buena'] * 0.210312 +
-                              df_salud['tasa_centros_sanitarios'] * 0.144085 +
-                              df_salud['presencia_enfermedad_cronica'] * 0.103195 +
-                              df_salud['probabilidad_enfermedad_mental'] * 0.072054 +
-                              df_salud['consumo_de_medicamentos'] * 0.041516 +
-                              df_salud['sedentarismo'] * 0.026998 +
-                              df_salud['tasa_discapacitados'] * 0.022329)
+    # Invertir las notas para obtener los índices de desigualdad
+    columnas_indices = []
+    for ambito in list(ambitos) + ['general']:
+        df_indices[f'indice_desigualdad_{ambito}'] = 100 - df_indices[f'nota_{ambito}']
+        columnas_indices.append(f'indice_desigualdad_{ambito}')
 
-    # Escalar la nota a 100
-    df_salud['nota_salud'] = (df_salud['nota_salud'] * 100).round(2)
+    columnas_id = [c for c in df_indices.columns if not c.startswith(('nota_', 'indice_desigualdad_'))]
+    return df_indices[columnas_id + columnas_indices]
 
-    # Seleccionar las columnas de interés
-    df_nota_salud = df_salud[['cod_distrito', 'distrito', 'nota_salud']]
+def calcular_nota_economia(df):
+    # Calcular la nota de economía con su especificación
+    return calcular_notas(df, {'economia': ESPECIFICACION_NOTAS['economia']})
 
-    return df_nota_salud
+def calcular_nota_educacion(df):
+    # Calcular la nota de educación con su especificación
+    return calcular_notas(df, {'educacion': ESPECIFICACION_NOTAS['educacion']})
+
+def calcular_nota_social(df):
+    # Calcular la nota social con su especificación
+    return calcular_notas(df, {'social': ESPECIFICACION_NOTAS['social']})
+
+def calcular_nota_salud(df):
+    # Calcular la nota de salud con su especificación
+    return calcular_notas(df, {'salud': ESPECIFICACION_NOTAS['salud']})
 
 
 
 ##### FUNCIONES PARA GRAFICAR DATOS #####
 
+# Backends de Matplotlib que no abren ventanas (render por lotes en graficos.py)
+BACKENDS_NO_INTERACTIVOS = {'agg', 'cairo', 'pdf', 'pgf', 'ps', 'svg', 'template'}
+
+def mostrar_grafico():
+    # Mostrar la figura; con un backend no interactivo se deja abierta para guardarla en un archivo
+    if matplotlib.get_backend().lower() not in BACKENDS_NO_INTERACTIVOS:
+        plt.show()
+
 def graficar_variable_distrito(df, variable, titulo='Gráfico de distribución'):
     """
     Función para graficar una variable en relación a los distritos.
@@ -543,17 +933,8 @@ def graficar_variable_distrito(df, variable, titulo='Gráfico de distribución')
         variable (str): Nombre de la columna del DataFrame que quieres graficar.
         titulo (str): Título del gráfico (opcional).
     """
-    # Diccionario que mapea códigos de distrito a nombres de distrito
-    mapa_distritos = {
-        1: "Centro", 2: "Arganzuela", 3: "Retiro", 4: "Salamanca", 5: "Chamartín",
-        6: "Tetuán", 7: "Chamberí", 8: "Fuencarral-El Pardo", 9: "Moncloa-Aravaca", 10: "Latina",
-        11: "Carabanchel", 12: "Usera", 13: "Puente de Vallecas", 14: "Moratalaz", 15: "Ciudad Lineal",
-        16: "Hortaleza", 17: "Villaverde", 18: "Villa de Vallecas", 19: "Vicálvaro", 20: "San Blas-Canillejas",
-        21: "Barajas"
-    }
-    
     # Traducir los códigos de distrito a nombres de distrito
-    df['distrito'] = df['cod_distrito'].map(mapa_distritos)
+    df = df.assign(distrito=nombre_distrito(df['cod_distrito']))
 
     # Ordenar el DataFrame por la variable seleccionada
     df = df.sort_values(by=variable, ascending=False)
@@ -572,7 +953,7 @@ def graficar_variable_distrito(df, variable, titulo='Gráfico de distribución')
 
     # Mostrar el gráfico
     plt.tight_layout()
-    plt.show()
+    mostrar_grafico()
 
 
 def graficar_inversion_area(df):
@@ -582,17 +963,8 @@ def graficar_inversion_area(df):
     Args:
         df (pd.DataFrame): DataFrame con columnas 'cod_distrito', 'area_inversion' e 'inversion_media_anual_area'.
     """
-    # Diccionario que mapea códigos de distrito a nombres de distrito
-    mapa_distritos = {
-        1: "Centro", 2: "Arganzuela", 3: "Retiro", 4: "Salamanca", 5: "Chamartín",
-        6: "Tetuán", 7: "Chamberí", 8: "Fuencarral-El Pardo", 9: "Moncloa-Aravaca", 10: "Latina",
-        11: "Carabanchel", 12: "Usera", 13: "Puente de Vallecas", 14: "Moratalaz", 15: "Ciudad Lineal",
-        16: "Hortaleza", 17: "Villaverde", 18: "Villa de Vallecas", 19: "Vicálvaro", 20: "San Blas-Canillejas",
-        21: "Barajas"
-    }
-
     # Mapear los nombres de los distritos
-    df['distrito'] = df['cod_distrito'].map(mapa_distritos)
+    df = df.assign(distrito=nombre_distrito(df['cod_distrito']))
 
     # Pivotar la tabla para tener las áreas de inversión como columnas y los distritos como filas
     df_pivot = df.pivot(index='distrito', columns='area_inversion', values='inversion_media_anual_area')
@@ -607,7 +979,7 @@ def graficar_inversion_area(df):
     plt.legend(title='Áreas de inversión', bbox_to_anchor=(1.05, 1), loc='upper left')
     plt.tight_layout()
     plt.xticks(rotation=90)
-    plt.show()
+    mostrar_grafico()
 
 
 def graficar_inversion_por_año(df):
@@ -617,17 +989,8 @@ def graficar_inversion_por_año(df):
     Args:
         df (pd.DataFrame): DataFrame con columnas 'cod_distrito', 'año' e 'inversion_total_anual'.
     """
-    # Diccionario que mapea códigos de distrito a nombres de distrito
-    mapa_distritos = {
-        1: "Centro", 2: "Arganzuela", 3: "Retiro", 4: "Salamanca", 5: "Chamartín",
-        6: "Tetuán", 7: "Chamberí", 8: "Fuencarral-El Pardo", 9: "Moncloa-Aravaca", 10: "Latina",
-        11: "Carabanchel", 12: "Usera", 13: "Puente de Vallecas", 14: "Moratalaz", 15: "Ciudad Lineal",
-        16: "Hortaleza", 17: "Villaverde", 18: "Villa de Vallecas", 19: "Vicálvaro", 20: "San Blas-Canillejas",
-        21: "Barajas"
-    }
-
     # Mapear los nombres de los distritos
-    df['distrito'] = df['cod_distrito'].map(mapa_distritos)
+    df = df.assign(distrito=nombre_distrito(df['cod_distrito']))
 
     # Pivotar los datos para tener los distritos como columnas y los años como filas
     df_pivot = df.pivot(index='año', columns='distrito', values='inversion_total_anual')
@@ -642,21 +1005,12 @@ def graficar_inversion_por_año(df):
     ax.legend(title='Distrito', bbox_to_anchor=(1.05, 1), loc='upper left')
     plt.grid(True)
     plt.tight_layout()
-    plt.show()
+    mostrar_grafico()
 
 
 def graficar_inversion_sp_tasa_paro(df):
-    # Diccionario que mapea códigos de distrito a nombres de distrito
-    mapa_distritos = {
-        1: "Centro", 2: "Arganzuela", 3: "Retiro", 4: "Salamanca", 5: "Chamartín",
-        6: "Tetuán", 7: "Chamberí", 8: "Fuencarral-El Pardo", 9: "Moncloa-Aravaca", 10: "Latina",
-        11: "Carabanchel", 12: "Usera", 13: "Puente de Vallecas", 14: "Moratalaz", 15: "Ciudad Lineal",
-        16: "Hortaleza", 17: "Villaverde", 18: "Villa de Vallecas", 19: "Vicálvaro", 20: "San Blas-Canillejas",
-        21: "Barajas"
-    }
-
     # Mapear los nombres de los distritos
-    df['distrito'] = df['cod_distrito'].map(mapa_distritos)
+    df = df.assign(distrito=nombre_distrito(df['cod_distrito']))
 
     # Crear el gráfico de dispersión
     plt.figure(figsize=(10, 6))
@@ -674,20 +1028,12 @@ def graficar_inversion_sp_tasa_paro(df):
     # Mostrar la cuadrícula
     plt.grid(True)
     
-    plt.show()
+    mostrar_grafico()
 
 def graficar_educacion_superior_paro(df):
 
-    #Diccionario de nombres de distritos
-    mapa_distritos = {
-        1: "Centro", 2: "Arganzuela", 3: "Retiro", 4: "Salamanca", 5: "Chamartín",
-        6: "Tetuán", 7: "Chamberí", 8: "Fuencarral-El Pardo", 9: "Moncloa-Aravaca", 10: "Latina",
-        11: "Carabanchel", 12: "Usera", 13: "Puente de Vallecas", 14: "Moratalaz", 15: "Ciudad Lineal",
-        16: "Hortaleza", 17: "Villaverde", 18: "Villa de Vallecas", 19: "Vicálvaro", 20: "San Blas-Canillejas",
-        21: "Barajas"}
-
     # Mapear los nombres de los distritos
-    df['distrito'] = df['cod_distrito'].map(mapa_distritos)
+    df = df.assign(distrito=nombre_distrito(df['cod_distrito']))
 
     # Crear la figura y los ejes
     plt.figure(figsize=(10, 6))
@@ -705,20 +1051,12 @@ def graficar_educacion_superior_paro(df):
     
     # Mostrar el gráfico con una cuadrícula
     plt.grid(True)
-    plt.show()
+    mostrar_grafico()
 
 def graficar_intervenciones_seguridad(df):
 
-    #Diccionario de nombres de distritos
-    mapa_distritos = {
-        1: "Centro", 2: "Arganzuela", 3: "Retiro", 4: "Salamanca", 5: "Chamartín",
-        6: "Tetuán", 7: "Chamberí", 8: "Fuencarral-El Pardo", 9: "Moncloa-Aravaca", 10: "Latina",
-        11: "Carabanchel", 12: "Usera", 13: "Puente de Vallecas", 14: "Moratalaz", 15: "Ciudad Lineal",
-        16: "Hortaleza", 17: "Villaverde", 18: "Villa de Vallecas", 19: "Vicálvaro", 20: "San Blas-Canillejas",
-        21: "Barajas"}
-
     # Mapear los nombres de los distritos
-    df['distrito'] = df['cod_distrito'].map(mapa_distritos)
+    df = df.assign(distrito=nombre_distrito(df['cod_distrito']))
 
     # Crear la figura y los ejes
     plt.figure(figsize=(10, 6))
@@ -737,20 +1075,12 @@ def graficar_intervenciones_seguridad(df):
     
     # Mostrar el gráfico con una cuadrícula
     plt.grid(True)
-    plt.show()
+    mostrar_grafico()
 
 def graficar_pobreza_infantil_ss(df):
 
-    #Diccionario de nombres de distritos
-    mapa_distritos = {
-        1: "Centro", 2: "Arganzuela", 3: "Retiro", 4: "Salamanca", 5: "Chamartín",
-        6: "Tetuán", 7: "Chamberí", 8: "Fuencarral-El Pardo", 9: "Moncloa-Aravaca", 10: "Latina",
-        11: "Carabanchel", 12: "Usera", 13: "Puente de Vallecas", 14: "Moratalaz", 15: "Ciudad Lineal",
-        16: "Hortaleza", 17: "Villaverde", 18: "Villa de Vallecas", 19: "Vicálvaro", 20: "San Blas-Canillejas",
-        21: "Barajas"}
-
     # Mapear los nombres de los distritos
-    df['distrito'] = df['cod_distrito'].map(mapa_distritos)
+    df = df.assign(distrito=nombre_distrito(df['cod_distrito']))
 
     # Crear la figura y los ejes
     plt.figure(figsize=(10, 6))
@@ -769,20 +1099,12 @@ def graficar_pobreza_infantil_ss(df):
     
     # Mostrar el gráfico con una cuadrícula
     plt.grid(True)
-    plt.show()
+    mostrar_grafico()
 
 def graficar_renta_educacion_superior(df):
 
-    #Diccionario de nombres de distritos
-    mapa_distritos = {
-        1: "Centro", 2: "Arganzuela", 3: "Retiro", 4: "Salamanca", 5: "Chamartín",
-        6: "Tetuán", 7: "Chamberí", 8: "Fuencarral-El Pardo", 9: "Moncloa-Aravaca", 10: "Latina",
-        11: "Carabanchel", 12: "Usera", 13: "Puente de Vallecas", 14: "Moratalaz", 15: "Ciudad Lineal",
-        16: "Hortaleza", 17: "Villaverde", 18: "Villa de Vallecas", 19: "Vicálvaro", 20: "San Blas-Canillejas",
-        21: "Barajas"}
-
     # Mapear los nombres de los distritos
-    df['distrito'] = df['cod_distrito'].map(mapa_distritos)
+    df = df.assign(distrito=nombre_distrito(df['cod_distrito']))
 
     # Crear la figura y los ejes
     plt.figure(figsize=(10, 6))
@@ -801,20 +1123,12 @@ def graficar_renta_educacion_superior(df):
     
     # Mostrar el gráfico con una cuadrícula
     plt.grid(True)
-    plt.show()
+    mostrar_grafico()
 
 def graficar_absentismo_pobreza_infantil(df):
 
-    #Diccionario de nombres de distritos
-    mapa_distritos = {
-        1: "Centro", 2: "Arganzuela", 3: "Retiro", 4: "Salamanca", 5: "Chamartín",
-        6: "Tetuán", 7: "Chamberí", 8: "Fuencarral-El Pardo", 9: "Moncloa-Aravaca", 10: "Latina",
-        11: "Carabanchel", 12: "Usera", 13: "Puente de Vallecas", 14: "Moratalaz", 15: "Ciudad Lineal",
-        16: "Hortaleza", 17: "Villaverde", 18: "Villa de Vallecas", 19: "Vicálvaro", 20: "San Blas-Canillejas",
-        21: "Barajas"}
-
     # Mapear los nombres de los distritos
-    df['distrito'] = df['cod_distrito'].map(mapa_distritos)
+    df = df.assign(distrito=nombre_distrito(df['cod_distrito']))
 
     # Crear la figura y los ejes
     plt.figure(figsize=(10, 6))
@@ -833,21 +1147,13 @@ def graficar_absentismo_pobreza_infantil(df):
     
     # Mostrar el gráfico con una cuadrícula
     plt.grid(True)
-    plt.show()
+    mostrar_grafico()
 
 
 def graficar_centros_salud(df):
 
-    #Diccionario de nombres de distritos
-    mapa_distritos = {
-        1: "Centro", 2: "Arganzuela", 3: "Retiro", 4: "Salamanca", 5: "Chamartín",
-        6: "Tetuán", 7: "Chamberí", 8: "Fuencarral-El Pardo", 9: "Moncloa-Aravaca", 10: "Latina",
-        11: "Carabanchel", 12: "Usera", 13: "Puente de Vallecas", 14: "Moratalaz", 15: "Ciudad Lineal",
-        16: "Hortaleza", 17: "Villaverde", 18: "Villa de Vallecas", 19: "Vicálvaro", 20: "San Blas-Canillejas",
-        21: "Barajas"}
-
     # Mapear los nombres de los distritos
-    df['distrito'] = df['cod_distrito'].map(mapa_distritos)
+    df = df.assign(distrito=nombre_distrito(df['cod_distrito']))
 
     # Crear la figura y los ejes
     plt.figure(figsize=(10, 6))
@@ -866,7 +1172,7 @@ def graficar_centros_salud(df):
     
     # Mostrar el gráfico con una cuadrícula
     plt.grid(True)
-    plt.show()
+    mostrar_grafico()
 
 
 def graficar_renta_vs_salud(df, variables_salud):
@@ -883,4 +1189,4 @@ def graficar_renta_vs_salud(df, variables_salud):
         ax.set_title(f'Relación entre renta media y {variable.replace("_", " ")}')
         ax.grid(True)
 
-    plt.show()
\ No newline at end of file
+    mostrar_grafico()
\ No newline at end of file
@@ -0,0 +1,236 @@
+import os
+import unicodedata
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+try:
+    from .equipamientos import leer_equipamientos
+except ImportError:
+    # Importado como módulo suelto (from functions import * en los notebooks)
+    from equipamientos import leer_equipamientos
+
+
+
+# Códigos y nombres oficiales de los distritos
+DISTRITOS = {
+    1: 'Centro', 2: 'Arganzuela', 3: 'Retiro', 4: 'Salamanca', 5: 'Chamartín',
+    6: 'Tetuán', 7: 'Chamberí', 8: 'Fuencarral-El Pardo', 9: 'Moncloa-Aravaca', 10: 'Latina',
+    11: 'Carabanchel', 12: 'Usera', 13: 'Puente de Vallecas', 14: 'Moratalaz', 15: 'Ciudad Lineal',
+    16: 'Hortaleza', 17: 'Villaverde', 18: 'Villa de Vallecas', 19: 'Vicálvaro', 20: 'San Blas-Canillejas',
+    21: 'Barajas'}
+
+# Distrito de cada código postal
+CODIGOS_POSTALES = {
+    '28001': 4, '28002': 5, '28003': 7, '28004': 1, '28005': 1, '28006': 4,
+    '28007': 3, '28008': 9, '28009': 3, '28010': 7, '28011': 11, '28012': 1,
+    '28013': 1, '28014': 3, '28015': 7, '28016': 5, '28017': 15, '28018': 13,
+    '28019': 10, '28020': 6, '28021': 17, '28022': 20, '28023': 9, '28024': 11,
+    '28025': 10, '28026': 12, '28027': 15, '28028': 4, '28029': 6, '28030': 14,
+    '28031': 19, '28032': 19, '28033': 16, '28034': 8, '28035': 8, '28036': 5,
+    '28037': 20, '28038': 13, '28039': 6, '28040': 9, '28041': 12, '28042': 21,
+    '28043': 16, '28044': 11, '28045': 2, '28046': 5, '28047': 11, '28048': 8,
+    '28049': 8, '28050': 16, '28051': 18, '28052': 18, '28053': 13, '28054': 17,
+    '28055': 18, '28070': 1}
+
+# Archivos de los que se obtienen los barrios (todos comparten COD-DISTRITO, COD-BARRIO y BARRIO)
+RUTAS_BARRIOS = tuple(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'raw', archivo)
+                      for archivo in ['centros-educativos.csv', 'centros-atencion-medica.csv',
+                                      'residencias_apartamentos_mayores.csv'])
+
+
+
+###### FUNCIONES DE BÚSQUEDA ######
+
+def clave_nombre(texto):
+    # Clave de comparación de nombres: sin tildes, en minúsculas y solo letras y números,
+    # de modo que 'Fuencarral-El Pardo', 'Fuencarral - El Pardo' y 'FUENCARRAL-EL PARDO' coinciden
+    texto = unicodedata.normalize('NFKD', str(texto)).encode('ascii', 'ignore').decode()
+    return ''.join(c for c in texto.lower() if c.isalnum())
+
+def crear_indexador(claves, valores):
+    """
+    Precalcula un indexador de búsqueda: un índice con las claves (tabla hash de pandas)
+    y el array de valores en el mismo orden.
+
+    Returns:
+        tuple: (pandas.Index, numpy.ndarray).
+    """
+    return pd.Index(claves), np.asarray(valores)
+
+def mapear(serie, indexador, normalizar=None):
+    """
+    Traduce una serie con un indexador. Solo se buscan (y normalizan) los valores distintos
+    de la serie; el resultado se expande después con sus códigos.
+
+    Args:
+        serie (pandas.Series): Valores a traducir.
+        indexador (tuple): Indexador creado con crear_indexador.
+        normalizar (callable): Función aplicada a cada valor distinto antes de buscarlo (opcional).
+
+    Returns:
+        pandas.Series: Valores traducidos, con el mismo índice que la serie (NaN si no se encuentran).
+    """
+    serie = pd.Series(serie)
+    claves, valores = indexador
+
+    codigos, unicos = pd.factorize(serie)
+    if normalizar is not None:
+        unicos = pd.Index([normalizar(u) for u in unicos])
+    posiciones = claves.get_indexer(unicos)
+
+    # Posición de cada fila en la tabla de valores (-1 para nulos o valores no encontrados)
+    filas = np.where(codigos >= 0, posiciones[codigos] if len(posiciones) else -1, -1)
+    if (filas >= 0).all():
+        return pd.Series(valores[filas], index=serie.index)
+
+    resultado = pd.Series(valores[np.maximum(filas, 0)], index=serie.index)
+    if resultado.dtype.kind in 'iub':
+        resultado = resultado.astype('float64')
+    return resultado.where(filas >= 0)
+
+
+
+###### DIMENSIÓN DE DISTRITOS ######
+
+# Indexadores precalculados de los distritos
+INDEXADOR_NOMBRES_DISTRITOS = crear_indexador(list(DISTRITOS), list(DISTRITOS.values()))
+INDEXADOR_CODIGOS_DISTRITOS = crear_indexador([clave_nombre(n) for n in DISTRITOS.values()], list(DISTRITOS))
+INDEXADOR_CODIGOS_POSTALES = crear_indexador(list(CODIGOS_POSTALES), list(CODIGOS_POSTALES.values()))
+
+def nombre_distrito(codigos):
+    # Código de distrito -> nombre oficial
+    return mapear(codigos, INDEXADOR_NOMBRES_DISTRITOS)
+
+def codigo_distrito(nombres):
+    # Nombre de distrito (con cualquier variante de tildes, mayúsculas o guiones) -> código
+    return mapear(nombres, INDEXADOR_CODIGOS_DISTRITOS, normalizar=clave_nombre)
+
+def distrito_codigo_postal(codigos_postales):
+    # Código postal ('28001', 28001 o 28001.0) -> código de distrito
+    return mapear(codigos_postales, INDEXADOR_CODIGOS_POSTALES, normalizar=normalizar_codigo_postal)
+
+def normalizar_codigo_postal(codigo):
+    try:
+        return str(int(float(codigo)))
+    except (TypeError, ValueError):
+        return str(codigo).strip()
+
+
+
+###### DIMENSIÓN DE BARRIOS ######
+
+def id_barrio(cod_distrito, cod_barrio):
+    # Código de barrio único en la ciudad: distrito y número de barrio dentro del distrito (p. ej. 011 Palacio)
+    return pd.Series(cod_distrito).astype('Int64') * 10 + pd.Series(cod_barrio).astype('Int64').to_numpy()
+
+@lru_cache(maxsize=None)
+def cargar_dimension_barrios(rutas=RUTAS_BARRIOS):
+    """
+    Crea la dimensión geográfica de barrios a partir de los listados de equipamientos: cada
+    barrio con su distrito, las variantes de su nombre y los códigos postales en los que está.
+    Se calcula una sola vez por conjunto de archivos.
+
+    Args:
+        rutas (tuple): Rutas de los archivos de equipamientos.
+
+    Returns:
+        dict: {'barrios': DataFrame con 'id_barrio', 'cod_distrito', 'cod_barrio', 'barrio' y 'distrito',
+        'variantes': DataFrame {clave del nombre: id_barrio},
+        'codigos_postales': DataFrame con el barrio más frecuente de cada código postal}.
+    """
+    columnas = ['CODIGO-POSTAL', 'COD-DISTRITO', 'COD-BARRIO', 'BARRIO']
+    recuentos = None
+    for ruta in rutas:
+        for bloque in leer_equipamientos(ruta, columnas):
+            bloque = bloque.dropna(subset=['cod_distrito', 'cod_barrio', 'barrio'])
+            parcial = bloque.astype({'barrio': str}).groupby(
+                ['codigo_postal', 'cod_distrito', 'cod_barrio', 'barrio'], dropna=False).size()
+            recuentos = parcial if recuentos is None else recuentos.add(parcial, fill_value=0)
+
+    recuentos = recuentos.rename('recuento').reset_index()
+    recuentos['id_barrio'] = id_barrio(recuentos['cod_distrito'], recuentos['cod_barrio']).to_numpy()
+
+    # Nombre de cada barrio: la variante más frecuente
+    nombres = recuentos.groupby(['id_barrio', 'barrio'], as_index=False)['recuento'].sum()
+    nombres = nombres.sort_values(['id_barrio', 'recuento'], ascending=[True, False])
+    barrios = nombres.drop_duplicates('id_barrio')[['id_barrio', 'barrio']]
+    barrios['cod_distrito'] = (barrios['id_barrio'] // 10).astype('int64')
+    barrios['cod_barrio'] = (barrios['id_barrio'] % 10).astype('int64')
+    barrios['barrio'] = barrios['barrio'].str.title()
+    barrios['distrito'] = nombre_distrito(barrios['cod_distrito']).to_numpy()
+    barrios = barrios.astype({'id_barrio': 'int64'})[['id_barrio', 'cod_distrito', 'cod_barrio', 'barrio', 'distrito']]
+
+    # Todas las variantes de nombre que aparecen apuntan a su barrio
+    variantes = nombres.assign(clave=nombres['barrio'].map(clave_nombre))
+    variantes = variantes.drop_duplicates('clave')[['clave', 'id_barrio']].astype({'id_barrio': 'int64'})
+
+    # Barrio con más equipamientos de cada código postal
+    postales = recuentos.dropna(subset=['codigo_postal'])
+    postales = postales.groupby(['codigo_postal', 'id_barrio'], as_index=False)['recuento'].sum()
+    postales = postales.sort_values(['codigo_postal', 'recuento'], ascending=[True, False])
+    postales = postales.drop_duplicates('codigo_postal')[['codigo_postal', 'id_barrio']]
+    postales = postales.assign(codigo_postal=postales['codigo_postal'].map(normalizar_codigo_postal))
+
+    return {'barrios': barrios.reset_index(drop=True), 'variantes': variantes.reset_index(drop=True),
+            'codigos_postales': postales.astype({'id_barrio': 'int64'}).reset_index(drop=True)}
+
+@lru_cache(maxsize=None)
+def indexadores_barrios(rutas=RUTAS_BARRIOS):
+    # Indexadores precalculados de la dimensión de barrios
+    dimension = cargar_dimension_barrios(rutas)
+    barrios = dimension['barrios']
+    return {'nombre': crear_indexador(barrios['id_barrio'], barrios['barrio']),
+            'distrito': crear_indexador(barrios['id_barrio'], barrios['cod_distrito']),
+            'variantes': crear_indexador(dimension['variantes']['clave'], dimension['variantes']['id_barrio']),
+            'codigos_postales': crear_indexador(dimension['codigos_postales']['codigo_postal'],
+                                                dimension['codigos_postales']['id_barrio'])}
+
+def nombre_barrio(ids, rutas=RUTAS_BARRIOS):
+    # id_barrio -> nombre del barrio
+    return mapear(ids, indexadores_barrios(rutas)['nombre'])
+
+def codigo_barrio(nombres, rutas=RUTAS_BARRIOS):
+    # Nombre de barrio (cualquier variante) -> id_barrio
+    return mapear(nombres, indexadores_barrios(rutas)['variantes'], normalizar=clave_nombre)
+
+def barrio_codigo_postal(codigos_postales, rutas=RUTAS_BARRIOS):
+    # Código postal -> id_barrio con más equipamientos en ese código postal
+    return mapear(codigos_postales, indexadores_barrios(rutas)['codigos_postales'], normalizar=normalizar_codigo_postal)
+
+def distrito_barrio(ids, rutas=RUTAS_BARRIOS):
+    # id_barrio -> código de distrito
+    return mapear(ids, indexadores_barrios(rutas)['distrito'])
+
+
+
+###### AGREGACIÓN ENTRE NIVELES ######
+
+def agregar_a_distritos(df, columnas, pesos=None, rutas=RUTAS_BARRIOS):
+    """
+    Agrega indicadores de nivel barrio a nivel distrito: suma los recuentos o, si se indica
+    una columna de pesos (por ejemplo la población), calcula la media ponderada.
+
+    Args:
+        df (pandas.DataFrame): DataFrame con 'id_barrio' y los indicadores.
+        columnas (list): Columnas a agregar.
+        pesos (str): Columna con los pesos de la media ponderada (opcional).
+        rutas (tuple): Rutas de los archivos de la dimensión de barrios.
+
+    Returns:
+        pandas.DataFrame: Un distrito por fila con 'cod_distrito', 'distrito' y las columnas agregadas.
+    """
+    distritos = distrito_barrio(df['id_barrio'], rutas).to_numpy()
+    valores = df[list(columnas)]
+
+    if pesos is None:
+        agregado = valores.groupby(distritos).sum()
+    else:
+        peso = df[pesos].to_numpy(dtype=float)
+        agregado = valores.mul(peso, axis=0).groupby(distritos).sum()
+        agregado = agregado.div(pd.Series(peso).groupby(distritos).sum().to_numpy(), axis=0)
+
+    agregado.index = agregado.index.astype('int64')
+    agregado.insert(0, 'distrito', nombre_distrito(agregado.index.to_series()).to_numpy())
+    return agregado.rename_axis('cod_distrito').reset_index()
@@ -0,0 +1,261 @@
+import hashlib
+import inspect
+import json
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import matplotlib
+import matplotlib.pyplot as plt
+import pandas as pd
+
+from . import functions
+from .almacen import cargar_artefactos
+from .consultas import TABLAS_ANALISIS, ejecutar_catalogo, huella_dataframe
+
+
+
+# Registro de las imágenes generadas y sin cambios
+logger = logging.getLogger(__name__)
+
+# Carpeta por defecto de las imágenes generadas
+CARPETA_GRAFICOS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'visualizations', 'graficos')
+
+# Archivo con la clave de cada imagen generada
+ARCHIVO_INDICE = 'graficos.json'
+
+# Gráficos de las consultas del catálogo: {consulta: (archivo, función graficar_*, argumentos)}
+GRAFICOS_CATALOGO = {
+    'Inversión media anual en cada área por cada distrito':
+        ('inversion_area', 'graficar_inversion_area', {}),
+    'Inversión total de cada año en cada distrito':
+        ('inversion_por_año', 'graficar_inversion_por_año', {}),
+    'Relación entre la inversión en sectores productivos y la tasa de paro':
+        ('inversion_sp_tasa_paro', 'graficar_inversion_sp_tasa_paro', {}),
+    'Relación entre la tasa de paro y la proporción de población con educación superior':
+        ('educacion_superior_paro', 'graficar_educacion_superior_paro', {}),
+    'Relación entre tasa de intervenciones policiales y percepción de seguridad':
+        ('intervenciones_seguridad', 'graficar_intervenciones_seguridad', {}),
+    'Relación entre tasa de riesgo de pobreza infantil y tasas de personas atendidas por servicios sociales':
+        ('pobreza_infantil_ss', 'graficar_pobreza_infantil_ss', {}),
+    'Relación entre renta media y proporción de población con estudios superiores':
+        ('renta_educacion_superior', 'graficar_renta_educacion_superior', {}),
+    'Relación entre absentismo escolar y riesgo de pobreza infantil':
+        ('absentismo_pobreza_infantil', 'graficar_absentismo_pobreza_infantil', {}),
+    'Relación entre la tasa de centros sanitarios y la autopercepción de buena salud':
+        ('centros_salud', 'graficar_centros_salud', {}),
+}
+
+# Módulos del proyecto cuyas funciones forman parte de la clave de cada gráfico
+MODULOS_PROYECTO = ('functions', 'geografia')
+
+# Indicadores de salud que se cruzan con la renta media
+VARIABLES_SALUD = ['autopercepcion_salud_buena', 'consumo_de_medicamentos', 'presencia_enfermedad_cronica',
+                   'probabilidad_enfermedad_mental', 'sedentarismo', 'esperanza_vida']
+
+# Tablas con un gráfico por indicador
+AMBITOS_GRAFICOS = ['economia', 'educacion', 'social', 'salud', 'poblacion', 'indices']
+
+
+
+###### TAREAS DE GRÁFICOS ######
+
+def tarea(archivo, funcion, df, **argumentos):
+    # Una imagen: nombre del archivo (sin extensión), función de functions.py, datos y argumentos
+    return {'archivo': archivo, 'funcion': funcion, 'df': df, 'argumentos': argumentos}
+
+def tareas_catalogo(resultados):
+    """
+    Crea las tareas de los gráficos de las consultas del catálogo de análisis.
+
+    Args:
+        resultados (dict): Diccionario {consulta: DataFrame} devuelto por ejecutar_catalogo.
+
+    Returns:
+        list: Tareas de gráficos.
+    """
+    return [tarea(archivo, funcion, resultados[consulta], **argumentos)
+            for consulta, (archivo, funcion, argumentos) in GRAFICOS_CATALOGO.items() if consulta in resultados]
+
+def tareas_tablas(tablas):
+    """
+    Crea las tareas de los gráficos que salen directamente de las tablas limpias: un gráfico
+    de barras por indicador y distrito y la relación de la renta media con la salud.
+
+    Args:
+        tablas (dict): Diccionario {tabla: DataFrame} con las tablas de los ámbitos.
+
+    Returns:
+        list: Tareas de gráficos.
+    """
+    tareas = []
+    for ambito in AMBITOS_GRAFICOS:
+        if ambito not in tablas:
+            continue
+        df = tablas[ambito]
+        for variable in df.select_dtypes('number').columns.drop('cod_distrito', errors='ignore'):
+            tareas.append(tarea(os.path.join(ambito, variable), 'graficar_variable_distrito',
+                                df[['cod_distrito', variable]], variable=variable, titulo=variable))
+
+    if 'economia' in tablas and 'salud' in tablas:
+        variables = [v for v in VARIABLES_SALUD if v in tablas['salud'].columns]
+        df = pd.merge(tablas['economia'][['cod_distrito', 'renta_media']],
+                      tablas['salud'][['cod_distrito'] + variables], on='cod_distrito')
+        tareas.append(tarea('renta_vs_salud', 'graficar_renta_vs_salud', df, variables_salud=variables))
+
+    return tareas
+
+
+
+###### RENDER POR LOTES ######
+
+def nombres_codigo(codigo):
+    # Nombres globales que usa un código, incluidos los de sus funciones internas (lambdas, comprensiones)
+    nombres = set(codigo.co_names)
+    for constante in codigo.co_consts:
+        if inspect.iscode(constante):
+            nombres |= nombres_codigo(constante)
+    return nombres
+
+def fuentes_funcion(funcion, vistas=None):
+    """
+    Código de una función y de las funciones y constantes del proyecto que usa (de forma
+    recursiva), para que cambiar un auxiliar como nombre_distrito o mostrar_grafico
+    también invalide las imágenes.
+
+    Returns:
+        list: Código fuente o repr de cada objeto, en un orden estable.
+    """
+    vistas = set() if vistas is None else vistas
+    if funcion.__qualname__ in vistas:
+        return []
+    vistas.add(funcion.__qualname__)
+
+    fuentes = [inspect.getsource(funcion)]
+    for nombre in sorted(nombres_codigo(funcion.__code__)):
+        objeto = funcion.__globals__.get(nombre)
+        modulo = getattr(objeto, '__module__', '') or ''
+        if inspect.isfunction(objeto) and modulo.split('.')[-1] in MODULOS_PROYECTO:
+            fuentes += fuentes_funcion(objeto, vistas)
+        elif isinstance(objeto, (set, frozenset)):
+            # Los conjuntos no tienen un orden estable entre sesiones
+            fuentes.append(f'{nombre}={sorted(objeto, key=repr)!r}')
+        elif isinstance(objeto, (dict, list, tuple, str, int, float)):
+            fuentes.append(f'{nombre}={objeto!r}')
+    return fuentes
+
+def clave_grafico(t, formato, dpi):
+    # Clave de la caché: datos, función (y los auxiliares que usa), argumentos y formato de salida
+    funcion = getattr(functions, t['funcion'])
+    h = hashlib.blake2b(digest_size=16)
+    h.update(huella_dataframe(t['df']).encode())
+    for fuente in fuentes_funcion(funcion):
+        h.update(fuente.encode())
+    h.update(repr(sorted(t['argumentos'].items())).encode())
+    h.update(f'{formato}:{dpi}:{matplotlib.__version__}'.encode())
+    return h.hexdigest()
+
+def renderizar_grafico(t, ruta, dpi):
+    """
+    Dibuja un gráfico con el backend activo (Agg en los procesos del pool) y lo guarda en
+    un archivo. La función recibe una copia de los datos, así que el DataFrame original no
+    se modifica.
+    """
+    plt.close('all')
+    try:
+        getattr(functions, t['funcion'])(t['df'].copy(), **t['argumentos'])
+        os.makedirs(os.path.dirname(ruta), exist_ok=True)
+        plt.gcf().savefig(ruta, dpi=dpi, bbox_inches='tight')
+    finally:
+        plt.close('all')
+    return ruta
+
+def iniciar_proceso_graficos():
+    # Cada proceso del pool dibuja con el backend no interactivo Agg
+    plt.switch_backend('Agg')
+
+def renderizar_graficos(tareas, carpeta=CARPETA_GRAFICOS, formato='png', dpi=100, max_procesos=None, forzar=False):
+    """
+    Genera las imágenes de una lista de tareas en paralelo (un proceso por gráfico, sin
+    ventanas) y se salta las que ya existen con la misma clave: los datos, el código de la
+    función graficar_* (y de los auxiliares que usa), sus argumentos y el formato.
+
+    Args:
+        tareas (list): Tareas creadas con tarea(), tareas_catalogo() o tareas_tablas().
+        carpeta (str): Carpeta de salida.
+        formato (str): 'png' o 'svg'.
+        dpi (int): Resolución de las imágenes.
+        max_procesos (int): Número máximo de procesos (1 para dibujar en el proceso actual).
+        forzar (bool): Volver a generar todas las imágenes.
+
+    Returns:
+        dict: Diccionario {archivo: ruta de la imagen}.
+    """
+    ruta_indice = os.path.join(carpeta, ARCHIVO_INDICE)
+    indice = {}
+    if os.path.isfile(ruta_indice) and not forzar:
+        with open(ruta_indice, encoding='utf-8') as f:
+            indice = json.load(f)
+
+    rutas, pendientes = {}, []
+    for t in tareas:
+        archivo = f"{t['archivo']}.{formato}"
+        ruta = os.path.join(carpeta, archivo)
+        clave = clave_grafico(t, formato, dpi)
+        rutas[t['archivo']] = ruta
+        if indice.get(archivo) != clave or not os.path.isfile(ruta):
+            pendientes.append((t, ruta, archivo, clave))
+
+    if max_procesos == 1 or len(pendientes) < 2:
+        # En el proceso actual se usa Agg solo mientras se dibuja y se recupera el backend de la sesión
+        anterior = matplotlib.get_backend()
+        if pendientes:
+            plt.switch_backend('Agg')
+        try:
+            for t, ruta, _, _ in pendientes:
+                renderizar_grafico(t, ruta, dpi)
+        finally:
+            if pendientes:
+                plt.switch_backend(anterior)
+    else:
+        with ProcessPoolExecutor(max_workers=max_procesos, initializer=iniciar_proceso_graficos) as executor:
+            futuros = [executor.submit(renderizar_grafico, t, ruta, dpi) for t, ruta, _, _ in pendientes]
+            for futuro in futuros:
+                futuro.result()
+
+    # Guardar las claves solo cuando todas las imágenes se han generado
+    for _, _, archivo, clave in pendientes:
+        indice[archivo] = clave
+    os.makedirs(carpeta, exist_ok=True)
+    with open(ruta_indice, 'w', encoding='utf-8') as f:
+        json.dump(indice, f, ensure_ascii=False, indent=1, sort_keys=True)
+
+    logger.info('Gráficos generados: %d, sin cambios: %d', len(pendientes), len(tareas) - len(pendientes))
+    return rutas
+
+def generar_graficos(tablas=None, resultados=None, carpeta=CARPETA_GRAFICOS, formato='png', dpi=100,
+                     max_procesos=None, forzar=False):
+    """
+    Genera todo el conjunto de imágenes: los gráficos de las consultas del catálogo y los de
+    las tablas limpias.
+
+    Args:
+        tablas (dict): Diccionario {tabla: DataFrame}. Por defecto se cargan los artefactos del pipeline.
+        resultados (dict): Resultados de ejecutar_catalogo. Por defecto se ejecuta el catálogo
+            (con su caché) sobre las tablas.
+        carpeta (str): Carpeta de salida.
+        formato (str): 'png' o 'svg'.
+        dpi (int): Resolución de las imágenes.
+        max_procesos (int): Número máximo de procesos.
+        forzar (bool): Volver a generar todas las imágenes.
+
+    Returns:
+        dict: Diccionario {archivo: ruta de la imagen}.
+    """
+    if tablas is None:
+        tablas = cargar_artefactos(TABLAS_ANALISIS, mmap=False)
+    if resultados is None:
+        resultados = ejecutar_catalogo(tablas, consultas=[c for c in GRAFICOS_CATALOGO])
+
+    tareas = tareas_catalogo(resultados) + tareas_tablas(tablas)
+    return renderizar_graficos(tareas, carpeta, formato, dpi, max_procesos, forzar)
@@ -0,0 +1,338 @@
+import functools
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+import pandas as pd
+import psutil
+
+
+
+# Funciones instrumentadas: {módulo: nombres}. Se buscan con el nombre del paquete ('utils.functions')
+# y sin él ('functions', como se importa en el notebook); solo se instrumentan los módulos ya cargados.
+OBJETIVOS = {
+    'functions': [
+        'agregar_archivo_presupuestos', 'crear_df_presupuestos', 'leer_parciales_presupuestos',
+        'combinar_parciales_presupuestos', 'estandarizar_columnas', 'limpiar_numeros', 'convertir_cp_distrito',
+        'convertir_distrito_a_codigo', 'crear_matriz_indicadores', 'seleccionar_indicadores',
+        'crear_df_educacion', 'crear_df_cultura', 'crear_df_economia', 'crear_df_bienestar', 'crear_df_social',
+        'crear_df_salud', 'crear_df_poblacion', 'calcular_notas', 'calcular_nota_economia',
+        'calcular_nota_educacion', 'calcular_nota_social', 'calcular_nota_salud', 'calcular_indices_desigualdad',
+    ],
+    'equipamientos': ['cargar_equipamientos', 'contar_equipamientos'],
+    'carga_sql': ['cargar_tablas'],
+    'pipeline': [
+        'etapa_indicadores', 'etapa_matriz', 'etapa_presupuestos', 'etapa_economia', 'etapa_educacion',
+        'etapa_social', 'etapa_salud', 'etapa_poblacion', 'etapa_barrios', 'etapa_accesibilidad',
+        'etapa_metricas_desigualdad', 'etapa_autocorrelacion',
+        'etapa_nota', 'etapa_indices', 'etapa_carga_sql',
+    ],
+}
+
+# Lectores, uniones y carga de pandas: (objeto, atributo, nombre en los registros)
+OBJETIVOS_PANDAS = [
+    (pd, 'read_csv', 'pd.read_csv'),
+    (pd, 'read_excel', 'pd.read_excel'),
+    (pd, 'merge', 'pd.merge'),
+    (pd.DataFrame, 'merge', 'DataFrame.merge'),
+    (pd.DataFrame, 'to_sql', 'DataFrame.to_sql'),
+]
+
+# Segundos entre dos lecturas de la memoria del proceso
+INTERVALO_MUESTREO = 0.01
+
+MB = 1024 ** 2
+
+# Estado de la instrumentación activa (None cuando está desactivada)
+_estado = None
+
+
+
+###### FUNCIONES DE MEDIDA ######
+
+def dimensiones(objeto):
+    """
+    Filas y columnas de los DataFrames de un argumento o resultado: el propio DataFrame
+    o Series, o los que haya dentro de una tupla, lista o diccionario (un solo nivel).
+
+    Returns:
+        list: Lista de pares [filas, columnas].
+    """
+    if isinstance(objeto, pd.DataFrame):
+        return [list(objeto.shape)]
+    if isinstance(objeto, pd.Series):
+        return [[len(objeto), 1]]
+    if isinstance(objeto, dict):
+        objeto = list(objeto.values())
+    if isinstance(objeto, (list, tuple)):
+        return [d for elemento in objeto if isinstance(elemento, (pd.DataFrame, pd.Series))
+                for d in dimensiones(elemento)]
+    return []
+
+def muestrear_memoria(estado):
+    # Hilo que lee la memoria del proceso y actualiza el pico de todas las llamadas abiertas
+    while not estado['parar'].wait(estado['intervalo']):
+        rss = estado['proceso'].memory_info().rss
+        with estado['cerrojo']:
+            estado['muestras'].append((time.perf_counter(), rss))
+            for registro in estado['abiertos']:
+                registro['rss_pico'] = max(registro['rss_pico'], rss)
+
+def instrumentar_funcion(funcion, nombre):
+    """
+    Envuelve una función para registrar en cada llamada el tiempo real, el tiempo de CPU
+    del hilo, la memoria del proceso (inicio, pico y fin) y las filas y columnas de los
+    DataFrames de entrada y de salida. Las llamadas anidadas se registran con su nivel.
+    """
+    @functools.wraps(funcion)
+    def envoltura(*args, **kwargs):
+        estado = _estado
+        if estado is None:
+            return funcion(*args, **kwargs)
+
+        local = estado['local']
+        nivel = getattr(local, 'nivel', 0)
+        rss = estado['proceso'].memory_info().rss
+        registro = {
+            'nombre': nombre,
+            'hilo': threading.get_ident(),
+            'nivel': nivel,
+            'entrada': dimensiones(list(args) + list(kwargs.values())),
+            'rss_inicio': rss,
+            'rss_pico': rss,
+        }
+        with estado['cerrojo']:
+            estado['abiertos'].append(registro)
+
+        local.nivel = nivel + 1
+        inicio, cpu = time.perf_counter(), time.thread_time()
+        try:
+            resultado = funcion(*args, **kwargs)
+            registro['salida'] = dimensiones(resultado)
+            return resultado
+        except Exception as error:
+            registro['salida'] = []
+            registro['error'] = type(error).__name__
+            raise
+        finally:
+            registro['cpu'] = time.thread_time() - cpu
+            registro['duracion'] = time.perf_counter() - inicio
+            registro['inicio'] = inicio - estado['inicio']
+            local.nivel = nivel
+
+            rss = estado['proceso'].memory_info().rss
+            with estado['cerrojo']:
+                estado['abiertos'].remove(registro)
+                registro['rss_fin'] = rss
+                registro['rss_pico'] = max(registro['rss_pico'], rss)
+                estado['registros'].append(registro)
+
+    envoltura.__instrumentada__ = funcion
+    return envoltura
+
+
+
+###### ACTIVACIÓN ######
+
+def buscar_modulos(nombre):
+    # El mismo módulo puede estar cargado como 'utils.x' y como 'x' (notebook)
+    return [sys.modules[m] for m in (f'utils.{nombre}', nombre) if m in sys.modules]
+
+def activar_instrumentacion(espacios=(), intervalo=INTERVALO_MUESTREO):
+    """
+    Activa la instrumentación: sustituye las funciones de OBJETIVOS y los lectores, uniones
+    y to_sql de pandas por versiones que registran cada llamada. Con la instrumentación
+    desactivada se usan las funciones originales, sin ningún coste añadido.
+
+    Las funciones importadas con 'from ... import' son copias del nombre, así que también
+    se sustituyen en los módulos del proyecto ya cargados y en los espacios de nombres
+    indicados (por ejemplo, globals() del notebook tras 'from functions import *').
+
+    El tiempo de CPU es el del hilo que hace la llamada y la memoria es la RSS de todo el
+    proceso; el trabajo hecho en otros procesos (presupuestos en paralelo, etapas en modo
+    'procesos') no se registra.
+
+    Args:
+        espacios (list): Diccionarios de nombres adicionales en los que sustituir las funciones.
+        intervalo (float): Segundos entre dos lecturas de la memoria para calcular los picos.
+    """
+    global _estado
+    if _estado is not None:
+        return
+
+    # Funciones originales a sustituir: {id(original): (original, envoltura)}
+    sustituciones = {}
+    candidatos = [(vars(m), nombres) for modulo, nombres in OBJETIVOS.items() for m in buscar_modulos(modulo)]
+    candidatos += [(espacio, [n for nombres in OBJETIVOS.values() for n in nombres]) for espacio in espacios]
+    for espacio, nombres in candidatos:
+        for nombre in nombres:
+            original = espacio.get(nombre)
+            if callable(original) and id(original) not in sustituciones:
+                sustituciones[id(original)] = (original, instrumentar_funcion(original, nombre))
+
+    parches = []
+    for objeto, atributo, nombre in OBJETIVOS_PANDAS:
+        original = getattr(objeto, atributo)
+        envoltura = instrumentar_funcion(original, nombre)
+        sustituciones[id(original)] = (original, envoltura)
+        parches.append((objeto, atributo, original))
+        setattr(objeto, atributo, envoltura)
+
+    # Sustituir cada función original allí donde aparezca con su nombre
+    modulos = [m for nombre, m in list(sys.modules.items())
+               if nombre.startswith('utils.') or nombre in OBJETIVOS]
+    destinos = [vars(m) for m in modulos] + list(espacios)
+    for destino in destinos:
+        for atributo, valor in list(destino.items()):
+            if id(valor) in sustituciones and sustituciones[id(valor)][0] is valor:
+                destino[atributo] = sustituciones[id(valor)][1]
+                parches.append((destino, atributo, valor))
+
+    proceso = psutil.Process()
+    _estado = {
+        'proceso': proceso,
+        'inicio': time.perf_counter(),
+        'intervalo': intervalo,
+        'local': threading.local(),
+        'cerrojo': threading.Lock(),
+        'abiertos': [],
+        'registros': [],
+        'muestras': [],
+        'parches': parches,
+        'parar': threading.Event(),
+        'pid': proceso.pid,
+    }
+    _estado['hilo'] = threading.Thread(target=muestrear_memoria, args=(_estado,), daemon=True)
+    _estado['hilo'].start()
+
+def desactivar_instrumentacion():
+    """
+    Desactiva la instrumentación y restaura las funciones originales.
+
+    Returns:
+        dict: Registros de la ejecución: {'registros': [...], 'muestras': [...], 'pid': ...}, con
+        los tiempos en segundos y la memoria en MB. Lista vacía si no estaba activa.
+    """
+    global _estado
+    if _estado is None:
+        return {'registros': [], 'muestras': [], 'pid': os.getpid()}
+
+    estado, _estado = _estado, None
+    estado['parar'].set()
+    estado['hilo'].join()
+
+    for destino, atributo, original in reversed(estado['parches']):
+        if isinstance(destino, dict):
+            destino[atributo] = original
+        else:
+            setattr(destino, atributo, original)
+
+    registros = sorted(estado['registros'], key=lambda r: r['inicio'])
+    for registro in registros:
+        for clave in ('rss_inicio', 'rss_pico', 'rss_fin'):
+            registro[clave] = round(registro[clave] / MB, 2)
+    muestras = [(round(t - estado['inicio'], 4), round(rss / MB, 2)) for t, rss in estado['muestras']]
+    return {'registros': registros, 'muestras': muestras, 'pid': estado['pid']}
+
+@contextmanager
+def instrumentar(ruta=None, formato='json', espacios=(), intervalo=INTERVALO_MUESTREO):
+    """
+    Activa la instrumentación dentro de un bloque 'with' y, al salir, guarda los registros
+    si se indica una ruta.
+
+    Ejemplo:
+        with instrumentar('perfil.json', formato='chrome', espacios=[globals()]) as traza:
+            df_educacion = crear_df_educacion(df_indicadores)
+        resumir_registros(traza)
+
+    Yields:
+        dict: Diccionario que al salir del bloque contiene los registros (ver desactivar_instrumentacion).
+    """
+    traza = {}
+    activar_instrumentacion(espacios, intervalo)
+    try:
+        yield traza
+    finally:
+        traza.update(desactivar_instrumentacion())
+        if ruta:
+            guardar_traza(traza, ruta, formato)
+
+
+
+###### INFORMES ######
+
+def resumir_registros(traza):
+    """
+    Resume los registros por función: llamadas, tiempos, pico de memoria y filas. Marca las
+    uniones que devuelven más filas que la tabla izquierda (claves duplicadas en la derecha;
+    las uniones 'outer' y 'right' también pueden hacerlo sin error) y el resto de funciones
+    que devuelven más filas que su entrada más grande.
+
+    Args:
+        traza (dict): Registros devueltos por desactivar_instrumentacion o instrumentar.
+
+    Returns:
+        pandas.DataFrame: Una fila por función, ordenada por tiempo total.
+    """
+    columnas = ['nombre', 'llamadas', 'segundos', 'segundos_cpu', 'rss_pico_mb', 'incremento_rss_mb',
+                'filas_entrada', 'filas_salida', 'multiplica_filas']
+    if not traza.get('registros'):
+        return pd.DataFrame(columns=columnas)
+
+    df = pd.DataFrame({
+        'nombre': [r['nombre'] for r in traza['registros']],
+        'segundos': [r['duracion'] for r in traza['registros']],
+        'segundos_cpu': [r['cpu'] for r in traza['registros']],
+        'rss_pico_mb': [r['rss_pico'] for r in traza['registros']],
+        'incremento_rss_mb': [r['rss_pico'] - r['rss_inicio'] for r in traza['registros']],
+        'filas_entrada': [max((f for f, _ in r['entrada']), default=0) for r in traza['registros']],
+        'filas_salida': [sum(f for f, _ in r['salida']) for r in traza['registros']],
+    })
+    izquierda = [r['entrada'][0][0] if r['entrada'] else 0 for r in traza['registros']]
+    referencia = df['filas_entrada'].where(~df['nombre'].str.endswith('merge'), izquierda)
+    df['multiplica_filas'] = (referencia > 0) & (df['filas_salida'] > referencia)
+
+    resumen = df.groupby('nombre', as_index=False).agg(
+        llamadas=('segundos', 'size'), segundos=('segundos', 'sum'), segundos_cpu=('segundos_cpu', 'sum'),
+        rss_pico_mb=('rss_pico_mb', 'max'), incremento_rss_mb=('incremento_rss_mb', 'max'),
+        filas_entrada=('filas_entrada', 'sum'), filas_salida=('filas_salida', 'sum'),
+        multiplica_filas=('multiplica_filas', 'any'))
+    return resumen[columnas].sort_values('segundos', ascending=False, ignore_index=True).round(4)
+
+def traza_chrome(traza):
+    """
+    Convierte los registros al formato de trazas de Chrome (chrome://tracing o Perfetto):
+    un evento por llamada y un contador con la memoria del proceso.
+
+    Returns:
+        dict: Traza con la lista 'traceEvents'.
+    """
+    eventos = []
+    for r in traza['registros']:
+        eventos.append({
+            'name': r['nombre'], 'cat': 'etl', 'ph': 'X', 'pid': traza['pid'], 'tid': r['hilo'],
+            'ts': round(r['inicio'] * 1e6), 'dur': round(r['duracion'] * 1e6),
+            'args': {k: r[k] for k in ('cpu', 'rss_inicio', 'rss_pico', 'rss_fin', 'entrada', 'salida', 'error')
+                     if k in r},
+        })
+    for t, rss in traza['muestras']:
+        eventos.append({'name': 'memoria', 'ph': 'C', 'pid': traza['pid'], 'ts': round(t * 1e6),
+                        'args': {'rss_mb': rss}})
+    return {'traceEvents': eventos, 'displayTimeUnit': 'ms'}
+
+def guardar_traza(traza, ruta, formato='json'):
+    """
+    Guarda los registros en un archivo JSON.
+
+    Args:
+        traza (dict): Registros devueltos por desactivar_instrumentacion o instrumentar.
+        ruta (str): Ruta del archivo.
+        formato (str): 'json' (registros tal cual) o 'chrome' (formato de trazas de Chrome).
+    """
+    if os.path.dirname(ruta):
+        os.makedirs(os.path.dirname(ruta), exist_ok=True)
+    with open(ruta, 'w', encoding='utf-8') as f:
+        json.dump(traza_chrome(traza) if formato == 'chrome' else traza, f, ensure_ascii=False)
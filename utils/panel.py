@@ -0,0 +1,239 @@
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+
+
+# Error relativo máximo para guardar una medida en float32 en lugar de float64
+TOLERANCIA_FLOAT32 = 1e-6
+
+
+
+###### FUNCIONES DE TIPOS ######
+
+def tipo_codigos(n):
+    # Entero sin signo más pequeño que admite n códigos (uint8 para distritos, años y áreas)
+    return np.min_scalar_type(max(n - 1, 0))
+
+def compactar_medida(valores, tolerancia=TOLERANCIA_FLOAT32):
+    """
+    Convierte una medida a float32 si el error relativo de la conversión no supera la
+    tolerancia en ningún valor, y la deja en float64 en caso contrario.
+
+    Returns:
+        numpy.ndarray: Valores en float32 o float64.
+    """
+    valores = np.asarray(valores, dtype='float64')
+    compactos = valores.astype('float32')
+    with np.errstate(invalid='ignore'):
+        error = np.abs(compactos - valores) / np.maximum(np.abs(valores), 1)
+    return compactos if not np.nanmax(error, initial=0) > tolerancia else valores
+
+def codigo_distrito_entero(serie):
+    # '01', '1.0' o 1.0 -> 1: los códigos de distrito llegan como texto o como decimales
+    return pd.to_numeric(serie, errors='coerce').astype('Int64')
+
+
+
+###### PANEL ######
+
+@dataclass
+class Panel:
+    """
+    Datos de panel con las claves como códigos enteros y las medidas en arrays contiguos.
+
+    Las filas están ordenadas por las claves, así que las filas de cada valor de la primera
+    clave (normalmente el distrito) son un tramo contiguo que empieza en 'desplazamientos[i]'
+    y acaba en 'desplazamientos[i + 1]'.
+
+    Args:
+        dimensiones (dict): Diccionario {clave: pandas.Index} con la etiqueta de cada código.
+        codigos (dict): Diccionario {clave: numpy.ndarray} con el código de cada fila.
+        medidas (dict): Diccionario {medida: numpy.ndarray} con los valores de cada fila.
+        desplazamientos (numpy.ndarray): Inicio de cada grupo de la primera clave (y el final del último).
+    """
+    dimensiones: dict
+    codigos: dict
+    medidas: dict
+    desplazamientos: np.ndarray
+
+    @property
+    def claves(self):
+        return list(self.dimensiones)
+
+    @property
+    def filas(self):
+        return int(self.desplazamientos[-1])
+
+    def memoria(self):
+        # Bytes ocupados por los códigos, las medidas y los desplazamientos
+        return (sum(a.nbytes for a in self.codigos.values()) + sum(a.nbytes for a in self.medidas.values()) +
+                self.desplazamientos.nbytes)
+
+    def grupo(self, etiqueta):
+        """
+        Filas de un valor de la primera clave (por ejemplo, un distrito), sin copiar los datos.
+
+        Returns:
+            Panel: Panel con las filas del grupo.
+        """
+        i = self.dimensiones[self.claves[0]].get_loc(etiqueta)
+        tramo = slice(self.desplazamientos[i], self.desplazamientos[i + 1])
+        desplazamientos = np.zeros(len(self.desplazamientos), dtype=self.desplazamientos.dtype)
+        desplazamientos[i + 1:] = tramo.stop - tramo.start
+        return Panel(self.dimensiones, {c: v[tramo] for c, v in self.codigos.items()},
+                     {m: v[tramo] for m, v in self.medidas.items()}, desplazamientos)
+
+    def agregar(self, por, medidas=None, funcion='sum'):
+        """
+        Agrega las medidas por una o varias claves operando solo con los códigos enteros:
+        cada combinación de claves es un índice de un array y la suma es un bincount.
+        Las sumas se acumulan en float64 aunque las medidas estén en float32.
+
+        Args:
+            por (list): Claves por las que agrupar.
+            medidas (list): Medidas a agregar (por defecto todas).
+            funcion (str): 'sum', 'mean' o 'count'.
+
+        Returns:
+            pandas.DataFrame: Una fila por combinación de claves presente en los datos.
+        """
+        por = [por] if isinstance(por, str) else list(por)
+        medidas = list(self.medidas) if medidas is None else list(medidas)
+        tamanos = [len(self.dimensiones[c]) for c in por]
+
+        combinado = np.ravel_multi_index([self.codigos[c] for c in por], tamanos) if por else \
+            np.zeros(self.filas, dtype=np.intp)
+        total_grupos = int(np.prod(tamanos))
+        recuento = np.bincount(combinado, minlength=total_grupos)
+        presentes = np.flatnonzero(recuento)
+
+        resultado = {}
+        for clave, codigos in zip(por, np.unravel_index(presentes, tamanos) if por else []):
+            resultado[clave] = self.dimensiones[clave][codigos]
+
+        for medida in medidas:
+            if funcion == 'count':
+                resultado[medida] = recuento[presentes]
+                continue
+            valores = self.medidas[medida]
+            validos = ~np.isnan(valores)
+            suma = np.bincount(combinado[validos], weights=valores[validos], minlength=total_grupos)[presentes]
+            if funcion == 'mean':
+                suma = suma / np.bincount(combinado[validos], minlength=total_grupos)[presentes]
+            resultado[medida] = suma
+
+        return pd.DataFrame(resultado)
+
+    def atributo(self, clave, valores):
+        """
+        Une a cada fila un atributo de una dimensión (por ejemplo, la población de cada
+        distrito) a través de los códigos, sin unir DataFrames.
+
+        Args:
+            clave (str): Clave de la dimensión.
+            valores (pandas.Series): Serie con las etiquetas de la dimensión como índice.
+
+        Returns:
+            numpy.ndarray: Valor del atributo en cada fila (NaN si la etiqueta no está en 'valores').
+        """
+        por_codigo = valores.reindex(self.dimensiones[clave]).to_numpy()
+        return por_codigo[self.codigos[clave]]
+
+    def a_dataframe(self, categoricas=True):
+        """
+        Convierte el panel a DataFrame largo.
+
+        Args:
+            categoricas (bool): Si las claves se devuelven como categóricas (sin copiar
+                las etiquetas) o con sus valores.
+
+        Returns:
+            pandas.DataFrame: Una columna por clave y por medida.
+        """
+        columnas = {}
+        for clave, codigos in self.codigos.items():
+            categorias = pd.Categorical.from_codes(codigos.astype(np.int64), categories=self.dimensiones[clave])
+            columnas[clave] = categorias if categoricas else np.asarray(categorias)
+        columnas.update(self.medidas)
+        return pd.DataFrame(columnas)
+
+
+
+###### CREACIÓN DE PANELES ######
+
+def crear_panel(df, claves, medidas, conversiones=None, tolerancia=TOLERANCIA_FLOAT32):
+    """
+    Crea un panel a partir de un DataFrame largo: factoriza cada clave a códigos enteros
+    del menor tamaño posible, ordena las filas por las claves y compacta las medidas.
+    Las filas con alguna clave nula no entran en el panel.
+
+    Args:
+        df (pandas.DataFrame): DataFrame con las claves y las medidas.
+        claves (list): Columnas clave; la primera define los grupos contiguos.
+        medidas (list): Columnas numéricas.
+        conversiones (dict): Diccionario {clave: función} que se aplica a las etiquetas
+            distintas de la clave (no a cada fila), por ejemplo para pasar códigos de texto a enteros.
+        tolerancia (float): Error relativo máximo para guardar una medida en float32.
+
+    Returns:
+        Panel: Panel con los datos.
+    """
+    claves, medidas = list(claves), list(medidas)
+
+    conversiones = conversiones or {}
+
+    dimensiones, codigos = {}, {}
+    for clave in claves:
+        codigos[clave], etiquetas = pd.factorize(df[clave])
+        if clave in conversiones:
+            etiquetas = conversiones[clave](etiquetas)
+
+        # Ordenar las etiquetas (y unir las que coinciden tras la conversión) sin tocar cada fila
+        posiciones, dimensiones[clave] = pd.factorize(etiquetas, sort=True)
+        codigos[clave] = np.append(posiciones, -1)[codigos[clave]]
+        if pd.api.types.is_extension_array_dtype(dimensiones[clave]) and pd.api.types.is_integer_dtype(dimensiones[clave]):
+            # Sin nulos entre las etiquetas, los enteros con nulos de pandas pasan a int64
+            dimensiones[clave] = dimensiones[clave].astype('int64')
+
+    validas = np.logical_and.reduce([c >= 0 for c in codigos.values()]) if claves else np.ones(len(df), bool)
+    orden = np.lexsort([codigos[c][validas] for c in reversed(claves)]) if claves else np.arange(validas.sum())
+
+    for clave in claves:
+        codigos[clave] = codigos[clave][validas][orden].astype(tipo_codigos(len(dimensiones[clave])))
+    valores = {m: compactar_medida(df[m].to_numpy(dtype='float64', na_value=np.nan)[validas][orden], tolerancia)
+               for m in medidas}
+
+    n = len(dimensiones[claves[0]]) if claves else 0
+    desplazamientos = np.searchsorted(codigos[claves[0]], np.arange(n + 1)) if claves else np.array([0, len(orden)])
+    return Panel(dimensiones, codigos, valores, desplazamientos.astype(np.int64))
+
+def panel_presupuestos(df_presupuestos, tolerancia=TOLERANCIA_FLOAT32):
+    """
+    Panel de la inversión por distrito, año y área. El código de distrito pasa a entero.
+
+    Args:
+        df_presupuestos (pandas.DataFrame): DataFrame con 'cod_distrito', 'año', 'area_inversion'
+            y 'total_invertido' (agregado o con una fila por línea de gasto).
+
+    Returns:
+        Panel: Panel con las claves ('cod_distrito', 'año', 'area_inversion') y 'total_invertido'.
+    """
+    return crear_panel(df_presupuestos, ['cod_distrito', 'año', 'area_inversion'], ['total_invertido'],
+                       {'cod_distrito': codigo_distrito_entero}, tolerancia)
+
+def panel_indicadores(df_indicadores, claves=('cod_distrito',), tolerancia=TOLERANCIA_FLOAT32):
+    """
+    Panel de los indicadores en formato largo. Si hay varios valores de una unidad e
+    indicador se conservan todos (el panel no pivota).
+
+    Args:
+        df_indicadores (pandas.DataFrame): DataFrame con las claves, 'indicador_completo' y 'valor_indicador'.
+        claves (tuple): Claves de la unidad ('cod_distrito', 'id_barrio', 'año'...).
+
+    Returns:
+        Panel: Panel con las claves más 'indicador_completo' y la medida 'valor_indicador'.
+    """
+    return crear_panel(df_indicadores, list(claves) + ['indicador_completo'], ['valor_indicador'],
+                       {'cod_distrito': codigo_distrito_entero}, tolerancia)
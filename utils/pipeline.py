@@ -0,0 +1,732 @@
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import Callable
+
+import pandas as pd
+
+from .accesibilidad import accesibilidad_equipamientos
+from .almacen import CARPETA_ARTEFACTOS, cargar_artefacto, guardar_artefacto
+from .desigualdad import metricas_distritos
+from .equipamientos import contar_equipamientos
+from .espacial import autocorrelacion_distritos
+from .exportacion import exportar_modelo
+from .geografia import cargar_dimension_barrios, id_barrio
+from .instrumentacion import activar_instrumentacion, desactivar_instrumentacion, guardar_traza, resumir_registros
+from .functions import (ESPECIFICACION_NOTAS, calcular_indices_desigualdad, calcular_notas,
+                        combinar_parciales_presupuestos, crear_df_bienestar, crear_df_cultura,
+                        crear_df_economia, crear_df_educacion, crear_df_poblacion, crear_df_salud,
+                        crear_df_social, crear_matriz_indicadores, eliminar_espacios, estandarizar_columnas,
+                        leer_parciales_presupuestos, limpiar_numeros)
+
+
+
+# Raíz del proyecto y rutas por defecto de los datos de entrada
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+RUTAS = {
+    'indicadores': os.path.join(RAIZ, 'data', 'raw', 'indicadores_generales_distritos.csv'),
+    'presupuestos': os.path.join(RAIZ, 'data', 'presupuestos'),
+    'locales': os.path.join(RAIZ, 'data', 'raw', 'locales_madrid.csv'),
+    'centros_educativos': os.path.join(RAIZ, 'data', 'raw', 'centros-educativos.csv'),
+    'residencias': os.path.join(RAIZ, 'data', 'raw', 'residencias_apartamentos_mayores.csv'),
+    'pobreza_infantil': os.path.join(RAIZ, 'data', 'raw', 'riesgo_pobreza_infantil.csv'),
+    'centros_salud': os.path.join(RAIZ, 'data', 'raw', 'centros-atencion-medica.csv'),
+}
+
+# Archivo con el estado del pipeline (huellas de archivos y etapas)
+ARCHIVO_ESTADO = 'estado_pipeline.json'
+
+
+
+###### ETAPAS DEL PIPELINE ######
+
+def anadir_distancia(df, accesibilidad, nombre):
+    # Añadir la distancia media al equipamiento más cercano del ámbito (si se ha calculado la accesibilidad)
+    if accesibilidad is None:
+        return df
+    columna = f'distancia_media_{nombre}'
+    distancias = accesibilidad[['cod_distrito', columna]].astype({'cod_distrito': df['cod_distrito'].dtype})
+    return pd.merge(df, distancias, on='cod_distrito', how='left')
+
+def etapa_indicadores(ruta):
+    # Cargar y limpiar la base de datos principal de indicadores
+    df = pd.read_csv(ruta, sep=';', encoding='utf-8-sig')
+
+    eliminar_espacios(df, 'distrito')
+    eliminar_espacios(df, 'indicador_completo')
+    limpiar_numeros(df, 'valor_indicador')
+
+    # Unificar los nombres de distrito
+    df['distrito'] = df['distrito'].replace({
+        'Fuencarral-El Pardo': 'Fuencarral - El Pardo',
+        'Moncloa-Aravaca': 'Moncloa - Aravaca',
+        'San Blas-Canillejas': 'San Blas - Canillejas'})
+
+    return df
+
+def etapa_matriz(indicadores):
+    # Pivotar una sola vez todos los indicadores por distrito
+    return crear_matriz_indicadores(indicadores)
+
+def etapa_presupuestos(carpeta, carpeta_parciales, max_procesos=None, huellas=None):
+    """
+    Crea el DataFrame de presupuestos volviendo a agregar solo los archivos que han
+    cambiado. La suma parcial de cada archivo se guarda como artefacto con la huella
+    del archivo en el nombre, y los archivos sin cambios reutilizan la suya.
+
+    Args:
+        carpeta (str): Carpeta con los archivos CSV de presupuestos.
+        carpeta_parciales (str): Carpeta donde se guardan las sumas parciales.
+        max_procesos (int): Número máximo de procesos para los archivos que hay que leer.
+        huellas (dict): Huellas {ruta: huella} de los archivos ya calculadas por el pipeline
+            (por defecto se calculan leyendo todos los archivos).
+
+    Returns:
+        pandas.DataFrame: DataFrame con 'cod_distrito', 'año', 'area_inversion' y 'total_invertido'.
+    """
+    os.makedirs(carpeta_parciales, exist_ok=True)
+    rutas_csv = [os.path.join(carpeta, f) for f in sorted(os.listdir(carpeta)) if f.endswith('.csv')]
+    if huellas is None:
+        huellas = huellas_archivos(rutas_csv, {})
+    nombres = {ruta: f'{os.path.basename(ruta)[:-4]}-{huellas[ruta][:16]}' for ruta in rutas_csv}
+
+    # Agregar solo los archivos que no tienen una suma parcial guardada
+    existentes = set(os.listdir(carpeta_parciales))
+    pendientes = [ruta for ruta in rutas_csv if nombres[ruta] not in existentes]
+    for ruta, parcial in zip(pendientes, leer_parciales_presupuestos(pendientes, max_procesos)):
+        guardar_artefacto(parcial if parcial is not None else pd.DataFrame(), nombres[ruta], carpeta_parciales)
+
+    # Borrar las sumas parciales de versiones anteriores de los archivos
+    for nombre in existentes - set(nombres.values()):
+        if not nombre.endswith('.tmp'):
+            borrar_artefacto(nombre, carpeta_parciales)
+
+    parciales = [cargar_artefacto(nombres[ruta], carpeta_parciales, mmap=False) for ruta in rutas_csv]
+    return combinar_parciales_presupuestos([p for p in parciales if len(p.columns)])
+
+def etapa_economia(matriz, ruta_locales):
+    df_economia = crear_df_economia(matriz)
+
+    # Simplificar y estandarizar los nombres de las columnas
+    df_economia.rename(columns={
+        'Personas paradas de larga duración (febrero)': 'parados_larga_duracion',
+        'Tasa absoluta de paro registrado (febrero)': 'tasa_paro',
+        'Renta disponible media por persona': 'renta_media'}, inplace=True)
+    estandarizar_columnas(df_economia)
+
+    # Tasas de paro y pensión media
+    df_economia['tasa_paro_larga_duracion'] = ((df_economia['parados_larga_duracion'] / df_economia['numero_habitantes']) * 100).round(2)
+    df_economia['tasa_paro_joven'] = df_economia[['tasa_de_desempleo_en_hombres_de_16_a_24_anos', 'tasa_de_desempleo_en_mujeres_de_16_a_24_anos']].mean(axis=1).round(2)
+    df_economia['pension_media'] = ((df_economia['pension_media_mensual_hombres'] + df_economia['pension_media_mensual__mujeres']) / 2).round(2)
+
+    # Añadir la tasa de comercios por cada mil habitantes
+    df_comercio = pd.read_csv(ruta_locales)
+    df_economia = pd.merge(df_economia, df_comercio, on='cod_distrito', how='left')
+    df_economia['tasa_comercios'] = ((df_economia['num_locales'] / df_economia['numero_habitantes']) * 1000).round(2)
+
+    return df_economia[['cod_distrito', 'distrito', 'renta_media', 'tasa_paro',
+                        'tasa_paro_larga_duracion', 'tasa_paro_joven', 'pension_media',
+                        'tasa_comercios']]
+
+def etapa_educacion(matriz, ruta_centros_educativos, accesibilidad=None):
+    df_educacion = crear_df_educacion(matriz)
+    df_cultura = crear_df_cultura(matriz)
+
+    # Añadir el recuento de centros educativos por distrito
+    df_centros_educativos = contar_equipamientos(ruta_centros_educativos, nombre='recuento_centros')
+    df_educacion = pd.merge(df_educacion, df_centros_educativos, on='cod_distrito', how='left')
+
+    estandarizar_columnas(df_educacion)
+    estandarizar_columnas(df_cultura)
+
+    # NaN significa la ausencia de centros o cero
+    df_cultura.fillna(0, inplace=True)
+
+    # Simplificar los nombres de las columnas
+    df_educacion.rename(columns={
+        'poblacion_mayor/igual__de_25_anos__con_estudios_superiores,_licenciatura,_arquitectura,_ingenieria_sup.,_estudios_sup._no_universitarios,_doctorado,__postgraduado': 'poblacion_educacion_superior',
+        'poblacion_mayor/igual__de_25_anos__que_no_sabe_leer_ni_escribir_o_sin_estudios': 'poblacion_sin_estudios',
+        'poblacion_mayor/igual__de_25_anos_con_bachiller_elemental,_graduado_escolar,_eso,_formacion_profesional_1o_grado': 'poblacion_educacion_obligatoria',
+        'poblacion_mayor/igual__de_25_anos_con_ensenanza_primaria_incompleta': 'poblacion_primaria_incompleta',
+        'casos_trabajados_por_el_programa_de_absentismo_municipal': 'casos_absentismo'}, inplace=True)
+
+    df_cultura.rename(columns={
+        'grado_de_satisfaccion_con_los_espacios_verdes': 'satisfaccion_espacios_verdes',
+        'grado_de_satisfaccion_con_las_instalaciones_deportivas': 'satisfaccion_instalaciones_deportivas',
+        'grado_de_satisfaccion_con_los_centros_culturales': 'satisfaccion_centros_culturales',
+        'relacion_de_superficie_de_zonas_verdes_y_parques_de_distrito_(ha)_entre_numero_de_habitantes_*10.000': 'tasa_zonas_verdes'}, inplace=True)
+
+    # Tasas de educación por cada 1000 habitantes
+    df_educacion['tasa_centros_enseñanza'] = ((df_educacion['recuento_centros'] / df_educacion['numero_habitantes']) * 1000).round(2)
+    df_educacion['tasa_centros_publicos_obligatoria'] = ((df_educacion['colegios_publicos_infantil_y_primaria'] +
+                                                          df_educacion['escuelas_infantiles_municipales'] +
+                                                          df_educacion['escuelas_infantiles_publicas_cam'] +
+                                                          df_educacion['institutos_publicos_de_educacion_secundaria']) / df_educacion['numero_habitantes'] * 1000).round(2)
+    df_educacion['tasa_absentismo'] = ((df_educacion['casos_absentismo'] / df_educacion['numero_habitantes']) * 1000).round(2)
+    df_educacion['tasa_sin_estudios'] = (((df_educacion['poblacion_sin_estudios'] + df_educacion['poblacion_primaria_incompleta']) / df_educacion['numero_habitantes']) * 1000).round(2)
+    df_educacion['tasa_poblacion_educacion_obligatoria'] = ((df_educacion['poblacion_educacion_obligatoria'] / df_educacion['numero_habitantes']) * 1000).round(2)
+    df_educacion['tasa_poblacion_educacion_superior'] = ((df_educacion['poblacion_educacion_superior'] / df_educacion['numero_habitantes']) * 1000).round(2)
+
+    # Tasas de cultura por cada 10000 habitantes
+    df_cultura['tasa_bibliotecas'] = (((df_cultura['bibliotecas_publicas_comunidad_madrid'] +
+                                        df_cultura['bibliotecas_publicas_municipales']) / df_cultura['numero_habitantes']) * 10000).round(2)
+    df_cultura['tasa_superficie_deportiva'] = ((df_cultura['superficie_deportiva_m2'] / df_cultura['numero_habitantes']) * 10000).round(2)
+    df_cultura['tasa_centros_culturales'] = ((df_cultura['centros_y_espacios_culturales'] / df_cultura['numero_habitantes']) * 10000).round(2)
+
+    df_educacion_cultura = pd.merge(df_educacion, df_cultura, on=['cod_distrito', 'distrito'], how='outer')
+
+    df_educacion_cultura = df_educacion_cultura[['cod_distrito', 'distrito', 'tasa_centros_enseñanza',
+                                                 'tasa_centros_publicos_obligatoria', 'tasa_absentismo',
+                                                 'tasa_sin_estudios', 'tasa_poblacion_educacion_obligatoria',
+                                                 'tasa_poblacion_educacion_superior', 'tasa_bibliotecas',
+                                                 'tasa_superficie_deportiva', 'tasa_zonas_verdes',
+                                                 'tasa_centros_culturales', 'satisfaccion_instalaciones_deportivas',
+                                                 'satisfaccion_centros_culturales', 'satisfaccion_espacios_verdes']]
+
+    return anadir_distancia(df_educacion_cultura, accesibilidad, 'centros_educativos')
+
+def etapa_social(matriz, ruta_residencias, ruta_pobreza_infantil, accesibilidad=None):
+    df_bienestar = crear_df_bienestar(matriz)
+    df_social = crear_df_social(matriz)
+
+    # Añadir el recuento de residencias y el riesgo de pobreza infantil
+    df_residencias = contar_equipamientos(ruta_residencias, nombre='recuento_residencias')
+    df_social = pd.merge(df_social, df_residencias, on='cod_distrito', how='left')
+
+    df_pobreza_infantil = pd.read_csv(ruta_pobreza_infantil)
+    df_social = pd.merge(df_social, df_pobreza_infantil, on='cod_distrito', how='left')
+
+    # Simplificar y estandarizar los nombres de las columnas
+    df_social.rename(columns={
+        'Demandas de intervención en los Centros de Atención a la Infancia (CAI)': 'demandas_cai',
+        'Personas atendidas en la Unidad de Primera Atención en Centros de Servicios Sociales': 'personas_atendidas_ss',
+        'Personas con Servicio de Ayuda a Domicilio (modalidad auxiliar de hogar)': 'personas_ayuda_domicilio'}, inplace=True)
+    estandarizar_columnas(df_social)
+
+    # Tasas de servicios sociales por cada 1000 habitantes
+    df_social['tasa_demandas_cai'] = (df_social['demandas_cai'] / df_social['numero_habitantes']) * 1000
+    df_social['tasa_personas_atendidas_ss'] = (df_social['personas_atendidas_ss'] / df_social['numero_habitantes']) * 1000
+    df_social['tasa_ayuda_domicilio'] = (df_social['personas_ayuda_domicilio'] / df_social['numero_habitantes']) * 1000
+    df_social['tasa_residencias'] = (df_social['recuento_residencias'] / df_social['numero_habitantes']) * 1000
+    df_social['tasa_centros_ss'] = (df_social['centros_de_servicios_sociales'] / df_social['numero_habitantes']) * 1000
+
+    # Simplificar y estandarizar los nombres de las columnas de bienestar
+    df_bienestar.rename(columns={
+        'Intervenciones de la Policía Municipal en materia de seguridad: delitos relacionados con las personas': 'intervenciones_policia_personas',
+        'Intervenciones de la Policía Municipal en materia de seguridad: relacionadas con la tenencia de armas': 'intervenciones_policia_arma',
+        'Intervenciones de la Policía Municipal en materia de seguridad: relacionadas con el patrimonio': 'intervenciones_policia_patrimonio',
+        'Intervenciones de la Policía Municipal en materia de seguridad: relacionadas con la tenencia y consumo de drogas': 'intervenciones_policia_droga',
+        'Calidad de vida actual en su barrio': 'calidad_vida',
+        'Madrid ciudad amigable con las personas lesbianas, gays, transexuales y bisexuales': 'amigable_lgbt',
+        'Percepción de seguridad en Madrid': 'percepcion_seguridad',
+        'Satisfacción de la convivencia vecinal': 'satisfaccion_convivencia_distrito',
+        'Satisfacción de vivir en su barrio': 'satisfaccion_vivir_distrito'}, inplace=True)
+    estandarizar_columnas(df_bienestar)
+
+    # Tasa de intervenciones policiales por cada 1000 habitantes
+    df_bienestar['tasa_intervenciones_policia'] = ((
+        (df_bienestar['intervenciones_policia_personas'] +
+         df_bienestar['intervenciones_policia_arma'] +
+         df_bienestar['intervenciones_policia_patrimonio'] +
+         df_bienestar['intervenciones_policia_droga']) /
+        df_bienestar['numero_habitantes']) * 1000).round(2)
+
+    df_bienestar_social = pd.merge(df_bienestar, df_social, on='cod_distrito', how='outer')
+
+    df_bienestar_social = df_bienestar_social[['cod_distrito', 'distrito', 'calidad_vida',
+                                              'percepcion_seguridad', 'satisfaccion_vivir_distrito', 'tasa_intervenciones_policia',
+                                              'amigable_lgbt', 'tasa_demandas_cai', 'tasa_personas_atendidas_ss', 'tasa_ayuda_domicilio',
+                                              'tasa_residencias', 'tasa_centros_ss', 'tasa_riesgo_pobreza_infantil']]
+
+    return anadir_distancia(df_bienestar_social, accesibilidad, 'residencias')
+
+def etapa_salud(matriz, ruta_centros_salud, accesibilidad=None):
+    df_salud = crear_df_salud(matriz)
+
+    # Añadir el recuento de centros sanitarios por distrito
+    df_centros_salud = contar_equipamientos(ruta_centros_salud, nombre='recuento_centros')
+    df_salud = pd.merge(df_salud, df_centros_salud, on='cod_distrito', how='left')
+
+    # Simplificar y estandarizar los nombres de las columnas
+    df_salud.rename(columns={
+        'Autopercepción de buen estado de salud  (porcentaje respuesta muy buena + buena)': 'autopercepcion_salud_buena',
+        'Probabilidad de padecer enfermedad mental (GHQ-12)          (2018. EMS)': 'probabilidad_enfermedad_mental',
+        'Presencia de enfermedad crónica': 'presencia_enfermedad_cronica'}, inplace=True)
+    estandarizar_columnas(df_salud)
+
+    # Esperanza de vida media y tasas por cada 1000 habitantes
+    df_salud['esperanza_vida'] = df_salud[['esperanza_de_vida_al_nacer_hombres', 'esperanza_de_vida_al_nacer_mujeres']].mean(axis=1)
+    df_salud['tasa_discapacitados'] = ((df_salud['numero_de_personas_con_grado_de_discapacidad_reconocido'] / df_salud['numero_habitantes']) * 1000).round(2)
+    df_salud['tasa_centros_sanitarios'] = ((df_salud['recuento_centros'] / df_salud['numero_habitantes']) * 1000).round(2)
+
+    df_salud = df_salud[['cod_distrito', 'distrito', 'autopercepcion_salud_buena',
+                         'consumo_de_medicamentos', 'presencia_enfermedad_cronica',
+                         'probabilidad_enfermedad_mental', 'sedentarismo', 'esperanza_vida',
+                         'tasa_discapacitados', 'tasa_centros_sanitarios']]
+
+    return anadir_distancia(df_salud, accesibilidad, 'centros_sanitarios')
+
+def etapa_poblacion(matriz):
+    df_poblacion = crear_df_poblacion(matriz)
+
+    # Simplificar y estandarizar los nombres de las columnas
+    df_poblacion.rename(columns={
+        'Población densidad (hab./Ha.)': 'densidad_poblacion',
+        'Edad media de la población': 'edad_media',
+        'Proporción de envejecimiento (Población mayor de 65 años/Población total)': 'proporcion_envejecimiento',
+        'Índice de dependencia (Población de 0-15 + población 65 años y más / Pob. 16-64)': 'indice_dependencia',
+        'Proporción de personas migrantes (Población extranjera menos UE y resto países de OCDE / Población total)': 'proporcion_migrantes'}, inplace=True)
+    estandarizar_columnas(df_poblacion)
+
+    return df_poblacion
+
+def etapa_barrios(ruta_centros_educativos, ruta_residencias, ruta_centros_salud):
+    # Dimensión de barrios con el recuento de equipamientos de cada barrio
+    rutas = {'centros_educativos': ruta_centros_educativos, 'residencias': ruta_residencias,
+             'centros_sanitarios': ruta_centros_salud}
+    df_barrios = cargar_dimension_barrios(tuple(rutas.values()))['barrios']
+
+    for nombre, ruta in rutas.items():
+        df_recuento = contar_equipamientos(ruta, ['COD-DISTRITO', 'COD-BARRIO'], nombre=f'recuento_{nombre}')
+        df_recuento['id_barrio'] = id_barrio(df_recuento['cod_distrito'], df_recuento['cod_barrio']).astype('int64')
+        df_barrios = pd.merge(df_barrios, df_recuento[['id_barrio', f'recuento_{nombre}']], on='id_barrio', how='left')
+        df_barrios[f'recuento_{nombre}'] = df_barrios[f'recuento_{nombre}'].fillna(0).astype('int64')
+
+    return df_barrios
+
+def etapa_accesibilidad(ruta_centros_educativos, ruta_residencias, ruta_centros_salud):
+    # Distancia media al equipamiento más cercano y equipamientos cercanos desde una rejilla de puntos de cada distrito
+    return accesibilidad_equipamientos({'centros_educativos': ruta_centros_educativos,
+                                        'residencias': ruta_residencias,
+                                        'centros_sanitarios': ruta_centros_salud})
+
+def etapa_metricas_desigualdad(**tablas):
+    # Gini, Theil y Atkinson entre distritos de cada indicador, ponderados por habitantes y con intervalos bootstrap
+    return metricas_distritos(tablas)
+
+def etapa_autocorrelacion(rutas_equipamientos, **tablas):
+    # I de Moran global y clústeres LISA entre distritos vecinos de cada indicador e índice
+    return autocorrelacion_distritos(tablas, rutas_equipamientos)
+
+def etapa_nota(ambito, **entradas):
+    # Calcular la nota del ámbito con su especificación
+    return calcular_notas(entradas[ambito], {ambito: ESPECIFICACION_NOTAS[ambito]})
+
+def etapa_indices(nota_salud, nota_social, nota_economia, nota_educacion):
+    # Unir las notas de todos los ámbitos y calcular los índices de desigualdad
+    df_notas = nota_salud
+    for df_nota in [nota_social, nota_economia, nota_educacion]:
+        df_notas = pd.merge(df_notas, df_nota, on=['cod_distrito', 'distrito'], how='outer')
+
+    return calcular_indices_desigualdad(df_notas)
+
+def etapa_carga_sql(url_bd, modo_carga='reemplazar', **dataframes):
+    # Cargar los DataFrames en las tablas del esquema SQL (completas o solo sus diferencias)
+    from sqlalchemy import create_engine
+
+    from .carga_sql import cargar_tablas
+
+    engine = create_engine(url_bd)
+    try:
+        return cargar_tablas(engine, dataframes, modo=modo_carga)
+    finally:
+        engine.dispose()
+
+def etapa_exportacion(carpeta_exportacion, **tablas):
+    # Publicar el modelo en estrella para Power BI reescribiendo solo las particiones que cambian
+    return exportar_modelo(tablas, carpeta_exportacion)
+
+
+
+###### DEFINICIÓN DEL PIPELINE ######
+
+@dataclass
+class Etapa:
+    """
+    Etapa del pipeline.
+
+    Args:
+        nombre (str): Nombre de la etapa (y de su artefacto).
+        funcion (callable): Función que calcula la etapa. Recibe los resultados de las
+            dependencias como argumentos con su nombre, más los argumentos fijos.
+        archivos (list): Archivos o carpetas de entrada de los que depende la etapa.
+        dependencias (list): Nombres de las etapas de las que depende.
+        argumentos (dict): Argumentos fijos de la función (rutas, parámetros...).
+        guardar (bool): Si el resultado se guarda como artefacto para reutilizarlo.
+        recibe_huellas (bool): Si la función recibe las huellas de sus archivos ('huellas').
+    """
+    nombre: str
+    funcion: Callable
+    archivos: list = field(default_factory=list)
+    dependencias: list = field(default_factory=list)
+    argumentos: dict = field(default_factory=dict)
+    guardar: bool = True
+    recibe_huellas: bool = False
+
+    def ejecutar(self, resultados, huellas=None):
+        entradas = {dependencia: resultados[dependencia] for dependencia in self.dependencias}
+        if self.recibe_huellas:
+            entradas['huellas'] = huellas
+        return self.funcion(**self.argumentos, **entradas)
+
+def crear_etapas(rutas=RUTAS, carpeta=CARPETA_ARTEFACTOS, url_bd=None, max_procesos=None, modo_carga='reemplazar',
+                 carpeta_exportacion=None):
+    """
+    Crea las etapas del pipeline de datos, equivalentes a los pasos de main.ipynb.
+
+    Args:
+        rutas (dict): Rutas de los archivos de entrada (por defecto RUTAS).
+        carpeta (str): Carpeta de los artefactos.
+        url_bd (str): URL de conexión de SQLAlchemy (opcional). Si se indica, se añade la etapa de carga a SQL.
+        max_procesos (int): Número máximo de procesos para leer los presupuestos.
+        modo_carga (str): 'reemplazar' o 'delta' (solo inserta, actualiza y borra las filas que cambian).
+        carpeta_exportacion (str): Carpeta del modelo en estrella para Power BI (opcional). Si se
+            indica, se añade la etapa de exportación.
+
+    Returns:
+        dict: Diccionario {nombre: Etapa}.
+    """
+    etapas = [
+        Etapa('indicadores', etapa_indicadores, [rutas['indicadores']], argumentos={'ruta': rutas['indicadores']}),
+        Etapa('matriz', etapa_matriz, dependencias=['indicadores'], guardar=False),
+        Etapa('presupuestos', etapa_presupuestos, [rutas['presupuestos']],
+              argumentos={'carpeta': rutas['presupuestos'],
+                          'carpeta_parciales': os.path.join(carpeta, 'presupuestos_parciales'),
+                          'max_procesos': max_procesos},
+              recibe_huellas=True),
+        Etapa('economia', etapa_economia, [rutas['locales']], ['matriz'], {'ruta_locales': rutas['locales']}),
+        Etapa('educacion', etapa_educacion, [rutas['centros_educativos']], ['matriz', 'accesibilidad'],
+              {'ruta_centros_educativos': rutas['centros_educativos']}),
+        Etapa('social', etapa_social, [rutas['residencias'], rutas['pobreza_infantil']], ['matriz', 'accesibilidad'],
+              {'ruta_residencias': rutas['residencias'], 'ruta_pobreza_infantil': rutas['pobreza_infantil']}),
+        Etapa('salud', etapa_salud, [rutas['centros_salud']], ['matriz', 'accesibilidad'],
+              {'ruta_centros_salud': rutas['centros_salud']}),
+        Etapa('poblacion', etapa_poblacion, dependencias=['matriz']),
+        Etapa('barrios', etapa_barrios, [rutas['centros_educativos'], rutas['residencias'], rutas['centros_salud']],
+              argumentos={'ruta_centros_educativos': rutas['centros_educativos'],
+                          'ruta_residencias': rutas['residencias'], 'ruta_centros_salud': rutas['centros_salud']}),
+        Etapa('accesibilidad', etapa_accesibilidad,
+              [rutas['centros_educativos'], rutas['residencias'], rutas['centros_salud']],
+              argumentos={'ruta_centros_educativos': rutas['centros_educativos'],
+                          'ruta_residencias': rutas['residencias'], 'ruta_centros_salud': rutas['centros_salud']}),
+    ]
+
+    etapas.append(Etapa('metricas_desigualdad', etapa_metricas_desigualdad,
+                        dependencias=['economia', 'educacion', 'social', 'salud', 'poblacion', 'accesibilidad']))
+
+    # Una etapa de nota por ámbito
+    for ambito in ['economia', 'educacion', 'social', 'salud']:
+        etapas.append(Etapa(f'nota_{ambito}', etapa_nota, dependencias=[ambito], argumentos={'ambito': ambito}))
+
+    etapas.append(Etapa('indices', etapa_indices,
+                        dependencias=['nota_salud', 'nota_social', 'nota_economia', 'nota_educacion']))
+
+    rutas_equipamientos = [rutas['centros_educativos'], rutas['residencias'], rutas['centros_salud']]
+    etapas.append(Etapa('autocorrelacion', etapa_autocorrelacion, rutas_equipamientos,
+                        ['indices', 'economia', 'educacion', 'social', 'salud', 'poblacion', 'accesibilidad'],
+                        {'rutas_equipamientos': rutas_equipamientos}))
+
+    if url_bd:
+        etapas.append(Etapa('carga_sql', etapa_carga_sql,
+                            dependencias=['indices', 'poblacion', 'economia', 'educacion', 'social', 'salud', 'presupuestos'],
+                            argumentos={'url_bd': url_bd, 'modo_carga': modo_carga}, guardar=False))
+
+    if carpeta_exportacion:
+        etapas.append(Etapa('exportacion', etapa_exportacion,
+                            dependencias=['presupuestos', 'indices', 'economia', 'educacion', 'social', 'salud',
+                                          'poblacion', 'barrios', 'accesibilidad'],
+                            argumentos={'carpeta_exportacion': carpeta_exportacion}, guardar=False))
+
+    return {etapa.nombre: etapa for etapa in etapas}
+
+def ordenar_etapas(etapas, objetivos=None):
+    """
+    Ordena topológicamente las etapas necesarias para calcular los objetivos.
+
+    Args:
+        etapas (dict): Diccionario {nombre: Etapa}.
+        objetivos (list): Etapas a calcular (por defecto todas).
+
+    Returns:
+        list: Nombres de las etapas en orden de ejecución.
+    """
+    orden, visitadas, en_curso = [], set(), set()
+
+    def visitar(nombre):
+        if nombre in visitadas:
+            return
+        if nombre in en_curso:
+            raise ValueError(f'Dependencia circular en la etapa {nombre}')
+        en_curso.add(nombre)
+        for dependencia in etapas[nombre].dependencias:
+            visitar(dependencia)
+        en_curso.discard(nombre)
+        visitadas.add(nombre)
+        orden.append(nombre)
+
+    for nombre in objetivos or etapas:
+        visitar(nombre)
+
+    return orden
+
+
+
+###### HUELLAS E INCREMENTALIDAD ######
+
+def calcular_huella_archivo(ruta, tamano_bloque=1 << 20):
+    # Huella del contenido de un archivo
+    huella = hashlib.blake2b(digest_size=20)
+    with open(ruta, 'rb') as f:
+        for bloque in iter(lambda: f.read(tamano_bloque), b''):
+            huella.update(bloque)
+    return huella.hexdigest()
+
+def huellas_archivos(rutas, cache_archivos):
+    """
+    Calcula la huella de los archivos (o de todos los archivos de una carpeta). Si el
+    tamaño y la fecha de modificación no han cambiado se reutiliza la huella guardada.
+
+    Args:
+        rutas (list): Archivos o carpetas.
+        cache_archivos (dict): Huellas guardadas {ruta: [tamaño, mtime, huella]}; se actualiza.
+
+    Returns:
+        dict: Diccionario {ruta del archivo: huella}.
+    """
+    archivos = []
+    for ruta in rutas:
+        if os.path.isdir(ruta):
+            archivos += [os.path.join(ruta, f) for f in sorted(os.listdir(ruta))]
+        else:
+            archivos.append(ruta)
+
+    huellas = {}
+    for archivo in archivos:
+        if not os.path.exists(archivo):
+            huellas[archivo] = None
+            continue
+        info = os.stat(archivo)
+        guardado = cache_archivos.get(archivo)
+        if guardado is None or guardado[:2] != [info.st_size, info.st_mtime_ns]:
+            guardado = [info.st_size, info.st_mtime_ns, calcular_huella_archivo(archivo)]
+            cache_archivos[archivo] = guardado
+        huellas[archivo] = guardado[2]
+
+    return huellas
+
+def calcular_huellas_etapas(etapas, orden, cache_archivos):
+    """
+    Calcula la huella de cada etapa a partir de las huellas de sus archivos, sus
+    argumentos y las huellas de las etapas de las que depende. Si cambia cualquier
+    entrada de una etapa, cambia su huella y la de todas las etapas posteriores.
+
+    Returns:
+        dict: Diccionario {nombre: huella}.
+    """
+    huellas = {}
+    for nombre in orden:
+        etapa = etapas[nombre]
+        contenido = {
+            'archivos': huellas_archivos(etapa.archivos, cache_archivos),
+            'argumentos': {k: repr(v) for k, v in etapa.argumentos.items()},
+            'dependencias': {d: huellas[d] for d in etapa.dependencias},
+        }
+        huellas[nombre] = hashlib.blake2b(json.dumps(contenido, sort_keys=True).encode(), digest_size=20).hexdigest()
+
+    return huellas
+
+def cargar_estado(carpeta):
+    ruta = os.path.join(carpeta, ARCHIVO_ESTADO)
+    if not os.path.exists(ruta):
+        return {'archivos': {}, 'etapas': {}}
+    with open(ruta, encoding='utf-8') as f:
+        return json.load(f)
+
+def guardar_estado(estado, carpeta):
+    os.makedirs(carpeta, exist_ok=True)
+    ruta = os.path.join(carpeta, ARCHIVO_ESTADO)
+    with open(ruta + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(estado, f, ensure_ascii=False, indent=1)
+    os.replace(ruta + '.tmp', ruta)
+
+def borrar_artefacto(nombre, carpeta):
+    shutil.rmtree(os.path.join(carpeta, nombre), ignore_errors=True)
+
+def etapas_pendientes(etapas, orden, huellas, estado, carpeta):
+    """
+    Devuelve las etapas que hay que recalcular: las que han cambiado de huella, las que
+    no tienen su artefacto guardado y las que no se guardan pero alimentan a una pendiente.
+    """
+    pendientes = set()
+    for nombre in orden:
+        etapa = etapas[nombre]
+        sin_artefacto = etapa.guardar and not os.path.exists(os.path.join(carpeta, nombre, 'esquema.json'))
+        if estado['etapas'].get(nombre) != huellas[nombre] or sin_artefacto:
+            pendientes.add(nombre)
+
+    # Las etapas sin artefacto se recalculan si alguna etapa pendiente las necesita
+    for nombre in reversed(orden):
+        if nombre in pendientes:
+            for dependencia in etapas[nombre].dependencias:
+                if not etapas[dependencia].guardar:
+                    pendientes.add(dependencia)
+
+    return [nombre for nombre in orden if nombre in pendientes]
+
+
+
+###### EJECUCIÓN DEL PIPELINE ######
+
+def ejecutar_etapa(etapa, entradas, huellas=None):
+    # Ejecutar una etapa midiendo su tiempo de reloj
+    inicio = time.perf_counter()
+    resultado = etapa.ejecutar(entradas, huellas)
+    return resultado, time.perf_counter() - inicio
+
+def ejecutar_pipeline(etapas=None, objetivos=None, carpeta=CARPETA_ARTEFACTOS, forzar=False,
+                      max_trabajadores=None, modo='hilos'):
+    """
+    Ejecuta el pipeline de forma incremental: solo se recalculan las etapas cuyas
+    entradas (archivos o etapas anteriores) han cambiado desde la última ejecución.
+    El resto se cargan de sus artefactos cuando alguna etapa posterior las necesita.
+
+    Las etapas se ejecutan como un grafo: en cuanto todas las dependencias de una
+    etapa están listas se lanza en el pool, de modo que las ramas independientes
+    (economía, educación, social, salud, población y presupuestos) corren a la vez.
+
+    Args:
+        etapas (dict): Diccionario {nombre: Etapa} (por defecto crear_etapas()).
+        objetivos (list): Etapas a calcular (por defecto todas).
+        carpeta (str): Carpeta de los artefactos y del estado del pipeline.
+        forzar (bool): Si se recalculan todas las etapas.
+        max_trabajadores (int): Número máximo de etapas a la vez (1 para ejecutarlas en serie).
+        modo (str): 'hilos' (ThreadPoolExecutor) o 'procesos' (ProcessPoolExecutor).
+
+    Returns:
+        tuple: Diccionario {nombre: resultado} de las etapas calculadas o cargadas,
+        lista de las etapas recalculadas y diccionario {nombre: segundos} con el tiempo de cada una.
+    """
+    etapas = etapas or crear_etapas(carpeta=carpeta)
+    orden = ordenar_etapas(etapas, objetivos)
+
+    estado = cargar_estado(carpeta)
+    huellas = calcular_huellas_etapas(etapas, orden, estado['archivos'])
+    pendientes = orden if forzar else etapas_pendientes(etapas, orden, huellas, estado, carpeta)
+
+    resultados, tiempos = {}, {}
+    por_lanzar = list(pendientes)
+    terminadas = set(orden) - set(pendientes)
+
+    Executor = ProcessPoolExecutor if modo == 'procesos' else ThreadPoolExecutor
+    with Executor(max_workers=max_trabajadores) as executor:
+        en_curso = {}
+        while por_lanzar or en_curso:
+            # Lanzar las etapas cuyas dependencias ya están listas
+            for nombre in [n for n in por_lanzar if all(d in terminadas for d in etapas[n].dependencias)]:
+                for dependencia in etapas[nombre].dependencias:
+                    if dependencia not in resultados:
+                        resultados[dependencia] = cargar_artefacto(dependencia, carpeta)
+                entradas = {d: resultados[d] for d in etapas[nombre].dependencias}
+                # Las huellas de los archivos ya están en la caché: solo se consultan tamaño y fecha
+                huellas_entrada = (huellas_archivos(etapas[nombre].archivos, estado['archivos'])
+                                   if etapas[nombre].recibe_huellas else None)
+                en_curso[executor.submit(ejecutar_etapa, etapas[nombre], entradas, huellas_entrada)] = nombre
+                por_lanzar.remove(nombre)
+
+            # Esperar a que termine alguna etapa y guardar su resultado
+            listas, _ = wait(en_curso, return_when=FIRST_COMPLETED)
+            for futuro in listas:
+                nombre = en_curso.pop(futuro)
+                resultados[nombre], tiempos[nombre] = futuro.result()
+
+                if etapas[nombre].guardar:
+                    guardar_artefacto(resultados[nombre], nombre, carpeta)
+                estado['etapas'][nombre] = huellas[nombre]
+                guardar_estado(estado, carpeta)
+                terminadas.add(nombre)
+                print(f'Etapa {nombre} recalculada en {tiempos[nombre]:.2f} s')
+
+    guardar_estado(estado, carpeta)
+
+    return resultados, pendientes, tiempos
+
+
+
+###### LÍNEA DE COMANDOS ######
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m utils.pipeline',
+        description='Ejecuta el pipeline de desigualdad de los distritos de Madrid de forma incremental.')
+    parser.add_argument('objetivos', nargs='*', help='Etapas a calcular (por defecto todas).')
+    parser.add_argument('--forzar', action='store_true', help='Recalcular todas las etapas.')
+    parser.add_argument('--carpeta', default=CARPETA_ARTEFACTOS, help='Carpeta de los artefactos.')
+    parser.add_argument('--indicadores', default=RUTAS['indicadores'], help='Archivo de indicadores generales.')
+    parser.add_argument('--presupuestos', default=RUTAS['presupuestos'], help='Carpeta de los presupuestos.')
+    parser.add_argument('--url-bd', default=None, help='URL de SQLAlchemy para cargar las tablas en la base de datos.')
+    parser.add_argument('--delta', action='store_true',
+                        help='Cargar en la base de datos solo las filas insertadas, actualizadas o borradas.')
+    parser.add_argument('--exportar', default=None, metavar='CARPETA',
+                        help='Exportar el modelo en estrella para Power BI a CARPETA (solo las particiones que cambian).')
+    parser.add_argument('--trabajadores', type=int, default=None, help='Número máximo de etapas a la vez.')
+    parser.add_argument('--procesos', type=int, default=None, help='Número máximo de procesos para leer los presupuestos.')
+    parser.add_argument('--modo', choices=['hilos', 'procesos'], default='hilos', help='Tipo de pool para las etapas.')
+    parser.add_argument('--listar', action='store_true', help='Mostrar las etapas y sus dependencias sin ejecutarlas.')
+    parser.add_argument('--instrumentar', default=None, metavar='RUTA',
+                        help='Registrar tiempo, CPU, memoria y filas de cada función y guardarlo en RUTA (modo hilos).')
+    parser.add_argument('--formato-traza', choices=['json', 'chrome'], default='json',
+                        help='Formato del archivo de --instrumentar.')
+    args = parser.parse_args(argv)
+
+    if args.instrumentar:
+        activar_instrumentacion(espacios=[globals()])
+
+    rutas = dict(RUTAS, indicadores=args.indicadores, presupuestos=args.presupuestos)
+    etapas = crear_etapas(rutas, args.carpeta, args.url_bd, args.procesos, 'delta' if args.delta else 'reemplazar',
+                          args.exportar)
+
+    if args.listar:
+        for nombre in ordenar_etapas(etapas, args.objetivos):
+            print(f"{nombre}: {', '.join(etapas[nombre].dependencias) or '-'}")
+        return
+
+    inicio = time.perf_counter()
+    resultados, pendientes, tiempos = ejecutar_pipeline(etapas, args.objetivos or None, args.carpeta, args.forzar,
+                                               args.trabajadores, args.modo)
+
+    # Resumen del tiempo de cada etapa
+    if not pendientes:
+        print('Todas las etapas están actualizadas')
+    for nombre in pendientes:
+        print(f'{nombre:<20} {tiempos[nombre]:>8.2f} s')
+    print(f"{'total':<20} {time.perf_counter() - inicio:>8.2f} s")
+
+    # Filas cargadas en la base de datos
+    if 'carga_sql' in pendientes:
+        for tabla, filas in resultados['carga_sql'].items():
+            if isinstance(filas, dict):
+                print(f"Tabla {tabla}: {filas['insertadas']} filas insertadas, {filas['actualizadas']} actualizadas "
+                      f"y {filas['borradas']} borradas")
+            else:
+                print(f'Datos insertados en la tabla {tabla} ({filas} filas)')
+
+    # Particiones reescritas en la exportación para Power BI
+    if 'exportacion' in pendientes:
+        resumen = resultados['exportacion']
+        print(f"Particiones escritas: {resumen['escritas'].sum()}, "
+              f"sin cambios: {(resumen['particiones'] - resumen['escritas']).sum()}")
+
+    if args.instrumentar:
+        traza = desactivar_instrumentacion()
+        guardar_traza(traza, args.instrumentar, args.formato_traza)
+        print(resumir_registros(traza).to_string(index=False))
+
+
+if __name__ == '__main__':
+    main()
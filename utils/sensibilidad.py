@@ -0,0 +1,208 @@
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+
+from .functions import (ESPECIFICACION_NOTAS, MATRICES_AHP, calcular_indices_desigualdad, calcular_notas,
+                        normalizar_min_max, preparar_especificacion, resolver_ahp)
+
+
+
+###### FUNCIONES DE MUESTREO DE PESOS ######
+
+def muestrear_pesos_dirichlet(pesos, n_muestras, concentracion, rng):
+    """
+    Genera vectores de pesos perturbados con una distribución de Dirichlet centrada
+    en los pesos dados. Cuanto mayor es la concentración, menor es la perturbación.
+
+    Args:
+        pesos (ndarray): Pesos de referencia (suman 1).
+        n_muestras (int): Número de vectores a generar.
+        concentracion (float): Concentración de la Dirichlet.
+        rng (numpy.random.Generator): Generador de números aleatorios.
+
+    Returns:
+        ndarray: Array (n_muestras, n_pesos) con los pesos perturbados.
+    """
+    return rng.dirichlet(np.asarray(pesos, dtype=float) * concentracion, size=n_muestras)
+
+def perturbar_matrices_ahp(matriz, n_muestras, sigma, rng):
+    """
+    Genera matrices de comparación perturbadas multiplicando cada juicio del triángulo
+    superior por un ruido log-normal, manteniendo la reciprocidad y la escala de Saaty (1/9 a 9).
+
+    Args:
+        matriz (ndarray): Matriz de comparación por pares (n, n).
+        n_muestras (int): Número de matrices a generar.
+        sigma (float): Desviación típica del ruido en escala logarítmica.
+        rng (numpy.random.Generator): Generador de números aleatorios.
+
+    Returns:
+        ndarray: Array (n_muestras, n, n) con las matrices perturbadas.
+    """
+    n = len(matriz)
+    filas, columnas = np.triu_indices(n, k=1)
+
+    juicios = np.log(np.asarray(matriz, dtype=float)[filas, columnas])
+    juicios = juicios + rng.normal(0, sigma, size=(n_muestras, len(filas)))
+    juicios = np.exp(np.clip(juicios, -np.log(9), np.log(9)))
+
+    matrices = np.ones((n_muestras, n, n))
+    matrices[:, filas, columnas] = juicios
+    matrices[:, columnas, filas] = 1 / juicios
+
+    return matrices
+
+
+
+###### FUNCIONES DE SIMULACIÓN ######
+
+def simular_bloque(normalizados, ambito_indicador, pesos_base, pesos_ambitos, n_muestras, metodo,
+                   concentracion, concentracion_ambitos, sigma, matrices, semilla):
+    """
+    Simula un bloque de muestras y devuelve los acumulados de rankings y de índices,
+    de forma que la memoria depende del tamaño del bloque y no del total de muestras.
+
+    Returns:
+        tuple: Recuento de rankings (distritos x posiciones) e histograma del índice
+        general con resolución 0.01 (distritos x 10001).
+    """
+    rng = np.random.default_rng(semilla)
+    n_distritos = normalizados.shape[0]
+    n_ambitos = len(pesos_base)
+
+    # Pesos de los indicadores de cada ámbito, en una matriz (muestras x indicadores)
+    pesos = np.empty((n_muestras, normalizados.shape[1]))
+    for j in range(n_ambitos):
+        columnas = ambito_indicador == j
+        if metodo == 'matrices':
+            pesos[:, columnas] = resolver_ahp(perturbar_matrices_ahp(matrices[j], n_muestras, sigma, rng))['pesos']
+        else:
+            pesos[:, columnas] = muestrear_pesos_dirichlet(pesos_base[j], n_muestras, concentracion, rng)
+
+    # Peso de cada ámbito en el índice general
+    if concentracion_ambitos:
+        pesos_generales = muestrear_pesos_dirichlet(pesos_ambitos, n_muestras, concentracion_ambitos, rng)
+    else:
+        pesos_generales = np.broadcast_to(pesos_ambitos, (n_muestras, n_ambitos))
+    pesos *= pesos_generales[:, ambito_indicador]
+
+    # Índice general de todos los distritos para todas las muestras (distritos x muestras)
+    indices = 100 - (normalizados @ pesos.T) * 100
+
+    # Ranking de cada distrito en cada muestra (0 = el más desigual)
+    orden = np.argsort(-indices, axis=0, kind='stable')
+    rankings = np.empty_like(orden)
+    np.put_along_axis(rankings, orden, np.arange(n_distritos)[:, None], axis=0)
+
+    filas = np.repeat(np.arange(n_distritos), n_muestras)
+    recuento_rankings = np.bincount(filas * n_distritos + rankings.ravel(),
+                                    minlength=n_distritos * n_distritos).reshape(n_distritos, n_distritos)
+
+    clases = np.clip(np.rint(indices * 100), 0, 10000).astype(np.int64).ravel()
+    histograma = np.bincount(filas * 10001 + clases, minlength=n_distritos * 10001).reshape(n_distritos, 10001)
+
+    return recuento_rankings, histograma
+
+def percentiles_histograma(histograma, niveles):
+    """
+    Calcula percentiles a partir de un histograma con clases de 0.01 entre 0 y 100.
+
+    Args:
+        histograma (ndarray): Array (distritos, 10001) con el recuento de cada clase.
+        niveles (list): Niveles de los percentiles (entre 0 y 1).
+
+    Returns:
+        ndarray: Array (distritos, niveles) con los percentiles.
+    """
+    acumulado = histograma.cumsum(axis=1)
+    objetivos = acumulado[:, -1:] * np.asarray(niveles)[None, :]
+    posiciones = np.stack([np.argmax(acumulado >= objetivos[:, [k]], axis=1) for k in range(len(niveles))], axis=1)
+    return posiciones / 100
+
+def analizar_sensibilidad(df, especificacion=ESPECIFICACION_NOTAS, n_muestras=10000, metodo='dirichlet',
+                          concentracion=200, concentracion_ambitos=None, sigma=0.2, matrices_ahp=MATRICES_AHP,
+                          k_inferior=5, niveles=(0.05, 0.95), tamano_bloque=5000, max_procesos=1, semilla=None):
+    """
+    Analiza la sensibilidad del índice de desigualdad general a los pesos AHP con un
+    Monte Carlo: genera muestras de pesos perturbados, recalcula el índice de todos los
+    distritos en bloques de forma matricial y resume la estabilidad de los rankings.
+
+    La normalización de los indicadores no depende de los pesos, así que se calcula una
+    sola vez y cada bloque de muestras se resuelve con una multiplicación de matrices.
+
+    Args:
+        df (pandas.DataFrame): DataFrame con 'cod_distrito', 'distrito' y los indicadores de todos los ámbitos.
+        especificacion (dict): Especificación de las notas (pesos de referencia y negativos).
+        n_muestras (int): Número total de muestras de pesos.
+        metodo (str): 'dirichlet' (pesos de Dirichlet alrededor de los pesos AHP) o 'matrices'
+            (pesos AHP de matrices de comparación perturbadas).
+        concentracion (float): Concentración de la Dirichlet de los pesos de los indicadores.
+        concentracion_ambitos (float): Concentración de la Dirichlet de los pesos de los ámbitos
+            en el índice general (opcional). Si no se indica, se usa la media simple de los ámbitos.
+        sigma (float): Ruido log-normal de los juicios con el método 'matrices'.
+        matrices_ahp (dict): Matrices de comparación de cada ámbito para el método 'matrices'.
+        k_inferior (int): Número de posiciones más desiguales para calcular la probabilidad de estar entre ellas.
+        niveles (tuple): Niveles inferior y superior de las bandas de confianza.
+        tamano_bloque (int): Número de muestras simuladas a la vez.
+        max_procesos (int): Número de procesos en paralelo (1 para simular en serie).
+        semilla (int): Semilla para reproducir los resultados (opcional).
+
+    Returns:
+        tuple: DataFrame resumen por distrito (índice y ranking de referencia, ranking medio,
+        bandas del ranking y del índice y probabilidad de estar entre los k más desiguales) y
+        DataFrame con la distribución de los rankings (distritos x posiciones).
+    """
+    indicadores, ambitos, negativos, pesos = preparar_especificacion(especificacion)
+
+    valores = df[indicadores].to_numpy(dtype=float)
+    if np.isnan(valores).any():
+        raise ValueError('Los indicadores contienen valores nulos; no se puede analizar la sensibilidad.')
+
+    # Normalizar e invertir los indicadores negativos una sola vez
+    normalizados = normalizar_min_max(valores)
+    normalizados = np.where(negativos, 1 - normalizados, normalizados)
+
+    ambito_indicador = pesos.argmax(axis=1)
+    pesos_base = [pesos[ambito_indicador == j, j] for j in range(len(ambitos))]
+    pesos_ambitos = np.full(len(ambitos), 1 / len(ambitos))
+    matrices = [matrices_ahp[ambito]['matriz'] for ambito in ambitos] if metodo == 'matrices' else None
+
+    # Repartir las muestras en bloques con semillas independientes
+    tamanos = [min(tamano_bloque, n_muestras - inicio) for inicio in range(0, n_muestras, tamano_bloque)]
+    semillas = np.random.SeedSequence(semilla).spawn(len(tamanos))
+    argumentos = [(normalizados, ambito_indicador, pesos_base, pesos_ambitos, tamano, metodo,
+                   concentracion, concentracion_ambitos, sigma, matrices, s) for tamano, s in zip(tamanos, semillas)]
+
+    if max_procesos == 1:
+        parciales = [simular_bloque(*args) for args in argumentos]
+    else:
+        with ProcessPoolExecutor(max_workers=max_procesos) as executor:
+            parciales = list(executor.map(simular_bloque, *zip(*argumentos)))
+
+    recuento_rankings = sum(p[0] for p in parciales)
+    histograma = sum(p[1] for p in parciales)
+
+    # Índice y ranking de referencia con los pesos sin perturbar, redondeados como el índice publicado
+    df_indices = calcular_indices_desigualdad(calcular_notas(df, especificacion), ambitos)
+    indice_base = df_indices['indice_desigualdad_general'].to_numpy()
+    ranking_base = pd.Series(-indice_base).rank(method='first').to_numpy().astype(int)
+
+    posiciones = np.arange(1, len(df) + 1)
+    probabilidades = recuento_rankings / n_muestras
+    acumulado = probabilidades.cumsum(axis=1)
+    bandas_ranking = np.stack([np.argmax(acumulado >= nivel, axis=1) + 1 for nivel in niveles], axis=1)
+    bandas_indice = percentiles_histograma(histograma, niveles)
+
+    df_resumen = df[['cod_distrito', 'distrito']].copy()
+    df_resumen['indice_desigualdad_general'] = indice_base.round(2)
+    df_resumen['ranking_base'] = ranking_base
+    df_resumen['ranking_medio'] = (probabilidades @ posiciones).round(2)
+    df_resumen[[f'ranking_p{round(n * 100)}' for n in niveles]] = bandas_ranking
+    df_resumen[[f'indice_p{round(n * 100)}' for n in niveles]] = bandas_indice
+    df_resumen[f'prob_{k_inferior}_mas_desiguales'] = probabilidades[:, :k_inferior].sum(axis=1)
+
+    df_rankings = pd.DataFrame(probabilidades, index=df['distrito'].to_numpy(), columns=posiciones)
+    df_rankings.index.name = 'distrito'
+    df_rankings.columns.name = 'ranking'
+
+    return df_resumen.sort_values('ranking_base'), df_rankings